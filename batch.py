@@ -0,0 +1,172 @@
+__author__ = "Dell-Ray Sackett"
+__version__ = "0.1"
+import csv
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from steganographer import steganographer
+from steganographer import Encryptedsteganographer
+
+# The keyword arguments for Encryptedsteganographer and the encoding options
+# shared by every job. Each worker process gets its own copy when it starts
+# so they don't have to be sent with every job.
+_worker_crypto_args = None
+_worker_options = {}
+
+
+def _initialize_worker(crypto_args, options):
+    """Store the crypto arguments and options for this worker process."""
+
+    global _worker_crypto_args, _worker_options
+    _worker_crypto_args = crypto_args
+    _worker_options = options
+
+
+def _run_job(job):
+    """
+    Run a single job and return a dictionary describing how it went. All
+    exceptions are caught so one bad image can't take down the whole batch.
+
+    Mandatory Arguments:
+    job -- A tuple of (index, decode, input image, message file, output image).
+        For decode jobs the message file is where the message is written and
+        the output image is ignored.
+    """
+
+    index, decode, input_image, message_file, output_image = job
+    result = {"index": index, "input": input_image, "message": message_file,
+              "output": output_image, "ok": True, "error": ""}
+    start = time.time()
+    try:
+        if _worker_crypto_args:
+            steg = Encryptedsteganographer(inputFile=input_image,
+                                           outputFile=output_image,
+                                           **dict(_worker_crypto_args,
+                                                  **_worker_options))
+            if decode:
+                steg.decrypt_and_decode_message_to_file(message_file)
+            else:
+                steg.encrypt_and_encode_message_from_file(message_file)
+        else:
+            steg = steganographer(inputFile=input_image,
+                                  outputFile=output_image,
+                                  **_worker_options)
+            if decode:
+                steg.decode_message_to_file(message_file)
+            else:
+                steg.encode_message_from_file(message_file)
+    except Exception as e:
+        result["ok"] = False
+        result["error"] = type(e).__name__ + ": " + str(e)
+    result["seconds"] = time.time() - start
+    return result
+
+
+class BatchRunner:
+    """
+    This class runs a lot of encode or decode jobs across a pool of worker
+    processes. Every job is an (input image, message file, output image)
+    triple and is handled by the normal steganographer or
+    Encryptedsteganographer classes inside the worker.
+    """
+
+    def __init__(self, workers=None, chunk_size=16, **kwargs):
+        """
+        Initialize a BatchRunner.
+
+        Optional Arguments:
+        workers -- The number of worker processes. (Int, default=CPU count)
+        chunk_size -- The number of jobs handed to a worker at a time.
+            (Int, default=16)
+
+        Keyword Arguments:
+        recipientPublicKeyFileName -- Passed to Encryptedsteganographer. If
+            any of the crypto arguments are given all of them are required.
+        sendersKeyPairFileName -- Passed to Encryptedsteganographer.
+        passphrase -- Passed to Encryptedsteganographer.
+        Any other keyword arguments, such as depth or outputFormat, are passed
+        on to the steganographer of every job.
+
+        Exceptions:
+        KeyError -- Raised if only some of the crypto arguments are given.
+        """
+
+        self._workers = workers
+        self._chunk_size = chunk_size
+        self._crypto_args = None
+
+        if ("recipientPublicKeyFileName" in kwargs or
+                "sendersKeyPairFileName" in kwargs or "passphrase" in kwargs):
+            try:
+                self._crypto_args = {
+                    "recipientPublicKeyFileName": kwargs.pop("recipientPublicKeyFileName"),
+                    "sendersKeyPairFileName": kwargs.pop("sendersKeyPairFileName"),
+                    "passphrase": kwargs.pop("passphrase")}
+            except KeyError:
+                raise KeyError("The recipientPublicKeyFileName, sendersKeyPairFileName "
+                               + "and passphrase arguments are all required to "
+                               + "run an encrypted batch.")
+        self._options = kwargs
+
+    @staticmethod
+    def read_manifest(filename):
+        """
+        Read a CSV manifest and return a list of (input image, message file,
+        output image) tuples. Blank lines and lines starting with # are
+        skipped. Decode manifests may leave off the output image column.
+
+        Mandatory Arguments:
+        filename -- The filename of the manifest.
+
+        Exceptions:
+        IOError -- Raised if the manifest could not be opened.
+        ValueError -- Raised if a line doesn't have enough columns.
+        """
+
+        jobs = []
+        with open(filename, "r") as fd:
+            for line_number, row in enumerate(csv.reader(fd), 1):
+                if not row or row[0].strip().startswith("#"):
+                    continue
+                row = [column.strip() for column in row]
+                if len(row) < 2:
+                    raise ValueError("Line " + str(line_number) + " of " + filename
+                                     + " needs at least an input image and a "
+                                     + "message file.")
+                jobs.append((row[0], row[1], row[2] if len(row) > 2 else ""))
+        return jobs
+
+    def run(self, jobs, decode=False):
+        """
+        Run every job and return a list of result dictionaries in the same
+        order as the jobs. Each result has the keys index, input, message,
+        output, ok, error and seconds.
+
+        Mandatory Arguments:
+        jobs -- A list of (input image, message file, output image) tuples.
+
+        Optional Arguments:
+        decode -- Decode the input images into the message files instead of
+            encoding. (Bool, default=False)
+        """
+
+        tasks = [(index, decode) + tuple(job) for index, job in enumerate(jobs)]
+        with ProcessPoolExecutor(max_workers=self._workers,
+                                 initializer=_initialize_worker,
+                                 initargs=(self._crypto_args,
+                                           self._options)) as executor:
+            return list(executor.map(_run_job, tasks,
+                                     chunksize=self._chunk_size))
+
+    def run_manifest(self, filename, decode=False):
+        """
+        Read a manifest with read_manifest and run it.
+
+        Mandatory Arguments:
+        filename -- The filename of the manifest.
+
+        Optional Arguments:
+        decode -- Decode instead of encode. (Bool, default=False)
+        """
+
+        return self.run(BatchRunner.read_manifest(filename), decode)
@@ -0,0 +1,146 @@
+__author__ = "Dell-Ray Sackett"
+__version__ = "0.1"
+import numpy
+
+
+class BitCodec:
+    """
+    This class converts messages to and from the bits that get written into
+    an image. Messages are kept packed as bytes, memoryviews or numpy uint8
+    arrays and are only unpacked to one bit per byte when they are needed.
+    It is completely static.
+    """
+
+    # The length header in front of every message is a big-endian 32 bit int.
+    # The top two bits hold the embedding depth minus one, so images written
+    # before depth existed read back as depth 1.
+    LENGTH_BITS = 32
+    DEPTH_SHIFT = 30
+    MAX_LENGTH = (1 << DEPTH_SHIFT) - 1
+
+    @staticmethod
+    def to_bytes(message):
+        """
+        Return a message as something that supports the buffer protocol.
+        Strings are stored one byte per character.
+
+        Mandatory Arguments:
+        message -- A string, bytes, bytearray, memoryview or numpy uint8 array.
+        """
+
+        if isinstance(message, (bytes, bytearray, memoryview, numpy.ndarray)):
+            return message
+        return message.encode("latin-1")
+
+    @staticmethod
+    def to_bits(message):
+        """
+        Return a numpy uint8 array with one element per bit of the message,
+        most significant bit first.
+
+        Mandatory Arguments:
+        message -- A string, bytes, bytearray, memoryview or numpy uint8 array.
+        """
+
+        return numpy.unpackbits(
+            numpy.frombuffer(BitCodec.to_bytes(message), dtype=numpy.uint8))
+
+    @staticmethod
+    def from_bits(bits):
+        """
+        Pack an array of 1s and 0s back into bytes.
+
+        Mandatory Arguments:
+        bits -- A sequence of 1s and 0s. Must be divisible by 8.
+
+        Exceptions:
+        ValueError -- This will be raised if the number of bits is not evenly
+            divisible by 8.
+        """
+
+        if len(bits) % 8 != 0:
+            raise ValueError("The input list is required to be evenly divisable by 8")
+        return numpy.packbits(numpy.asarray(bits, dtype=numpy.uint8)).tobytes()
+
+    @staticmethod
+    def int_to_bits(number, width=32):
+        """
+        Return the least significant width bits of a number as a numpy uint8
+        array, most significant bit first.
+
+        Mandatory Arguments:
+        number -- The number to break down.
+
+        Optional Arguments:
+        width -- The number of bits to return. (Int, default=32)
+        """
+
+        shifts = numpy.arange(width - 1, -1, -1, dtype=numpy.uint64)
+        return ((numpy.uint64(number) >> shifts) & numpy.uint64(1)).astype(numpy.uint8)
+
+    @staticmethod
+    def bits_to_int(bits):
+        """
+        Return the integer value of a sequence of bits, most significant bit
+        first.
+
+        Mandatory Arguments:
+        bits -- A sequence of 1s and 0s.
+        """
+
+        bits = numpy.asarray(bits, dtype=numpy.uint8)
+        padded = numpy.concatenate(
+            (numpy.zeros(-len(bits) % 8, dtype=numpy.uint8), bits))
+        value = 0
+        for byte in bytearray(numpy.packbits(padded).tobytes()):
+            value = (value << 8) | byte
+        return value
+
+    @staticmethod
+    def header_bits(length, depth=1):
+        """
+        Return the 32 bit length header for a message as a numpy uint8 array.
+
+        Mandatory Arguments:
+        length -- The length of the message in bytes.
+
+        Optional Arguments:
+        depth -- The number of bits per channel the message is stored with.
+            (Int, default=1)
+
+        Exceptions:
+        ValueError -- Raised if the message is too long to be described.
+        """
+
+        if length > BitCodec.MAX_LENGTH:
+            raise ValueError("Messages can be at most " + str(BitCodec.MAX_LENGTH)
+                             + " bytes long.")
+        return BitCodec.int_to_bits(((depth - 1) << BitCodec.DEPTH_SHIFT) | length,
+                                    BitCodec.LENGTH_BITS)
+
+    @staticmethod
+    def parse_header_bits(bits):
+        """
+        Return a (length, depth) tuple from the bits of a length header.
+
+        Mandatory Arguments:
+        bits -- The 32 bits of the header.
+        """
+
+        word = BitCodec.bits_to_int(bits)
+        return word & BitCodec.MAX_LENGTH, (word >> BitCodec.DEPTH_SHIFT) + 1
+
+    @staticmethod
+    def frame(message):
+        """
+        Return the bits of a message with its 32 bit length in front. This is
+        the exact sequence that gets written into the image.
+
+        Mandatory Arguments:
+        message -- A string, bytes, bytearray, memoryview or numpy uint8 array.
+        """
+
+        message = BitCodec.to_bytes(message)
+        length = numpy.array([len(message)], dtype=">u4").view(numpy.uint8)
+        return numpy.unpackbits(numpy.concatenate(
+            (length, numpy.frombuffer(message, dtype=numpy.uint8))))
@@ -0,0 +1,131 @@
+__author__ = "Dell-Ray Sackett"
+__version__ = "0.2"
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+import numpy
+
+
+class CarrierCache:
+    """
+    This class keeps the decoded pixels of carrier images around so encoding
+    lots of messages into the same few images only decodes each image once.
+
+    Entries are keyed by the absolute path, modification time and size of
+    the image, so an image that changes on disk is decoded again. The
+    pristine pixels are stored read only and handed out as they are, so
+    decoding from a cached image costs no copy. Callers that embed into them
+    have to copy them first. When the cache holds more than max_bytes of pixels
+    or more than max_entries images the least recently used ones are
+    dropped.
+    """
+
+    # Hold on to at most this many bytes of pixels by default.
+    DEFAULT_MAX_BYTES = 512 << 20
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entries=None):
+        """
+        Initialize a CarrierCache.
+
+        Optional Arguments:
+        max_bytes -- The most bytes of pixels to keep.
+            (Int, default=CarrierCache.DEFAULT_MAX_BYTES)
+        max_entries -- The most images to keep. (Int, default=no limit)
+        """
+
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(filename):
+        """
+        Return the key an image is cached under.
+
+        Mandatory Arguments:
+        filename -- The filename of the image.
+
+        Exceptions:
+        IOError -- Raised if the image doesn't exist.
+        """
+
+        stat = os.stat(filename)
+        return os.path.abspath(filename), stat.st_mtime_ns, stat.st_size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def nbytes(self):
+        """Return the number of bytes of pixels currently held."""
+
+        return self._bytes
+
+    def load(self, filename):
+        """
+        Return a tuple of a read only view of the (height, width, channels)
+        pixels of an image, its color mode and its (width, height) size. The
+        image is only decoded if it isn't already cached. Copy the pixels
+        before writing to them.
+
+        Mandatory Arguments:
+        filename -- The filename of the image.
+
+        Exceptions:
+        IOError -- Raised if the image can't be opened.
+        """
+
+        key = CarrierCache.key(filename)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if entry is None:
+            entry = self._decode(filename)
+            self._store(key, entry)
+        pixels, mode, size = entry
+        return pixels.view(), mode, size
+
+    def _decode(self, filename):
+        """Decode an image into a read only (pixels, mode, size) entry."""
+
+        image = Image.open(filename)
+        try:
+            pixels = numpy.asarray(image)
+            pixels.flags.writeable = False
+            return pixels, image.mode, image.size
+        finally:
+            image.close()
+
+    def _store(self, key, entry):
+        """Add an entry and evict the least recently used ones over budget."""
+
+        with self._lock:
+            self.misses += 1
+            if entry[0].nbytes > self.max_bytes:
+                return
+            # Drop stale entries for the same file along with the key itself.
+            for stale in [k for k in self._entries if k[0] == key[0]]:
+                self._bytes -= self._entries.pop(stale)[0].nbytes
+            self._entries[key] = entry
+            self._bytes += entry[0].nbytes
+            while (self._bytes > self.max_bytes or (self.max_entries is not None
+                                                    and len(self._entries) > self.max_entries)):
+                self._bytes -= self._entries.popitem(last=False)[1][0].nbytes
+
+    def clear(self):
+        """Drop every cached image."""
+
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+# The cache shared by every steganographer in this process that asks for one.
+shared_cache = CarrierCache()
@@ -0,0 +1,228 @@
+__author__ = "Dell-Ray Sackett"
+__version__ = "0.1"
+import bz2
+import lzma
+import tempfile
+import zlib
+
+
+class Compressor:
+    """
+    This class compresses messages before they are embedded so there are
+    fewer bits to write into the image. The method used is stored as a code
+    in the low bits of the header flags so decoding can undo it on its own.
+    Like LSBEngine it is completely static.
+    """
+
+    # The codes stored in the header for each method.
+    NONE = 0
+    ZLIB = 1
+    BZ2 = 2
+    LZMA = 3
+    METHODS = {"none": NONE, "zlib": ZLIB, "bz2": BZ2, "lzma": LZMA}
+
+    # "auto" tries every method and keeps whichever is smallest, or none of
+    # them if nothing helps. Only the first SAMPLE_SIZE bytes of a stream are
+    # tried so the choice doesn't cost a pass over the whole message.
+    AUTO = "auto"
+    SAMPLE_SIZE = 1 << 20
+
+    # Messages too short to have any redundancy aren't worth trying.
+    MIN_SIZE = 64
+
+    # Streamed output is kept in memory up to this size, then spilled to a
+    # temporary file.
+    SPOOL_SIZE = 16 << 20
+
+    @staticmethod
+    def code(method):
+        """
+        Return the header code for a method name, or None for "auto".
+
+        Mandatory Arguments:
+        method -- One of Compressor.METHODS or "auto".
+
+        Exceptions:
+        ValueError -- Raised if the method is unknown.
+        """
+
+        if method == Compressor.AUTO:
+            return None
+        if method not in Compressor.METHODS:
+            raise ValueError("The compression must be one of auto, " +
+                             ", ".join(sorted(Compressor.METHODS)) + ".")
+        return Compressor.METHODS[method]
+
+    @staticmethod
+    def _compressor(code):
+        """Return a new incremental compressor for a code."""
+
+        if code == Compressor.ZLIB:
+            return zlib.compressobj(9)
+        if code == Compressor.BZ2:
+            return bz2.BZ2Compressor(9)
+        return lzma.LZMACompressor()
+
+    @staticmethod
+    def _decompressor(code):
+        """
+        Return a new incremental decompressor for a code.
+
+        Exceptions:
+        ValueError -- Raised if the code is unknown.
+        """
+
+        if code == Compressor.ZLIB:
+            return zlib.decompressobj()
+        if code == Compressor.BZ2:
+            return bz2.BZ2Decompressor()
+        if code == Compressor.LZMA:
+            return lzma.LZMADecompressor()
+        raise ValueError("The message was compressed with an unknown method (" +
+                         str(code) + ").")
+
+    @staticmethod
+    def _compress_with(code, data):
+        """Return data compressed with the method for a code."""
+
+        compressor = Compressor._compressor(code)
+        return compressor.compress(data) + compressor.flush()
+
+    @staticmethod
+    def choose(sample):
+        """
+        Return the code of the method that compresses a sample best, or
+        Compressor.NONE if none of them make it smaller.
+
+        Mandatory Arguments:
+        sample -- The bytes to try.
+        """
+
+        best, best_size = Compressor.NONE, len(sample)
+        if len(sample) < Compressor.MIN_SIZE:
+            return best
+        for code in (Compressor.ZLIB, Compressor.BZ2, Compressor.LZMA):
+            size = len(Compressor._compress_with(code, sample))
+            if size < best_size:
+                best, best_size = code, size
+        return best
+
+    @staticmethod
+    def compress(data, method):
+        """
+        Compress a message and return a tuple of the code of the method used
+        and the compressed bytes. With "auto" the data is returned as it is
+        if compressing wouldn't make it smaller.
+
+        Mandatory Arguments:
+        data -- The message as bytes.
+        method -- One of Compressor.METHODS or "auto".
+
+        Exceptions:
+        ValueError -- Raised if the method is unknown.
+        """
+
+        code = Compressor.code(method)
+        if code is None:
+            code = Compressor.choose(data[:Compressor.SAMPLE_SIZE])
+            if code == Compressor.NONE:
+                return code, data
+            compressed = Compressor._compress_with(code, data)
+            if len(compressed) >= len(data):
+                return Compressor.NONE, data
+            return code, compressed
+        if code == Compressor.NONE:
+            return code, data
+        return code, Compressor._compress_with(code, data)
+
+    @staticmethod
+    def compress_file(fd, method, chunk_size):
+        """
+        Compress a file a chunk at a time into a temporary file. Returns a
+        tuple of the code of the method used, a file object positioned at the
+        start of the compressed data and its length. With Compressor.NONE the
+        file object is fd itself.
+
+        Mandatory Arguments:
+        fd -- A file object opened in binary mode, at the start of the file.
+        method -- One of Compressor.METHODS or "auto".
+        chunk_size -- The number of bytes to read at a time.
+
+        Exceptions:
+        ValueError -- Raised if the method is unknown.
+        """
+
+        code = Compressor.code(method)
+        length = fd.seek(0, 2)
+        fd.seek(0)
+        if code is None:
+            code = Compressor.choose(fd.read(Compressor.SAMPLE_SIZE))
+            fd.seek(0)
+        if code == Compressor.NONE:
+            return code, fd, length
+
+        compressor = Compressor._compressor(code)
+        output = tempfile.SpooledTemporaryFile(Compressor.SPOOL_SIZE)
+        chunk = fd.read(chunk_size)
+        while chunk:
+            output.write(compressor.compress(chunk))
+            chunk = fd.read(chunk_size)
+        output.write(compressor.flush())
+        compressed_length = output.tell()
+        if method == Compressor.AUTO and compressed_length >= length:
+            output.close()
+            fd.seek(0)
+            return Compressor.NONE, fd, length
+        output.seek(0)
+        return code, output, compressed_length
+
+    @staticmethod
+    def decompress(code, data):
+        """
+        Undo compress.
+
+        Mandatory Arguments:
+        code -- The compression code from the header.
+        data -- The compressed bytes.
+
+        Exceptions:
+        ValueError -- Raised if the code is unknown or the data is corrupt.
+        """
+
+        if code == Compressor.NONE:
+            return data
+        return b"".join(Compressor.decompress_chunks(code, [data]))
+
+    @staticmethod
+    def decompress_chunks(code, chunks):
+        """
+        Undo compress on an iterable of chunks and yield the message a chunk
+        at a time.
+
+        Mandatory Arguments:
+        code -- The compression code from the header.
+        chunks -- An iterable of bytes-like chunks.
+
+        Exceptions:
+        ValueError -- Raised if the code is unknown or the data is corrupt.
+        """
+
+        if code == Compressor.NONE:
+            for chunk in chunks:
+                yield chunk
+            return
+        decompressor = Compressor._decompressor(code)
+        try:
+            for chunk in chunks:
+                data = decompressor.decompress(bytes(chunk))
+                if data:
+                    yield data
+            if code == Compressor.ZLIB:
+                data = decompressor.flush()
+                if data:
+                    yield data
+            finished = decompressor.eof
+        except (zlib.error, OSError, lzma.LZMAError) as e:
+            raise ValueError("The compressed message is corrupt: " + str(e))
+        if not finished:
+            raise ValueError("The compressed message is truncated.")
@@ -0,0 +1,238 @@
+__author__ = "Dell-Ray Sackett"
+__version__ = "0.4"
+import numpy
+
+
+class LSBEngine:
+    """
+    This class does the actual bit twiddling on the image data. Instead of
+    walking every pixel with nested loops it works on whole numpy arrays at
+    once. Like CryptoHelper it is completely static.
+
+    Positions are counted in channels (slots) in the order of the layout.
+    Each slot holds depth bits, the least significant depth bits of the
+    channel value.
+    """
+
+    # The most bits per channel we are willing to overwrite.
+    MAX_DEPTH = 4
+
+    # The original encoder walks down each column before moving over to the
+    # next one. That strides across the whole array for every pixel so new
+    # images walk along the rows instead, which is the order the array is
+    # actually stored in.
+    LAYOUT_COLUMNS = 0
+    LAYOUT_ROWS = 1
+
+    @staticmethod
+    def channel_view(image_data, color_size, layout=LAYOUT_COLUMNS):
+        """
+        Return a (lines, pixels per line, color_size) view of the image data
+        that lists the channels we store information in, in layout order.
+        For the row layout this is the image itself, for the column layout
+        it is the image transposed.
+
+        Mandatory Arguments:
+        image_data -- A (height, width, channels) numpy array of the image.
+        color_size -- The number of channels per pixel that carry data.
+
+        Optional Arguments:
+        layout -- LSBEngine.LAYOUT_COLUMNS or LSBEngine.LAYOUT_ROWS.
+            (default=LSBEngine.LAYOUT_COLUMNS)
+        """
+
+        if layout == LSBEngine.LAYOUT_ROWS:
+            return image_data[:, :, :color_size]
+        return image_data[:, :, :color_size].transpose(1, 0, 2)
+
+    @staticmethod
+    def bits_to_symbols(bits, depth):
+        """
+        Group a sequence of bits into depth bit values, most significant bit
+        first. The bits are padded with 0s to a multiple of depth.
+
+        Mandatory Arguments:
+        bits -- A numpy uint8 array of 1s and 0s.
+        depth -- The number of bits per value.
+        """
+
+        if depth == 1:
+            return bits
+        bits = numpy.concatenate(
+            (bits, numpy.zeros(-len(bits) % depth, dtype=numpy.uint8)))
+        weights = numpy.left_shift(1, numpy.arange(depth - 1, -1, -1)).astype(numpy.uint8)
+        return numpy.dot(bits.reshape(-1, depth), weights).astype(numpy.uint8)
+
+    @staticmethod
+    def symbols_to_bits(symbols, depth):
+        """
+        Break depth bit values back down into a sequence of bits, most
+        significant bit first.
+
+        Mandatory Arguments:
+        symbols -- A numpy uint8 array of values.
+        depth -- The number of bits per value.
+        """
+
+        if depth == 1:
+            return symbols
+        shifts = numpy.arange(depth - 1, -1, -1, dtype=numpy.uint8)
+        return ((symbols[:, None] >> shifts) & 1).reshape(-1)
+
+    @staticmethod
+    def embed(image_data, bits, color_size, start=0, depth=1,
+              layout=LAYOUT_COLUMNS):
+        """
+        Write a sequence of bits into the least significant bits of the image
+        channels. The image data is modified in place.
+
+        Only the lines the bits actually land in are flattened and masked in
+        a single operation. When every channel carries data the row layout
+        is contiguous and that happens directly on the image, otherwise the
+        lines are copied out and written back.
+
+        Mandatory Arguments:
+        image_data -- A (height, width, channels) numpy array of the image.
+        bits -- A numpy uint8 array of 1s and 0s.
+        color_size -- The number of channels per pixel that carry data.
+
+        Optional Arguments:
+        start -- The slot to start writing at. (Int, default=0)
+        depth -- The number of bits to write into each channel. (Int, default=1)
+        layout -- The order the channels are walked in.
+            (default=LSBEngine.LAYOUT_COLUMNS)
+        """
+
+        symbols = LSBEngine.bits_to_symbols(bits, depth)
+        view = LSBEngine.channel_view(image_data, color_size, layout)
+        line_size = view.shape[1] * view.shape[2]
+        first = start // line_size
+        last = -(-(start + len(symbols)) // line_size)
+        block = view[first:last]
+        offset = start - first * line_size
+        keep = numpy.uint8(0xFF ^ ((1 << depth) - 1))
+
+        # reshape only hands back a copy if the view isn't contiguous.
+        flat = block.reshape(-1)
+        target = flat[offset:offset + len(symbols)]
+        flat[offset:offset + len(symbols)] = (target & keep) | symbols
+        if not numpy.may_share_memory(flat, block):
+            block[...] = flat.reshape(block.shape)
+
+    @staticmethod
+    def extract(image_data, count, color_size, start=0, depth=1,
+                layout=LAYOUT_COLUMNS):
+        """
+        Return count bits read out of the least significant bits of the image
+        channels as a numpy uint8 array of 1s and 0s.
+
+        Only the lines holding those channels are flattened so reading a
+        short header doesn't touch the rest of the image.
+
+        Mandatory Arguments:
+        image_data -- A (height, width, channels) numpy array of the image.
+        count -- The number of bits to read.
+        color_size -- The number of channels per pixel that carry data.
+
+        Optional Arguments:
+        start -- The slot to start reading at. (Int, default=0)
+        depth -- The number of bits stored in each channel. (Int, default=1)
+        layout -- The order the channels are walked in.
+            (default=LSBEngine.LAYOUT_COLUMNS)
+        """
+
+        slots = -(-count // depth)
+        view = LSBEngine.channel_view(image_data, color_size, layout)
+        line_size = view.shape[1] * view.shape[2]
+        first = start // line_size
+        last = -(-(start + slots) // line_size)
+        offset = start - first * line_size
+        symbols = view[first:last].reshape(-1)[offset:offset + slots] & ((1 << depth) - 1)
+        return LSBEngine.symbols_to_bits(symbols, depth)[:count]
+
+    @staticmethod
+    def extract_bytes(image_data, length, color_size, start=0, depth=1,
+                      layout=LAYOUT_COLUMNS):
+        """
+        Return length bytes packed from the least significant bits of the
+        image starting at slot start.
+
+        Mandatory Arguments:
+        image_data -- A (height, width, channels) numpy array of the image.
+        length -- The number of bytes to read.
+        color_size -- The number of channels per pixel that carry data.
+
+        Optional Arguments:
+        start -- The slot to start reading at. (Int, default=0)
+        depth -- The number of bits stored in each channel. (Int, default=1)
+        layout -- The order the channels are walked in.
+            (default=LSBEngine.LAYOUT_COLUMNS)
+        """
+
+        bits = LSBEngine.extract(image_data, length * 8, color_size, start,
+                                 depth, layout)
+        return numpy.packbits(bits).tobytes()
+
+    @staticmethod
+    def slot_index(image_data, color_size, slots):
+        """
+        Return a tuple of row, column and channel index arrays that pick the
+        given slots out of the image data, for numpy fancy indexing. Slots
+        are counted in the row layout.
+
+        Mandatory Arguments:
+        image_data -- A (height, width, channels) numpy array of the image.
+        color_size -- The number of channels per pixel that carry data.
+        slots -- A numpy array of slot numbers.
+        """
+
+        pixels, channels = numpy.divmod(slots, color_size)
+        rows, columns = numpy.divmod(pixels, image_data.shape[1])
+        return (rows.astype(numpy.intp), columns.astype(numpy.intp),
+                channels.astype(numpy.intp))
+
+    @staticmethod
+    def embed_at(image_data, bits, color_size, slots, depth=1):
+        """
+        Write a sequence of bits into the least significant bits of the
+        given slots, in order, instead of a run of consecutive slots. The
+        image data is modified in place and only the slots listed are
+        touched.
+
+        Mandatory Arguments:
+        image_data -- A (height, width, channels) numpy array of the image.
+        bits -- A numpy uint8 array of 1s and 0s.
+        color_size -- The number of channels per pixel that carry data.
+        slots -- A numpy array of distinct slot numbers in the row layout,
+            one for every depth bits.
+
+        Optional Arguments:
+        depth -- The number of bits to write into each channel. (Int, default=1)
+        """
+
+        index = LSBEngine.slot_index(image_data, color_size, slots)
+        keep = numpy.uint8(0xFF ^ ((1 << depth) - 1))
+        image_data[index] = (image_data[index] & keep) | \
+            LSBEngine.bits_to_symbols(bits, depth)
+
+    @staticmethod
+    def extract_at(image_data, count, color_size, slots, depth=1):
+        """
+        Return count bits read out of the least significant bits of the
+        given slots, in order, as a numpy uint8 array of 1s and 0s.
+
+        Mandatory Arguments:
+        image_data -- A (height, width, channels) numpy array of the image.
+        count -- The number of bits to read.
+        color_size -- The number of channels per pixel that carry data.
+        slots -- A numpy array of slot numbers in the row layout, at least
+            one for every depth bits.
+
+        Optional Arguments:
+        depth -- The number of bits stored in each channel. (Int, default=1)
+        """
+
+        slots = slots[:-(-count // depth)]
+        symbols = image_data[LSBEngine.slot_index(image_data, color_size, slots)] \
+            & ((1 << depth) - 1)
+        return LSBEngine.symbols_to_bits(symbols, depth)[:count]
@@ -0,0 +1,501 @@
+__author__ = "Dell-Ray Sackett"
+__version__ = "0.1"
+import numpy
+
+
+def _tables():
+    """Return the exp and log tables of GF(256) with the polynomial 0x11d."""
+
+    exp = numpy.zeros(512, dtype=numpy.int32)
+    log = numpy.zeros(256, dtype=numpy.int32)
+    value = 1
+    for power in range(255):
+        exp[power] = value
+        log[value] = power
+        value <<= 1
+        if value & 0x100:
+            value ^= 0x11d
+    exp[255:510] = exp[:255]
+    return exp, log
+
+
+class ReedSolomon:
+    """
+    This class adds Reed-Solomon parity to a message so a decoder can
+    repair bits that were flipped after the image was encoded. Like
+    Compressor it is completely static.
+
+    The message is cut into codewords of at most 255 bytes, parity bytes
+    included, and every parity byte lets a codeword repair half a damaged
+    byte. Codewords are grouped into stripes and the bytes of a stripe are
+    interleaved across its codewords, so damage to a run of neighbouring
+    pixels is shared out between codewords instead of overwhelming one.
+
+    Encoding and checking work on every codeword of a stripe at once with
+    numpy. Only codewords that are actually damaged go through the error
+    correction, one at a time.
+    """
+
+    # The most parity bytes a codeword can have.
+    MAX_PARITY = 128
+
+    # The number of codewords interleaved together. Every stripe but the
+    # last holds STRIPE_CODEWORDS full codewords.
+    STRIPE_CODEWORDS = 64
+
+    EXP, LOG = _tables()
+
+    # Cached generator polynomial tables by number of parity bytes.
+    _generators = {}
+
+    @staticmethod
+    def _mul(a, b):
+        """Multiply two elements of GF(256)."""
+
+        if a == 0 or b == 0:
+            return 0
+        return int(ReedSolomon.EXP[ReedSolomon.LOG[a] + ReedSolomon.LOG[b]])
+
+    @staticmethod
+    def _pow(a, power):
+        """Raise an element of GF(256) to a power."""
+
+        return int(ReedSolomon.EXP[(ReedSolomon.LOG[a] * power) % 255])
+
+    @staticmethod
+    def _mul_table(values):
+        """
+        Return a (len(values), 256) table of every byte multiplied by each of
+        values.
+        """
+
+        table = numpy.zeros((len(values), 256), dtype=numpy.uint8)
+        for row, value in enumerate(values):
+            if value:
+                table[row, 1:] = ReedSolomon.EXP[ReedSolomon.LOG[1:] +
+                                                 ReedSolomon.LOG[value]]
+        return table
+
+    @staticmethod
+    def _generator(parity):
+        """
+        Return the tables for a number of parity bytes: the products of
+        every byte with the generator polynomial below its leading term, as
+        a (parity, 256) table, and every byte times each root, also
+        (parity, 256).
+        """
+
+        if parity not in ReedSolomon._generators:
+            polynomial = [1]
+            for power in range(parity):
+                root = ReedSolomon._pow(2, power)
+                polynomial = ReedSolomon._poly_mul(polynomial, [1, root])
+            roots = [ReedSolomon._pow(2, power) for power in range(parity)]
+            ReedSolomon._generators[parity] = (
+                ReedSolomon._mul_table(polynomial[1:]), ReedSolomon._mul_table(roots))
+        return ReedSolomon._generators[parity]
+
+    @staticmethod
+    def check_parity(parity):
+        """
+        Check a number of parity bytes per codeword.
+
+        Mandatory Arguments:
+        parity -- The number of parity bytes.
+
+        Exceptions:
+        ValueError -- Raised if parity is out of range.
+        """
+
+        if not 1 <= parity <= ReedSolomon.MAX_PARITY:
+            raise ValueError("The number of parity bytes must be between 1 and "
+                             + str(ReedSolomon.MAX_PARITY) + ".")
+
+    @staticmethod
+    def _stripes(length, parity):
+        """
+        Yield the (data bytes, codewords, data bytes per codeword) of every
+        stripe of a message of length bytes.
+        """
+
+        data_size = 255 - parity
+        stripe_size = ReedSolomon.STRIPE_CODEWORDS * data_size
+        full, tail = divmod(length, stripe_size)
+        for _ in range(full):
+            yield stripe_size, ReedSolomon.STRIPE_CODEWORDS, data_size
+        if tail:
+            # The last stripe is split into as few codewords as it takes,
+            # all shortened to the same length.
+            codewords = -(-tail // data_size)
+            yield tail, codewords, -(-tail // codewords)
+
+    @staticmethod
+    def encoded_length(length, parity):
+        """
+        Return the length of a message of length bytes once parity has been
+        added.
+
+        Mandatory Arguments:
+        length -- The length of the message.
+        parity -- The number of parity bytes per codeword.
+        """
+
+        data_size = 255 - parity
+        full, tail = divmod(length, ReedSolomon.STRIPE_CODEWORDS * data_size)
+        encoded = full * ReedSolomon.STRIPE_CODEWORDS * 255
+        if tail:
+            codewords = -(-tail // data_size)
+            encoded += codewords * (-(-tail // codewords) + parity)
+        return encoded
+
+    @staticmethod
+    def capacity(space, parity):
+        """
+        Return the longest message that still fits in space bytes once parity
+        has been added.
+
+        Mandatory Arguments:
+        space -- The number of bytes available.
+        parity -- The number of parity bytes per codeword.
+        """
+
+        stripe_data, stripe_encoded = ReedSolomon.stripe_size(parity)
+        full, space = divmod(max(0, space), stripe_encoded)
+        # The encoded length only grows with the length, so the longest last
+        # stripe that fits can be searched for.
+        low, high = 0, stripe_data - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if ReedSolomon.encoded_length(middle, parity) <= space:
+                low = middle
+            else:
+                high = middle - 1
+        return full * stripe_data + low
+
+    @staticmethod
+    def stripe_size(parity):
+        """
+        Return a tuple of the number of message bytes in a full stripe and
+        the number of bytes it takes once encoded.
+
+        Mandatory Arguments:
+        parity -- The number of parity bytes per codeword.
+        """
+
+        return (ReedSolomon.STRIPE_CODEWORDS * (255 - parity),
+                ReedSolomon.STRIPE_CODEWORDS * 255)
+
+    @staticmethod
+    def _parity(data, parity):
+        """
+        Return the (codewords, parity) parity bytes of a (codewords, data
+        size) array of message bytes.
+        """
+
+        feedback_table = ReedSolomon._generator(parity)[0]
+        remainder = numpy.zeros((parity, len(data)), dtype=numpy.uint8)
+        # Long division by the generator polynomial, one byte of every
+        # codeword at a time.
+        for column in numpy.ascontiguousarray(data.T):
+            feedback = column ^ remainder[0]
+            remainder[:-1] = remainder[1:]
+            remainder[-1] = 0
+            remainder ^= feedback_table[:, feedback]
+        return remainder.T
+
+    @staticmethod
+    def _encode_stripes(data, length, parity):
+        """
+        Encode the whole stripes of a message of length bytes and return
+        them interleaved as a numpy uint8 array.
+        """
+
+        parts = []
+        stripe_data = ReedSolomon.stripe_size(parity)[0]
+        full = length // stripe_data
+        if full:
+            # Every full stripe has the same shape so they all go in one pass.
+            block = data[:full * stripe_data].reshape(-1, 255 - parity)
+            encoded = numpy.concatenate((block, ReedSolomon._parity(block, parity)), axis=1)
+            parts.append(encoded.reshape(full, ReedSolomon.STRIPE_CODEWORDS, 255)
+                         .transpose(0, 2, 1).reshape(-1))
+        for stripe_length, codewords, data_size in ReedSolomon._stripes(
+                length - full * stripe_data, parity):
+            block = numpy.zeros((codewords, data_size), dtype=numpy.uint8)
+            block.reshape(-1)[:stripe_length] = data[full * stripe_data:length]
+            encoded = numpy.concatenate((block, ReedSolomon._parity(block, parity)), axis=1)
+            parts.append(encoded.T.reshape(-1))
+        return numpy.concatenate(parts) if parts else numpy.zeros(0, dtype=numpy.uint8)
+
+    @staticmethod
+    def encode(data, parity):
+        """
+        Return a message with Reed-Solomon parity added as bytes.
+
+        Mandatory Arguments:
+        data -- The message as something that supports the buffer protocol.
+        parity -- The number of parity bytes per codeword, from 1 to
+            ReedSolomon.MAX_PARITY.
+
+        Exceptions:
+        ValueError -- Raised if parity is out of range.
+        """
+
+        ReedSolomon.check_parity(parity)
+        data = numpy.frombuffer(data, dtype=numpy.uint8)
+        return ReedSolomon._encode_stripes(data, len(data), parity).tobytes()
+
+    @staticmethod
+    def encode_chunks(chunks, parity):
+        """
+        Add Reed-Solomon parity to a message that arrives as an iterable of
+        chunks and yield it whole stripes at a time.
+
+        Mandatory Arguments:
+        chunks -- An iterable of bytes-like chunks.
+        parity -- The number of parity bytes per codeword.
+
+        Exceptions:
+        ValueError -- Raised if parity is out of range.
+        """
+
+        ReedSolomon.check_parity(parity)
+        stripe = ReedSolomon.stripe_size(parity)[0]
+        pending = bytearray()
+        for chunk in chunks:
+            pending += chunk
+            usable = len(pending) - len(pending) % stripe
+            if usable:
+                yield ReedSolomon._encode_stripes(
+                    numpy.frombuffer(pending, dtype=numpy.uint8, count=usable),
+                    usable, parity).tobytes()
+                del pending[:usable]
+        if pending:
+            yield ReedSolomon._encode_stripes(
+                numpy.frombuffer(pending, dtype=numpy.uint8), len(pending),
+                parity).tobytes()
+
+    @staticmethod
+    def _syndromes(codewords, parity):
+        """
+        Return the (parity, codewords) syndromes of a (codewords, length)
+        array. A codeword is intact when all of its syndromes are 0.
+        """
+
+        root_table = ReedSolomon._generator(parity)[1]
+        rows = numpy.arange(parity)[:, None]
+        syndromes = numpy.zeros((parity, len(codewords)), dtype=numpy.uint8)
+        for column in numpy.ascontiguousarray(codewords.T):
+            syndromes = root_table[rows, syndromes] ^ column
+        return syndromes
+
+    @staticmethod
+    def _poly_mul(p, q):
+        """Multiply two polynomials over GF(256), highest term first."""
+
+        result = [0] * (len(p) + len(q) - 1)
+        for j, qj in enumerate(q):
+            for i, pi in enumerate(p):
+                result[i + j] ^= ReedSolomon._mul(pi, qj)
+        return result
+
+    @staticmethod
+    def _mul_arrays(a, b):
+        """Multiply two broadcastable int arrays of GF(256) elements."""
+
+        product = ReedSolomon.EXP[ReedSolomon.LOG[a] + ReedSolomon.LOG[b]]
+        return numpy.where((a != 0) & (b != 0), product, 0)
+
+    @staticmethod
+    def _correct(block, syndromes):
+        """
+        Repair damaged codewords in place and return the number of bytes
+        fixed. All of them are worked on at once, one step of the algorithms
+        at a time.
+
+        Mandatory Arguments:
+        block -- A (codewords, length) numpy uint8 array of damaged codewords.
+        syndromes -- Their (parity, codewords) syndromes.
+
+        Exceptions:
+        ValueError -- Raised if a codeword has more damage than its parity
+            can repair.
+        """
+
+        mul = ReedSolomon._mul_arrays
+        exp = ReedSolomon.EXP
+        parity, count = syndromes.shape
+        length = block.shape[1]
+        synd = syndromes.T.astype(numpy.int32)
+
+        # Berlekamp-Massey finds the error locators, lowest term first.
+        locator = numpy.zeros((count, parity + 1), dtype=numpy.int32)
+        locator[:, 0] = 1
+        old = locator.copy()
+        errors = numpy.zeros(count, dtype=numpy.int32)
+        for step in range(parity):
+            delta = synd[:, step].copy()
+            for term in range(1, step + 1):
+                delta ^= mul(locator[:, term], synd[:, step - term])
+            old[:, 1:] = old[:, :-1].copy()
+            old[:, 0] = 0
+            changed = locator ^ mul(delta[:, None], old)
+            grow = (delta != 0) & (2 * errors <= step)
+            if grow.any():
+                old[grow] = mul(locator[grow],
+                                exp[255 - ReedSolomon.LOG[delta[grow]]][:, None])
+                errors[grow] = step + 1 - errors[grow]
+            locator = changed
+        if (errors * 2 > parity).any():
+            raise ValueError("Too many errors to correct.")
+
+        # Chien search finds the roots, which say where the errors are. The
+        # first byte of a codeword is its highest power.
+        powers = (length - 1 - numpy.arange(length)) % 255
+        values = numpy.zeros((count, length), dtype=numpy.int32)
+        for term in range(errors.max() + 1):
+            values ^= mul(locator[:, term:term + 1], exp[(-powers * term) % 255][None, :])
+        rows, positions = numpy.nonzero(values == 0)
+        if (numpy.bincount(rows, minlength=count) != errors).any():
+            raise ValueError("Too many errors to correct.")
+
+        # Forney works out the error values from the evaluator
+        # syndromes * locator mod x^parity and the locator's derivative.
+        evaluator = numpy.zeros((count, parity), dtype=numpy.int32)
+        for term in range(errors.max() + 1):
+            evaluator[:, term:] ^= mul(locator[:, term:term + 1], synd[:, :parity - term])
+        inverse_powers = (255 - powers[positions]) % 255
+        numerator = numpy.zeros(len(rows), dtype=numpy.int32)
+        denominator = numpy.zeros(len(rows), dtype=numpy.int32)
+        for term in range(parity):
+            x = exp[(inverse_powers * term) % 255]
+            numerator ^= mul(evaluator[rows, term], x)
+            if term % 2 == 0:
+                denominator ^= mul(locator[rows, term + 1], x)
+        if (denominator == 0).any():
+            raise ValueError("Too many errors to correct.")
+        magnitude = mul(mul(exp[powers[positions]], numerator),
+                        exp[255 - ReedSolomon.LOG[denominator]])
+        block[rows, positions] ^= magnitude.astype(numpy.uint8)
+        return len(rows)
+
+    @staticmethod
+    def _repair(block, parity):
+        """
+        Check every codeword of a (codewords, length) array, repair the
+        damaged ones in place and return the number of bytes repaired.
+
+        Exceptions:
+        ValueError -- Raised if a codeword is damaged beyond repair.
+        """
+
+        data_size = block.shape[1] - parity
+        # Working the parity out again is cheaper than the syndromes, so
+        # that is how intact codewords are picked out.
+        damaged = numpy.flatnonzero((ReedSolomon._parity(block[:, :data_size], parity) !=
+                                     block[:, data_size:]).any(axis=1))
+        if not len(damaged):
+            return 0
+        codewords = block[damaged]
+        repaired = ReedSolomon._correct(codewords, ReedSolomon._syndromes(codewords, parity))
+        if ReedSolomon._syndromes(codewords, parity).any():
+            raise ValueError("Too many errors to correct.")
+        block[damaged] = codewords
+        return repaired
+
+    @staticmethod
+    def _decode_stripes(stored, length, parity):
+        """
+        Deinterleave, check and repair the whole stripes of length message
+        bytes. Returns a tuple of the message as a numpy uint8 array and the
+        number of bytes repaired.
+        """
+
+        parts = []
+        repaired = 0
+        stripe_data, stripe_stored = ReedSolomon.stripe_size(parity)
+        full = length // stripe_data
+        if full:
+            block = numpy.array(stored[:full * stripe_stored].reshape(
+                full, 255, ReedSolomon.STRIPE_CODEWORDS).transpose(0, 2, 1)).reshape(-1, 255)
+            repaired += ReedSolomon._repair(block, parity)
+            parts.append(block[:, :255 - parity].reshape(-1))
+        for stripe_length, codewords, data_size in ReedSolomon._stripes(
+                length - full * stripe_data, parity):
+            block = numpy.array(stored[full * stripe_stored:].reshape(
+                data_size + parity, codewords).T)
+            repaired += ReedSolomon._repair(block, parity)
+            parts.append(block[:, :data_size].reshape(-1)[:stripe_length])
+        return numpy.concatenate(parts) if parts else numpy.zeros(0, dtype=numpy.uint8), repaired
+
+    @staticmethod
+    def decode(data, length, parity, stats=None):
+        """
+        Check a message encoded by encode, repair any damage and return the
+        original length bytes.
+
+        Mandatory Arguments:
+        data -- The encoded message as something that supports the buffer
+            protocol.
+        length -- The length of the original message.
+        parity -- The number of parity bytes per codeword.
+
+        Optional Arguments:
+        stats -- A dictionary to count the bytes repaired in under
+            "repaired". (default=None)
+
+        Exceptions:
+        ValueError -- Raised if data is the wrong length or is damaged
+            beyond repair.
+        """
+
+        return b"".join(ReedSolomon.decode_chunks([data], length, parity, stats))
+
+    @staticmethod
+    def decode_chunks(chunks, length, parity, stats=None):
+        """
+        Undo encode_chunks on an iterable of chunks, repairing any damage,
+        and yield the original message a stripe at a time.
+
+        Mandatory Arguments:
+        chunks -- An iterable of bytes-like chunks of the encoded message.
+        length -- The length of the original message.
+        parity -- The number of parity bytes per codeword.
+
+        Optional Arguments:
+        stats -- A dictionary to count the bytes repaired in under
+            "repaired". (default=None)
+
+        Exceptions:
+        ValueError -- Raised if the chunks are the wrong length or are
+            damaged beyond repair.
+        """
+
+        ReedSolomon.check_parity(parity)
+        stripe_data, stripe_stored = ReedSolomon.stripe_size(parity)
+        tail_stored = ReedSolomon.encoded_length(length % stripe_data, parity)
+        pending = bytearray()
+        remaining = length
+        repaired = 0
+        try:
+            for chunk in chunks:
+                pending += memoryview(chunk)
+                # Take as many whole stripes as have arrived.
+                full = min(len(pending) // stripe_stored, remaining // stripe_data)
+                usable, stored = full * stripe_data, full * stripe_stored
+                if (full == remaining // stripe_data and remaining % stripe_data and
+                        len(pending) - stored >= tail_stored):
+                    usable, stored = remaining, stored + tail_stored
+                if usable:
+                    message, fixed = ReedSolomon._decode_stripes(
+                        numpy.frombuffer(bytes(pending[:stored]), dtype=numpy.uint8),
+                        usable, parity)
+                    repaired += fixed
+                    remaining -= usable
+                    del pending[:stored]
+                    yield message.tobytes()
+            if pending or remaining:
+                raise ValueError("The encoded message is the wrong length.")
+        finally:
+            if stats is not None:
+                stats["repaired"] = stats.get("repaired", 0) + repaired
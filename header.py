@@ -0,0 +1,299 @@
+__author__ = "Dell-Ray Sackett"
+__version__ = "0.4"
+import struct
+import zlib
+
+import numpy
+
+from bitcodec import BitCodec
+from engine import LSBEngine
+from fec import ReedSolomon
+
+
+class Header:
+    """
+    This class describes a message that has been embedded in an image. It
+    knows how to turn itself into the bytes that get written in front of the
+    message and how to read them back.
+
+    There are two kinds of header. Images written by the original encoder
+    only have a 32 bit length, stored down the first column of the image.
+    Newer images start with a magic number and a version, stored across the
+    first row, which tells the decoder everything it needs to know about how
+    the rest of the image is laid out.
+    """
+
+    MAGIC = b"STEG"
+
+    # Version 0 is the original bare length header with the column layout.
+    # Version 1 adds the magic number and flags and uses the row layout.
+    # Version 2 adds a 64 bit length, the channel mask and a CRC.
+    # Version 3 adds the 64 bit seed of a message scattered across the image.
+    # Version 4 adds the number of Reed-Solomon parity bytes protecting the
+    # message and is written FEC_COPIES times in a row so a few flipped bits
+    # in it can be voted away.
+    # Messages that aren't scattered or protected are still written as
+    # version 2 so older versions can read them.
+    LEGACY_VERSION = 0
+    VERSION = 2
+    SCATTER_VERSION = 3
+    FEC_VERSION = 4
+    FEC_COPIES = 5
+
+    # Every versioned header starts with the magic number and the version.
+    PREFIX_FORMAT = ">4sB"
+    PREFIX_BITS = struct.calcsize(PREFIX_FORMAT) * 8
+
+    # What follows the prefix for each version.
+    # 1: flags (depth - 1 in the low two bits), length
+    # 2: depth, channel mask, flags, length, CRC32 of everything before it
+    # 3: depth, channel mask, flags, length, seed, CRC32
+    # 4: depth, channel mask, flags, length, seed, parity bytes, CRC32
+    FORMATS = {1: ">BI", 2: ">BBBQI", 3: ">BBBQQI", 4: ">BBBQQBI"}
+    FEC_BITS = (PREFIX_BITS + struct.calcsize(FORMATS[FEC_VERSION]) * 8) * FEC_COPIES
+    MAX_BITS = max(PREFIX_BITS + max(map(struct.calcsize, FORMATS.values())) * 8,
+                   FEC_BITS)
+
+    # The flags byte of a version 2 header. Version 4 always has room for a
+    # seed so it flags whether there is one.
+    COMPRESSION_MASK = 0x0F
+    FLAG_SCATTERED = 0x20
+    FLAG_SCATTER_KEY = 0x40
+    FLAG_ENCRYPTED = 0x80
+
+    def __init__(self, length, depth=1, version=VERSION, color_size=3,
+                 flags=0, seed=None, fec=0):
+        """
+        Initialize the header.
+
+        Mandatory Arguments:
+        length -- The length of the message in bytes.
+
+        Optional Arguments:
+        depth -- The number of bits per channel the message is stored in.
+            (Int, default=1)
+        version -- The header version. Header.LEGACY_VERSION writes the
+            original column layout. (Int, default=Header.VERSION)
+        color_size -- The number of channels per pixel that carry data. It is
+            stored as a mask of the first color_size channels. (Int, default=3)
+        flags -- The compression, encryption and scatter key flags.
+            (Int, default=0)
+        seed -- The seed of a message scattered across the image. Only
+            version 3 and 4 headers have one. (Int, default=None)
+        fec -- The number of Reed-Solomon parity bytes per codeword of the
+            message, or 0 for none. Only version 4 headers have them.
+            (Int, default=0)
+        """
+
+        self.length = length
+        self.depth = depth
+        self.version = version
+        self.color_size = color_size
+        self.flags = flags
+        self.seed = seed
+        self.fec = fec
+
+    def is_legacy(self):
+        """Return True if this is an original bare length header."""
+
+        return self.version == Header.LEGACY_VERSION
+
+    def is_encrypted(self):
+        """Return True if the message was written by Encryptedsteganographer."""
+
+        return bool(self.flags & Header.FLAG_ENCRYPTED)
+
+    def is_scattered(self):
+        """Return True if the message is scattered across the image."""
+
+        return self.seed is not None
+
+    def needs_scatter_key(self):
+        """Return True if the message was scattered with a secret key."""
+
+        return bool(self.flags & Header.FLAG_SCATTER_KEY)
+
+    def stored_length(self):
+        """Return the number of bytes the message takes in the image."""
+
+        if self.fec:
+            return ReedSolomon.encoded_length(self.length, self.fec)
+        return self.length
+
+    def compression(self):
+        """Return the compression code stored in the flags."""
+
+        return self.flags & Header.COMPRESSION_MASK
+
+    def channel_mask(self):
+        """Return the mask of the channels that carry data."""
+
+        return (1 << self.color_size) - 1
+
+    def layout(self):
+        """Return the LSBEngine layout the message is stored in."""
+
+        if self.is_legacy():
+            return LSBEngine.LAYOUT_COLUMNS
+        return LSBEngine.LAYOUT_ROWS
+
+    def size_bits(self):
+        """Return the number of bits the header takes up in the image."""
+
+        if self.is_legacy():
+            return BitCodec.LENGTH_BITS
+        if self.version == Header.FEC_VERSION:
+            return Header.FEC_BITS
+        return Header.PREFIX_BITS + struct.calcsize(Header.FORMATS[self.version]) * 8
+
+    def to_bytes(self):
+        """
+        Return the header as it is stored in the image.
+
+        Exceptions:
+        ValueError -- Raised if this is a legacy header, which isn't byte
+            aligned, or the message is too long for the version.
+        """
+
+        prefix = struct.pack(Header.PREFIX_FORMAT, Header.MAGIC, self.version)
+        if self.version == 1:
+            if self.length > 0xFFFFFFFF:
+                raise ValueError("Messages can be at most " + str(0xFFFFFFFF)
+                                 + " bytes long.")
+            return prefix + struct.pack(Header.FORMATS[1], self.depth - 1,
+                                        self.length)
+        if self.version == 2:
+            body = prefix + struct.pack(">BBBQ", self.depth, self.channel_mask(),
+                                        self.flags, self.length)
+            return body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+        if self.version == 3:
+            body = prefix + struct.pack(">BBBQQ", self.depth, self.channel_mask(),
+                                        self.flags, self.length, self.seed)
+            return body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+        if self.version == 4:
+            flags = self.flags
+            if self.seed is not None:
+                flags |= Header.FLAG_SCATTERED
+            body = prefix + struct.pack(">BBBQQB", self.depth, self.channel_mask(),
+                                        flags, self.length, self.seed or 0,
+                                        self.fec)
+            return (body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)) * \
+                Header.FEC_COPIES
+        raise ValueError("Header version " + str(self.version) +
+                         " can't be written as bytes.")
+
+    def to_bits(self):
+        """
+        Return the header as a numpy uint8 array of bits, ready to be written
+        into the image 1 bit per channel.
+
+        Exceptions:
+        ValueError -- Raised if the message is too long to be described.
+        """
+
+        if self.is_legacy():
+            return BitCodec.header_bits(self.length, self.depth)
+        return BitCodec.to_bits(self.to_bytes())
+
+    @staticmethod
+    def _vote(read_bits, available=None):
+        """
+        Read the FEC_COPIES copies of a version 4 header and return the bytes
+        of the header they vote for, or None if that isn't a version 4
+        header.
+        """
+
+        if available is not None and available < Header.FEC_BITS:
+            return None
+        copies = numpy.asarray(read_bits(Header.FEC_BITS)).reshape(Header.FEC_COPIES, -1)
+        data = BitCodec.from_bits(
+            (copies.sum(axis=0, dtype=numpy.int32) > Header.FEC_COPIES // 2)
+            .astype(numpy.uint8))
+        if struct.unpack(Header.PREFIX_FORMAT, data[:Header.PREFIX_BITS // 8]) != \
+                (Header.MAGIC, Header.FEC_VERSION):
+            return None
+        return data
+
+    @staticmethod
+    def read(read_bits, color_size=3, available=None):
+        """
+        Return the Header stored across the first row of an image, or None
+        if the image doesn't start with the magic number. Only the prefix is
+        read until the magic number checks out, unless it could be a damaged
+        version 4 header.
+
+        Mandatory Arguments:
+        read_bits -- A function that takes a number of bits and returns that
+            many bits from the start of the row layout.
+
+        Optional Arguments:
+        color_size -- The number of channels per pixel that carry data in
+            the image, for header versions that don't store it. (Int, default=3)
+        available -- The number of bits that can be read. Headers that
+            wouldn't fit aren't looked for. (Int, default=no limit)
+
+        Exceptions:
+        ValueError -- Raised if the header has an unknown version, fails its
+            CRC check or describes something this version can't decode.
+        """
+
+        if available is not None and available < Header.PREFIX_BITS:
+            return None
+        magic, version = struct.unpack(Header.PREFIX_FORMAT, BitCodec.from_bits(
+            read_bits(Header.PREFIX_BITS)))
+        if magic != Header.MAGIC or version == Header.FEC_VERSION:
+            # Version 4 headers are always read by voting, which also finds
+            # one whose first copy is damaged.
+            data = Header._vote(read_bits, available)
+            if data is None:
+                return None
+            version = Header.FEC_VERSION
+        else:
+            if version not in Header.FORMATS:
+                raise ValueError("The image has a version " + str(version) +
+                                 " header, which this version can't read.")
+            size = Header.PREFIX_BITS + struct.calcsize(Header.FORMATS[version]) * 8
+            if available is not None and available < size:
+                return None
+            data = BitCodec.from_bits(read_bits(size))
+        fields = struct.unpack(Header.FORMATS[version],
+                               data[Header.PREFIX_BITS // 8:])
+        if version == 1:
+            return Header(fields[1], (fields[0] & 0x03) + 1, version, color_size)
+
+        depth, channel_mask, flags, length = fields[:4]
+        seed = fields[4] if version == 3 else None
+        fec = 0
+        if version == 4:
+            seed = fields[4] if flags & Header.FLAG_SCATTERED else None
+            fec = fields[5]
+        crc = fields[-1]
+        if zlib.crc32(data[:-4]) & 0xFFFFFFFF != crc:
+            raise ValueError("The header in the image is corrupt.")
+        if not 1 <= depth <= LSBEngine.MAX_DEPTH:
+            raise ValueError("The header in the image has an unsupported depth.")
+        if channel_mask & (channel_mask + 1):
+            raise ValueError("The header in the image has an unsupported "
+                             + "channel mask.")
+        if version == 4 and not 1 <= fec <= ReedSolomon.MAX_PARITY:
+            raise ValueError("The header in the image has an unsupported "
+                             + "number of parity bytes.")
+        return Header(length, depth, version, bin(channel_mask).count("1"), flags,
+                      seed, fec)
+
+    @staticmethod
+    def from_legacy_bits(bits, color_size=3):
+        """
+        Return the Header described by the 32 bit length read down the first
+        column of an image.
+
+        Mandatory Arguments:
+        bits -- At least BitCodec.LENGTH_BITS bits.
+
+        Optional Arguments:
+        color_size -- The number of channels per pixel that carry data in
+            the image. (Int, default=3)
+        """
+
+        length, depth = BitCodec.parse_header_bits(bits[:BitCodec.LENGTH_BITS])
+        return Header(length, depth, Header.LEGACY_VERSION, color_size)
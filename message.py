@@ -1,37 +1,63 @@
 __author__ = "Dell-Ray Sackett"
-__version__ = "0.1"
-import pickle
+__version__ = "0.3"
+import os
+import struct
+import threading
 from Crypto.PublicKey import RSA
 from Crypto.Hash import SHA256
 from Crypto.Cipher import AES
+from Crypto.Cipher import PKCS1_OAEP
+from Crypto.Signature import pss
 from Crypto import Random
-import base64
 
 
 class Message:
     """
-    This is a class to hold an encrypted message. It is specifically 
-    designed to be pickeled and stored. Nothing more. Although I guess it 
-    could have some use in networking?
+    This is a class to hold an encrypted message. It is stored in the image
+    as a compact binary envelope instead of being pickled, so loading one
+    never runs code from the image and no space is wasted on base64.
+
+    The envelope is the magic number, a version and a flags byte followed by
+    the public key, the symmetric key wrapped with RSA-OAEP, the encrypted
+    message and the RSA-PSS signature, each behind a 32 bit big-endian
+    length. The public key
+    is either the sender's DER encoded key or, to save space when the
+    recipient already has it, the SHA256 fingerprint of it. The signature
+    comes last so it can be written once the message has streamed past.
     """
 
-    def __init__(self, public_key, symmetric_key, signature, message):
+    MAGIC = b"SMSG"
+    VERSION = 1
+    HEADER_FORMAT = ">4sBB"
+    FIELD_FORMAT = ">I"
+
+    # Set in the flags byte when the envelope holds a key fingerprint.
+    FLAG_KEY_FINGERPRINT = 0x01
+
+    def __init__(self, public_key, symmetric_key, signature, message,
+                 key_fingerprint=False):
         """
         Initialize the object.
         
         Keyword Arguments:
         public_key -- The public key of the sending party. Should be a x509 DER
-            sequence that can be directly imported by pyCrypto.
+            sequence that can be directly imported by pyCrypto, or its
+            SHA256 fingerprint if key_fingerprint is True.
         symmetric_key -- The asymmetrically encrypted symmetric key for AES256
             encryption.
-        signature -- Message .
-        message -- The message encrypted.
+        signature -- The signature of the plaintext message.
+        message -- The message encrypted by CryptoHelper.stream_encrypt.
+        key_fingerprint -- True if public_key is only a fingerprint.
+            (Bool, default=False)
         
         """
         self._publicKey = public_key
         self._symmetricKey = symmetric_key
         self._signature = signature
         self._message = message
+        self._keyFingerprint = key_fingerprint
+        # The envelope a loaded message was parsed out of.
+        self._envelope = None
 
     """
     There is no real reason to only get 1 of these values. So I am only
@@ -43,53 +69,211 @@ class Message:
 
         return [self._publicKey, self._symmetricKey, self._signature, self._message]
 
-    # Pickle and Unpickle
+    def has_key_fingerprint(self):
+        """Return True if the message only holds the sender's key fingerprint."""
+
+        return self._keyFingerprint
+
+    @staticmethod
+    def fingerprint(public_key):
+        """
+        Return the SHA256 fingerprint of a DER encoded public key.
+
+        Mandatory Arguments:
+        public_key -- The DER encoded public key.
+        """
+
+        return SHA256.new(bytes(public_key)).digest()
+
+    # Serialize and parse the envelope
+    @staticmethod
+    def pack_header(key_fingerprint=False):
+        """Return the bytes that start an envelope."""
+
+        flags = Message.FLAG_KEY_FINGERPRINT if key_fingerprint else 0
+        return struct.pack(Message.HEADER_FORMAT, Message.MAGIC,
+                           Message.VERSION, flags)
+
+    @staticmethod
+    def pack_field_length(length):
+        """Return the length that goes in front of an envelope field."""
+
+        return struct.pack(Message.FIELD_FORMAT, length)
+
+    @staticmethod
+    def unpack_header(header):
+        """
+        Check the bytes that start an envelope and return True if the
+        envelope holds a key fingerprint.
+
+        Mandatory Arguments:
+        header -- The first struct.calcsize(Message.HEADER_FORMAT) bytes.
+
+        Exceptions:
+        ValueError -- Raised if this isn't an envelope this version can read.
+        """
+
+        magic, version, flags = struct.unpack(Message.HEADER_FORMAT, header)
+        if magic != Message.MAGIC:
+            raise ValueError("The message is not an encrypted message envelope.")
+        if version != Message.VERSION:
+            raise ValueError("The message envelope has version " + str(version) +
+                             ", which this version can't read.")
+        return bool(flags & Message.FLAG_KEY_FINGERPRINT)
+
     def dump_message(self):
-        """Pickle the message and return it."""
+        """Return the message as a binary envelope."""
+
+        parts = [Message.pack_header(self._keyFingerprint)]
+        for field in (self._publicKey, self._symmetricKey, self._message,
+                      self._signature):
+            parts.append(Message.pack_field_length(len(field)))
+            parts.append(field)
+        return b"".join(parts)
+
+    def envelope(self):
+        """
+        Return the message as a binary envelope. A message that was loaded
+        from an envelope returns a view of it instead of packing a copy.
+        """
 
-        return pickle.dumps(self)
+        if self._envelope is not None:
+            return self._envelope
+        return self.dump_message()
 
     @staticmethod
     def load_message(message):
         """
-        Unpickle a message string and return the object.
+        Parse a binary envelope and return the Message. The fields are
+        memoryview slices of the envelope so nothing is copied.
 
         Mandatory Arguments:
-        message -- A pickled message string.
-        """
+        message -- The envelope as bytes, bytearray or memoryview.
 
-        return pickle.loads(message)
+        Exceptions:
+        ValueError -- Raised if the envelope is malformed or from an
+            unsupported version.
+        """
 
-class CryptoHelper:
-    """
-    This class will do the encryption and decryption of a message object.
-    It will be almost completely static hah!
+        view = memoryview(message)
+        header_size = struct.calcsize(Message.HEADER_FORMAT)
+        field_size = struct.calcsize(Message.FIELD_FORMAT)
+        if len(view) < header_size:
+            raise ValueError("The message is too short to be an envelope.")
+        key_fingerprint = Message.unpack_header(view[:header_size])
+
+        fields = []
+        offset = header_size
+        for _ in range(4):
+            if offset + field_size > len(view):
+                raise ValueError("The message envelope is truncated.")
+            length, = struct.unpack_from(Message.FIELD_FORMAT, view, offset)
+            offset += field_size
+            if offset + length > len(view):
+                raise ValueError("The message envelope is truncated.")
+            fields.append(view[offset:offset + length])
+            offset += length
+        public_key, symmetric_key, message, signature = fields
+        loaded = Message(public_key, symmetric_key, signature, message,
+                         key_fingerprint)
+        loaded._envelope = view[:offset]
+        return loaded
+
+
+class ChunkReader:
     """
+    This class reads exact amounts of data out of an iterable of byte chunks,
+    like the chunks decoded out of an image, without joining them together.
+    Data comes back as memoryview slices of the chunks wherever it doesn't
+    straddle two of them.
     """
-    I took pad and unpad from a stack exchange post.
-    http://stackoverflow.com/a/12525165
-    """
-    # Define the symmetric block size as a static variable.
-    BS = 16
 
-    # Static Methods
-    @staticmethod
-    def pad(s):
+    def __init__(self, chunks):
         """
-        Takes string s and returns it padded to blocksize CryptoHelper.BS.
+        Initialize the reader.
+
+        Mandatory Arguments:
+        chunks -- An iterable of bytes-like chunks.
         """
 
-        return s + (CryptoHelper.BS - len(s) % CryptoHelper.BS) * chr(
-            CryptoHelper.BS - len(s) % CryptoHelper.BS)
+        self._chunks = iter(chunks)
+        self._buffer = memoryview(b"")
 
-    @staticmethod
-    def unpad(s):
+    def _next_chunk(self):
+        """Return the next chunk or raise ValueError if there are none left."""
+
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            raise ValueError("The message is truncated.")
+        return memoryview(chunk).cast("B")
+
+    def read(self, size):
         """
-        Takes padded string s and returns it sans padding.
+        Return exactly size bytes as a memoryview.
+
+        Exceptions:
+        ValueError -- Raised if the chunks run out first.
         """
 
-        return s[:-ord(s[len(s) - 1:])]
+        if len(self._buffer) < size:
+            parts = [self._buffer]
+            available = len(self._buffer)
+            while available < size:
+                parts.append(self._next_chunk())
+                available += len(parts[-1])
+            self._buffer = memoryview(b"".join(parts))
+        data = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return data
+
+    def read_chunks(self, size):
+        """
+        Yield chunks as they arrive until exactly size bytes have been read.
+
+        Exceptions:
+        ValueError -- Raised if the chunks run out first.
+        """
 
+        while size > 0:
+            if not self._buffer:
+                self._buffer = self._next_chunk()
+            data = self._buffer[:size]
+            self._buffer = self._buffer[size:]
+            size -= len(data)
+            yield data
+
+    def read_rest(self):
+        """Yield whatever is left, a chunk at a time."""
+
+        if self._buffer:
+            yield self._buffer
+            self._buffer = memoryview(b"")
+        for chunk in self._chunks:
+            yield memoryview(chunk).cast("B")
+
+
+class CryptoHelper:
+    """
+    This class will do the encryption and decryption of a message object.
+    It will be almost completely static hah!
+    """
+
+    # Keys imported from files, keyed by the absolute filename, modification
+    # time, size and a fingerprint of the passphrase. Importing a protected
+    # key runs the passphrase KDF and parses the whole key, so doing it once
+    # per process instead of once per message matters for batches.
+    MAX_CACHED_KEYS = 64
+    _key_cache = {}
+    _key_cache_lock = threading.Lock()
+
+    # Streamed messages are encrypted and authenticated in one pass with
+    # AES-256 in GCM mode. A stream is the nonce, the ciphertext and the tag,
+    # so it is exactly STREAM_OVERHEAD bytes longer than the plaintext.
+    NONCE_SIZE = 12
+    TAG_SIZE = 16
+    STREAM_OVERHEAD = NONCE_SIZE + TAG_SIZE
+
+    # Static Methods
     @staticmethod
     def generate_keys(filename, passphrase, modulus=2048):
         """
@@ -112,73 +296,326 @@ class CryptoHelper:
         if filename[len(filename) - 4:] != ".pem":
             filename += ".pem"
         try:
-            keyfile = open(filename, "w")
-            pubkeyfile = open(filename[:len(filename) - 4] + "_publiconly.pem", "w")
+            keyfile = open(filename, "wb")
+            pubkeyfile = open(filename[:len(filename) - 4] + "_publiconly.pem", "wb")
 
         except Exception as e:
             raise e
         keyfile.write(key.exportKey(format="PEM", passphrase=passphrase))
-        pubkeyfile.write(key.exportKey(format="PEM", pkcs=8))
+        pubkeyfile.write(key.publickey().exportKey(format="PEM"))
         keyfile.close()
         pubkeyfile.close()
         return key
 
     @staticmethod
-    def import_keys(filename, passphrase):
+    def import_keys(filename, passphrase, cache=True):
         """
-        Import a key from file and return a RSA key object
+        Import a key from file and return a RSA key object. Keys are cached
+        until the file changes or forget_keys is called.
         
         Mandatory Arguments:
         filename -- The filename of the key to import.
         passphrase -- The passphrase for your key
+
+        Optional Arguments:
+        cache -- Use and fill the key cache. (Bool, default=True)
         """
 
+        if not cache:
+            return CryptoHelper._read_key(filename, passphrase)
+
+        try:
+            stat = os.stat(filename)
+        except Exception as e:
+            raise e
+        if isinstance(passphrase, str):
+            passphrase_bytes = passphrase.encode("utf-8")
+        else:
+            passphrase_bytes = passphrase or b""
+        cache_key = (os.path.abspath(filename), stat.st_mtime_ns, stat.st_size,
+                     SHA256.new(passphrase_bytes).hexdigest())
+
+        with CryptoHelper._key_cache_lock:
+            key = CryptoHelper._key_cache.get(cache_key)
+        if key is not None:
+            return key
+
+        key = CryptoHelper._read_key(filename, passphrase)
+        with CryptoHelper._key_cache_lock:
+            # Older versions of the file are never coming back.
+            for stale in [k for k in CryptoHelper._key_cache
+                          if k[0] == cache_key[0] and k[1:3] != cache_key[1:3]]:
+                del CryptoHelper._key_cache[stale]
+            if len(CryptoHelper._key_cache) >= CryptoHelper.MAX_CACHED_KEYS:
+                del CryptoHelper._key_cache[next(iter(CryptoHelper._key_cache))]
+            CryptoHelper._key_cache[cache_key] = key
+        return key
+
+    @staticmethod
+    def _read_key(filename, passphrase):
+        """Read and parse a key file without touching the cache."""
+
         try:
             keyfile = open(filename, "r")
         except Exception as e:
             raise e
 
-        return RSA.importKey(keyfile.read(), passphrase)
+        with keyfile:
+            return RSA.importKey(keyfile.read(), passphrase)
+
+    @staticmethod
+    def forget_keys(filename=None):
+        """
+        Drop cached keys so they are read from file again the next time they
+        are imported.
+
+        Optional Arguments:
+        filename -- Only forget the keys imported from this file.
+            (default=forget every key)
+        """
+
+        with CryptoHelper._key_cache_lock:
+            if filename is None:
+                CryptoHelper._key_cache.clear()
+                return
+            path = os.path.abspath(filename)
+            for stale in [k for k in CryptoHelper._key_cache if k[0] == path]:
+                del CryptoHelper._key_cache[stale]
 
     @staticmethod
-    def get_public_key(key_pair):
-        """Return the PEM encoded public key"""
+    def get_public_key(key_pair, key_format="PEM"):
+        """Return the PEM, or with key_format="DER" the DER, encoded public key"""
 
-        return key_pair.publickey().exportKey()
+        return key_pair.publickey().exportKey(key_format)
 
     @staticmethod
-    def symmetric_encrypt(plaintext):
+    def read_chunks(fd, chunk_size):
         """
-        Takes a string and encrypts it. Returning a tuple with the IV, 
-        the symmetric key (plaintext) and the encrypted 
-        string. The IV and the ciphertext will be concatenated together with 
-        the IV in front.
-        
+        Return an iterator over a file object chunk_size bytes at a time, for
+        use with the streaming methods.
+
+        Mandatory Arguments:
+        fd -- A file object opened in binary mode.
+        chunk_size -- The number of bytes to read at a time.
+        """
+
+        return iter(lambda: fd.read(chunk_size), b"")
+
+    @staticmethod
+    def stream_encrypt(chunks, key):
+        """
+        Encrypt an iterable of plaintext chunks and yield the stream: the
+        nonce, the ciphertext a chunk at a time and finally the tag. Only
+        one chunk is held in memory at a time.
+
+        Mandatory Arguments:
+        chunks -- An iterable of bytes-like chunks, for example from
+            CryptoHelper.read_chunks.
+        key -- The symmetric key.
+        """
+
+        nonce = Random.new().read(CryptoHelper.NONCE_SIZE)
+        cryptor = AES.new(bytes(key), AES.MODE_GCM, nonce=nonce,
+                          mac_len=CryptoHelper.TAG_SIZE)
+        yield nonce
+        for chunk in chunks:
+            yield cryptor.encrypt(chunk)
+        yield cryptor.digest()
+
+    @staticmethod
+    def stream_decrypt(chunks, key):
+        """
+        Decrypt an iterable of stream chunks from stream_encrypt and yield
+        the plaintext a chunk at a time. The tag can only be checked once
+        the whole stream has been read, so anything yielded has to be thrown
+        away if this raises.
+
+        Mandatory Arguments:
+        chunks -- An iterable of bytes-like chunks.
+        key -- The symmetric key.
+
+        Exceptions:
+        ValueError -- Raised at the end of the stream if it is truncated or
+            fails authentication.
+        """
+
+        reader = ChunkReader(chunks)
+        nonce = bytes(reader.read(CryptoHelper.NONCE_SIZE))
+        cryptor = AES.new(bytes(key), AES.MODE_GCM, nonce=nonce,
+                          mac_len=CryptoHelper.TAG_SIZE)
+
+        # Hold back enough of the stream to be sure the tag isn't in it.
+        # Only that tail is ever copied.
+        held = b""
+        for chunk in reader.read_rest():
+            if held:
+                chunk = held + chunk
+            usable = len(chunk) - CryptoHelper.TAG_SIZE
+            if usable > 0:
+                yield cryptor.decrypt(chunk[:usable])
+                held = bytes(chunk[usable:])
+            else:
+                held = bytes(chunk)
+
+        if len(held) < CryptoHelper.TAG_SIZE:
+            raise ValueError("The encrypted message is truncated.")
+        try:
+            cryptor.verify(held)
+        except ValueError:
+            raise ValueError("The encrypted message failed authentication.")
+
+    @staticmethod
+    def signature_size(key):
+        """Return the number of bytes a signature made with an RSA key takes."""
+
+        return key.size_in_bytes()
+
+    @staticmethod
+    def _verification_key(public_key, key_fingerprint, verification_key_filename):
+        """
+        Return the RSA key to verify a message with, from the public key
+        field of its envelope.
+
+        Exceptions:
+        ValueError -- Raised if the envelope only carries a fingerprint and
+            there is no matching verification key.
+        """
+
+        if not key_fingerprint:
+            return RSA.importKey(bytes(public_key))
+        if verification_key_filename is None:
+            raise ValueError("The message only carries the fingerprint of the "
+                             + "sender's key. The sender's public key is needed "
+                             + "to verify it.")
+        sigkey = CryptoHelper.import_keys(verification_key_filename, "")
+        if (Message.fingerprint(CryptoHelper.get_public_key(sigkey, "DER")) !=
+                bytes(public_key)):
+            raise ValueError("The message was not signed by the owner of "
+                             + verification_key_filename + ".")
+        return sigkey
+
+    @staticmethod
+    def encrypt_message_stream(chunks, length, encryption_key_filename, signing_key_filename,
+                               signing_key_passphrase, fingerprint_only=False):
+        """
+        Encrypt and sign a message that arrives as chunks. Returns a tuple of
+        the length of the finished envelope and a generator that yields the
+        envelope a chunk at a time, so a message of any size can be embedded
+        without holding it in memory.
+
         Mandatory Arguments:
-        plaintext -- A string to be encrypted.
+        chunks -- An iterable of bytes-like chunks of the message.
+        length -- The total length of the chunks.
+        encryption_key_filename -- Filename of the publickey to use for
+            encryption as a String.
+        signing_key_filename -- Filename of the RSA keypair to use for
+            signing the message as a string
+        signing_key_passphrase -- The passphrase to the singing keypair.
+
+        Optional Arguments:
+        fingerprint_only -- Only store the fingerprint of the signing public
+            key instead of the key itself. (Bool, default=False)
+
+        Exceptions:
+        ValueError -- Raised by the generator if the chunks don't add up to
+            length.
         """
 
-        paddedplaintext = CryptoHelper.pad(plaintext)
-        IV = Random.new().read(AES.block_size)
+        enckey = CryptoHelper.import_keys(encryption_key_filename, "")
+        sigkey = CryptoHelper.import_keys(signing_key_filename,
+                                          signing_key_passphrase)
         key = SHA256.new(Random.new().read(1024)).digest()
-        cryptor = AES.new(key, AES.MODE_CBC, IV)
-        return (key, base64.b64encode(
-            IV + cryptor.encrypt(paddedplaintext)))
+        symmetrickey = PKCS1_OAEP.new(enckey, SHA256).encrypt(key)
+        pubkey = CryptoHelper.get_public_key(sigkey, "DER")
+        if fingerprint_only:
+            pubkey = Message.fingerprint(pubkey)
+
+        prefix = b"".join((Message.pack_header(fingerprint_only),
+                           Message.pack_field_length(len(pubkey)), pubkey,
+                           Message.pack_field_length(len(symmetrickey)), symmetrickey,
+                           Message.pack_field_length(length + CryptoHelper.STREAM_OVERHEAD)))
+        sigsize = CryptoHelper.signature_size(sigkey)
+        envelope_length = (len(prefix) + length + CryptoHelper.STREAM_OVERHEAD +
+                           len(Message.pack_field_length(sigsize)) + sigsize)
+
+        def generate():
+            myhash = SHA256.new()
+            counted = [0]
+
+            def hashed():
+                for chunk in chunks:
+                    myhash.update(chunk)
+                    counted[0] += len(chunk)
+                    yield chunk
+
+            yield prefix
+            for chunk in CryptoHelper.stream_encrypt(hashed(), key):
+                yield chunk
+            if counted[0] != length:
+                raise ValueError("The message was " + str(counted[0]) + " bytes "
+                                 + "long instead of " + str(length) + ".")
+            yield Message.pack_field_length(sigsize)
+            yield pss.new(sigkey).sign(myhash)
+
+        return envelope_length, generate()
 
     @staticmethod
-    def symmetric_decrypt(key, ciphertext):
+    def decrypt_message_stream(chunks, decryption_key_filename, decryption_key_passphrase,
+                               verification_key_filename=None):
         """
-        Takes a key and base64 encoded ciphertext with an IV concatenated at 
-        the beginning and returns a plaintext string.
+        Decrypt an envelope that arrives as chunks and yield the plaintext a
+        chunk at a time. The message can only be authenticated and verified
+        once all of it has been read, so anything yielded has to be thrown
+        away if this raises.
+
+        Mandatory Arguments:
+        chunks -- An iterable of bytes-like chunks of the envelope.
+        decryption_key_filename -- The filename of the RSA keypair to be
+            used for decryption.
+        decryption_key_passphrase -- The passphrase for the decryption key.
+
+        Optional Arguments:
+        verification_key_filename -- The filename of the sender's public key.
+            Only needed, and only used, for messages that carry just the
+            fingerprint of the sender's key.
+
+        Exceptions:
+        ValueError -- Raised if the envelope is malformed, fails
+            authentication or can't be verified.
         """
 
-        decodedciphertext = base64.b64decode(ciphertext)
-        IV = decodedciphertext[:16]
-        cryptor = AES.new(key, AES.MODE_CBC, IV)
-        return CryptoHelper.unpad(cryptor.decrypt(decodedciphertext[16:]))
+        decryptkey = CryptoHelper.import_keys(decryption_key_filename, decryption_key_passphrase)
+        reader = ChunkReader(chunks)
+        field_size = struct.calcsize(Message.FIELD_FORMAT)
+
+        def read_length():
+            return struct.unpack(Message.FIELD_FORMAT, reader.read(field_size))[0]
+
+        key_fingerprint = Message.unpack_header(
+            reader.read(struct.calcsize(Message.HEADER_FORMAT)))
+        public_key = reader.read(read_length())
+        sigkey = CryptoHelper._verification_key(public_key, key_fingerprint,
+                                                verification_key_filename)
+        try:
+            symmetrickey = PKCS1_OAEP.new(decryptkey, SHA256).decrypt(
+                bytes(reader.read(read_length())))
+        except ValueError:
+            raise ValueError("The message was not encrypted for this key.")
+
+        myhash = SHA256.new()
+        for chunk in CryptoHelper.stream_decrypt(reader.read_chunks(read_length()),
+                                                 symmetrickey):
+            myhash.update(chunk)
+            yield chunk
+
+        try:
+            pss.new(sigkey).verify(myhash, bytes(reader.read(read_length())))
+        except ValueError:
+            raise ValueError("The message could not be verified")
 
     @staticmethod
-    def encrypt_message(message, encryption_key_filename, signing_key_filename, signing_key_passphrase):
+    def encrypt_message(message, encryption_key_filename, signing_key_filename, signing_key_passphrase,
+                        fingerprint_only=False):
         """
         Takes a String message and encrypts it with the publickey from
         the RSA publickey in the file from encryptionKeyFilename. Also signs
@@ -192,22 +629,23 @@ class CryptoHelper:
         signingKeyFilename -- Filename of the RSA keypair to use for
             signing the message as a string
         signingKeyPassphrase -- The passphrase to the singing keypair.
-        """
 
-        enckey = CryptoHelper.import_keys(encryption_key_filename, "")
-        sigkey = CryptoHelper.import_keys(signing_key_filename,
-                                          signing_key_passphrase)
-        myhash = SHA256.new()
-        myhash.update(message)
-        cipheredmessage = CryptoHelper.symmetric_encrypt(message)
-        messagesig = base64.b64encode(str(sigkey.sign(myhash.digest(), "")[0]))
-        symmetrickey = base64.b64encode(enckey.encrypt(cipheredmessage[0], 32)[0])
-        pubkey = CryptoHelper.get_public_key(sigkey)
+        Optional Arguments:
+        fingerprint_only -- Only store the fingerprint of the signing public
+            key instead of the key itself. The recipient then needs the
+            sender's public key to verify the message. (Bool, default=False)
+        """
 
-        return Message(pubkey, symmetrickey, messagesig, cipheredmessage[1])
+        if isinstance(message, str):
+            message = message.encode("latin-1")
+        envelope = CryptoHelper.encrypt_message_stream(
+            [message], len(message), encryption_key_filename, signing_key_filename,
+            signing_key_passphrase, fingerprint_only)[1]
+        return Message.load_message(b"".join(envelope))
 
     @staticmethod
-    def decrypt_message(message_object, decryption_key_filename, decryption_key_passphrase):
+    def decrypt_message(message_object, decryption_key_filename, decryption_key_passphrase,
+                        verification_key_filename=None):
         """
         Takes a message Object and a string containing the filename of the
         decryption keypair. Decrypts and verifies the message. If the message
@@ -221,21 +659,17 @@ class CryptoHelper:
             keypair to be used for decryption.
         decryptionKeyPassphrase -- String containing the passphrase for 
             decrypting the decryption key.
-        """
 
-        try:
-            decryptkey = CryptoHelper.import_keys(decryption_key_filename, decryption_key_passphrase)
-        except Exception as e:
-            raise e
+        Optional Arguments:
+        verification_key_filename -- The filename of the sender's public key.
+            Only needed, and only used, for messages that carry just the
+            fingerprint of the sender's key.
 
-        # A list with [publicKey, signature, encMessage]
-        expandedmessage = message_object.get_message()
-        sigkey = RSA.importKey(expandedmessage[0])
-        symmetrickey = decryptkey.decrypt(base64.b64decode(expandedmessage[1]))
-        plaintext = CryptoHelper.symmetric_decrypt(symmetrickey, expandedmessage[3])
-        messagehash = SHA256.new(plaintext).digest()
-        signature = (long(base64.b64decode(expandedmessage[2])),)
-        if not sigkey.verify(messagehash, signature):
-            raise ValueError("The message could not be verified")
-        else:
-            return plaintext
+        Exceptions:
+        ValueError -- Raised if the message can't be verified, or if it only
+            carries a key fingerprint that doesn't match the verification key.
+        """
+
+        return b"".join(CryptoHelper.decrypt_message_stream(
+            [message_object.envelope()], decryption_key_filename,
+            decryption_key_passphrase, verification_key_filename))
@@ -0,0 +1,119 @@
+__author__ = "Dell-Ray Sackett"
+__version__ = "0.2"
+import os
+
+from PIL import Image
+import numpy
+
+
+class RawCarrier:
+    """
+    This class maps the pixels of carriers that are stored uncompressed
+    straight out of the file with numpy.memmap, so they can be read and
+    written a few rows at a time without decoding or re-encoding the whole
+    image. Like LSBEngine it is completely static.
+
+    Supported carriers are .npy files, raw pixel dumps with a known shape and
+    uncompressed TIFF, PPM and BMP.
+    """
+
+    # How PIL raw modes map onto the channels of the file. Each entry is the
+    # number of bytes per pixel and the channels to use in the order of the
+    # image mode.
+    RAW_MODES = {"RGB": (3, slice(None)), "RGBA": (4, slice(None)),
+                 "CMYK": (4, slice(None)), "BGR": (3, slice(None, None, -1)),
+                 "BGRX": (4, slice(2, None, -1))}
+
+    # Image modes for raw and .npy carriers by number of channels.
+    CHANNEL_MODES = {3: "RGB", 4: "RGBA"}
+
+    # The extensions of the files map can handle without being given a
+    # shape. Anything else isn't worth opening to find out.
+    EXTENSIONS = (".npy", ".tif", ".tiff", ".ppm", ".pnm", ".bmp", ".dib")
+
+    @staticmethod
+    def can_map(filename):
+        """
+        Return True if a carrier file might be mappable going by its
+        extension. Only map can tell for sure, since a TIFF can still be
+        compressed.
+
+        Mandatory Arguments:
+        filename -- The filename of the carrier.
+        """
+
+        return os.path.splitext(filename)[1].lower() in RawCarrier.EXTENSIONS
+
+    @staticmethod
+    def map(filename, mode="r", shape=None, offset=0):
+        """
+        Map the pixels of a carrier file and return a tuple of a
+        (height, width, channels) numpy view of them, the memmap backing it,
+        the image mode and the image format. The format is None for .npy
+        files and raw pixel dumps. Nothing is read from the file until the
+        view is used.
+
+        Mandatory Arguments:
+        filename -- The filename of the carrier.
+
+        Optional Arguments:
+        mode -- "r" to map read only, "r+" to write through to the file, "c"
+            to keep writes in memory. (String, default="r")
+        shape -- The (height, width, channels) of a raw pixel dump.
+        offset -- The number of bytes before the pixels of a raw pixel dump.
+            (Int, default=0)
+
+        Exceptions:
+        IOError -- Raised if the file can't be opened.
+        ValueError -- Raised if the pixels aren't stored uncompressed in a
+            layout that can be mapped.
+        """
+
+        if shape is not None:
+            backing = numpy.memmap(filename, dtype=numpy.uint8, mode=mode,
+                                   offset=offset, shape=tuple(shape))
+            return (backing, backing,
+                    RawCarrier.CHANNEL_MODES.get(shape[2], ""), None)
+
+        if os.path.splitext(filename)[1].lower() == ".npy":
+            backing = numpy.load(filename, mmap_mode=mode)
+            if backing.dtype != numpy.uint8 or backing.ndim != 3:
+                raise ValueError("The carrier " + filename + " must be a "
+                                 + "(height, width, channels) uint8 array.")
+            return (backing, backing,
+                    RawCarrier.CHANNEL_MODES.get(backing.shape[2], ""), None)
+
+        image = Image.open(filename)
+        width, height = image.size
+        tiles = sorted(image.tile, key=lambda tile: tile.extents[1])
+        image_mode = image.mode
+        image_format = image.format
+        image.close()
+
+        if not tiles:
+            raise ValueError("The carrier " + filename + " has to be stored "
+                             + "uncompressed to be mapped.")
+        first = tiles[0]
+        args = first.args if isinstance(first.args, tuple) else (first.args, 0, 1)
+        if (first.codec_name != "raw" or args[0] not in RawCarrier.RAW_MODES):
+            raise ValueError("The carrier " + filename + " has to be stored "
+                             + "uncompressed to be mapped.")
+        pixel_size, channels = RawCarrier.RAW_MODES[args[0]]
+        stride = args[1] or width * pixel_size
+        orientation = args[2] if len(args) > 2 else 1
+
+        # Strips are fine as long as they follow one another in the file.
+        for tile in tiles:
+            if (tile.codec_name != first.codec_name or tile.args != first.args or
+                    tile.extents[0] != 0 or tile.extents[2] != width or
+                    tile.offset != first.offset + tile.extents[1] * stride):
+                raise ValueError("The carrier " + filename + " doesn't store "
+                                 + "its pixels contiguously.")
+
+        backing = numpy.memmap(filename, dtype=numpy.uint8, mode=mode)
+        pixels = numpy.ndarray((height, width, pixel_size), dtype=numpy.uint8,
+                               buffer=backing, offset=first.offset,
+                               strides=(stride, pixel_size, 1))
+        if orientation < 0:
+            pixels = pixels[::-1]
+        return pixels[:, :, channels], backing, image_mode, image_format
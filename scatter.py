@@ -0,0 +1,155 @@
+__author__ = "Dell-Ray Sackett"
+__version__ = "0.1"
+import os
+
+from Crypto.Hash import HMAC
+from Crypto.Hash import SHA256
+import numpy
+
+
+class ScatterMap:
+    """
+    This class spreads a message over the whole image instead of packing it
+    into the first channels. Message slot i is stored in slot permute(i) of
+    the image, where permute is a keyed pseudo-random permutation of every
+    slot after the header.
+
+    The permutation is a small unbalanced Feistel network over the next
+    power of two above the number of slots, with cycle walking to bring
+    values that land past the end back in range. Any index can be mapped on
+    its own, so the positions are worked out a block at a time for just the
+    slots the message uses. Nothing the size of the image is ever built, and
+    embedding costs the same in a 1 MP image as in a 100 MP one.
+
+    The permutation is keyed by a random seed stored in the header and an
+    optional secret key. Without the key the seed only moves the message
+    around, with it the message can't be found without the key.
+    """
+
+    # Enough rounds that the output looks random even though the round
+    # function is cheap.
+    ROUNDS = 6
+
+    # The number of positions worked out at a time. Small enough that the
+    # working arrays stay in cache.
+    BLOCK_SIZE = 1 << 16
+
+    # The splitmix64 constants.
+    _GAMMA = numpy.uint64(0x9E3779B97F4A7C15)
+    _MIX1 = numpy.uint64(0xBF58476D1CE4E5B9)
+    _MIX2 = numpy.uint64(0x94D049BB133111EB)
+
+    def __init__(self, size, seed, key=b""):
+        """
+        Initialize a ScatterMap.
+
+        Mandatory Arguments:
+        size -- The number of slots to spread the message over.
+        seed -- The 64 bit seed from the header.
+
+        Optional Arguments:
+        key -- The secret key as a string or bytes. (default=no key)
+
+        Exceptions:
+        ValueError -- Raised if size is less than 1.
+        """
+
+        if size < 1:
+            raise ValueError("There are no slots to scatter the message over.")
+        self.size = size
+        # The two halves together cover the smallest power of two that holds
+        # size, so fewer than half the values ever land past the end.
+        __bits = max(2, int(size - 1).bit_length())
+        self._low_bits = numpy.uint64(__bits // 2)
+        self._low_mask = numpy.uint64((1 << (__bits // 2)) - 1)
+        self._high_mask = numpy.uint64((1 << (__bits - __bits // 2)) - 1)
+
+        if isinstance(key, str):
+            key = key.encode("utf-8")
+        __keys = b""
+        __block = 0
+        while len(__keys) < ScatterMap.ROUNDS * 8:
+            __keys += HMAC.new(key, seed.to_bytes(8, "big") + bytes([__block]),
+                               SHA256).digest()
+            __block += 1
+        self._round_keys = numpy.frombuffer(__keys[:ScatterMap.ROUNDS * 8], dtype=">u8")\
+            .astype(numpy.uint64)
+
+    @staticmethod
+    def new_seed():
+        """Return a random 64 bit seed."""
+
+        return int.from_bytes(os.urandom(8), "big")
+
+    @staticmethod
+    def _round(half, round_key, z, t):
+        """
+        The Feistel round function, splitmix64 of the half and key. It works
+        in place in the scratch arrays z and t and returns z.
+        """
+
+        numpy.bitwise_xor(half, round_key, out=z)
+        z += ScatterMap._GAMMA
+        for __shift, __multiplier in ((30, ScatterMap._MIX1), (27, ScatterMap._MIX2)):
+            numpy.right_shift(z, numpy.uint64(__shift), out=t)
+            z ^= t
+            z *= __multiplier
+        numpy.right_shift(z, numpy.uint64(31), out=t)
+        z ^= t
+        return z
+
+    def _feistel(self, values):
+        """Run the Feistel network over a uint64 array."""
+
+        # The halves can differ in size by a bit so instead of swapping them
+        # each round mixes one into the other in turn.
+        __high = values >> self._low_bits
+        __low = values & self._low_mask
+        __z = numpy.empty_like(__low)
+        __t = numpy.empty_like(__low)
+        for __round, __key in enumerate(self._round_keys):
+            if __round % 2:
+                __z = ScatterMap._round(__high, __key, __z, __t)
+                __z &= self._low_mask
+                __low ^= __z
+            else:
+                __z = ScatterMap._round(__low, __key, __z, __t)
+                __z &= self._high_mask
+                __high ^= __z
+        __high <<= self._low_bits
+        __high |= __low
+        return __high
+
+    def permute(self, indices):
+        """
+        Return where each of an array of indices in [0, size) maps to, as a
+        uint64 array.
+
+        Mandatory Arguments:
+        indices -- A numpy array of indices.
+        """
+
+        __values = self._feistel(numpy.asarray(indices, dtype=numpy.uint64))
+        # The network works over a power of two so some values land past
+        # the end. Running them through again until they don't keeps it a
+        # permutation of [0, size). Less than one extra pass on average.
+        __outside = numpy.flatnonzero(__values >= self.size)
+        while len(__outside):
+            __values[__outside] = self._feistel(__values[__outside])
+            __outside = __outside[__values[__outside] >= self.size]
+        return __values
+
+    def blocks(self, start, count):
+        """
+        Yield the positions of count slots starting at message slot start,
+        BLOCK_SIZE at a time, as uint64 arrays.
+
+        Mandatory Arguments:
+        start -- The first message slot.
+        count -- The number of message slots.
+        """
+
+        for __offset in range(start, start + count, ScatterMap.BLOCK_SIZE):
+            yield self.permute(numpy.arange(
+                __offset, min(start + count, __offset + ScatterMap.BLOCK_SIZE),
+                dtype=numpy.uint64))
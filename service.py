@@ -0,0 +1,429 @@
+#!/usr/bin/python
+__author__ = "Dell-Ray Sackett"
+__version__ = "0.1"
+import argparse
+import asyncio
+import base64
+import json
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from steganographer import steganographer
+from steganographer import Encryptedsteganographer
+
+
+def _encode(image, message, options, crypto_args):
+    """Encode a message into an image and return the encoded image as bytes."""
+
+    if crypto_args:
+        steg = Encryptedsteganographer(inputFile=image, **dict(crypto_args, **options))
+        return steg.encrypt_and_encode_message_to_bytes(message)
+    return steganographer(inputFile=image, **options).encode_message_to_bytes(message)
+
+
+def _decode(image, options, crypto_args):
+    """Decode the message in an image and return it as bytes."""
+
+    if crypto_args:
+        steg = Encryptedsteganographer(inputFile=image, **dict(crypto_args, **options))
+        return steg.decrypt_and_decode_message()
+    return steganographer(inputFile=image, **options).decode_message_bytes()
+
+
+class StegService:
+    """
+    This class puts steganographer and Encryptedsteganographer behind an
+    asyncio API. The work is handed to a thread or process pool so the event
+    loop is never blocked decoding or saving an image.
+
+    Requests wait in a bounded queue for one of the workers. When the queue
+    is full new requests are turned away straight away instead of piling up,
+    every request can have a timeout, and cancelling a request that hasn't
+    started yet drops it from the queue. A request that is already running
+    in the pool can't be interrupted, but its result is thrown away.
+
+    Use it as an async context manager, or call start and close.
+    """
+
+    def __init__(self, workers=4, processes=False, max_pending=64, timeout=30.0,
+                 **kwargs):
+        """
+        Initialize a StegService.
+
+        Optional Arguments:
+        workers -- The number of requests worked on at once. (Int, default=4)
+        processes -- Use a process pool instead of a thread pool. Worth it for
+            big images since numpy and PIL only release the GIL some of the
+            time. (Bool, default=False)
+        max_pending -- The number of requests that can wait for a worker.
+            (Int, default=64)
+        timeout -- The default number of seconds a request may take from
+            being queued to being finished, or None for no limit.
+            (Float, default=30.0)
+
+        Keyword Arguments:
+        recipientPublicKeyFileName -- Passed to Encryptedsteganographer. If
+            any of the crypto arguments are given all of them are required
+            and every request is encrypted.
+        sendersKeyPairFileName -- Passed to Encryptedsteganographer.
+        passphrase -- Passed to Encryptedsteganographer.
+        Any other keyword arguments, such as depth or outputFormat, are the
+        default encoding options for every request.
+
+        Exceptions:
+        KeyError -- Raised if only some of the crypto arguments are given.
+        """
+
+        self._workers = workers
+        self._processes = processes
+        self._max_pending = max_pending
+        self._timeout = timeout
+        self._crypto_args = None
+
+        if ("recipientPublicKeyFileName" in kwargs or
+                "sendersKeyPairFileName" in kwargs or "passphrase" in kwargs):
+            try:
+                self._crypto_args = {
+                    "recipientPublicKeyFileName": kwargs.pop("recipientPublicKeyFileName"),
+                    "sendersKeyPairFileName": kwargs.pop("sendersKeyPairFileName"),
+                    "passphrase": kwargs.pop("passphrase")}
+            except KeyError:
+                raise KeyError("The recipientPublicKeyFileName, sendersKeyPairFileName "
+                               + "and passphrase arguments are all required to "
+                               + "run an encrypted service.")
+        self._options = kwargs
+        self._executor = None
+        self._queue = None
+        self._dispatchers = []
+
+    async def start(self):
+        """Start the pool and the tasks that feed it."""
+
+        if self._executor is not None:
+            return
+        if self._processes:
+            self._executor = ProcessPoolExecutor(max_workers=self._workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self._workers)
+        self._queue = asyncio.Queue(maxsize=self._max_pending)
+        self._dispatchers = [asyncio.ensure_future(self._dispatch())
+                             for _ in range(self._workers)]
+
+    async def close(self):
+        """
+        Stop taking requests, cancel the ones still waiting and shut the pool
+        down. Requests already running in the pool fail with RuntimeError.
+        """
+
+        if self._executor is None:
+            return
+        for dispatcher in self._dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        while not self._queue.empty():
+            self._queue.get_nowait()[0].cancel()
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        self._dispatchers = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def pending(self):
+        """Return the number of requests waiting for a worker."""
+
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _dispatch(self):
+        """Take requests off the queue and run them in the pool one at a time."""
+
+        loop = asyncio.get_running_loop()
+        while True:
+            future, function, args = await self._queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                try:
+                    result = await loop.run_in_executor(self._executor, function, *args)
+                except asyncio.CancelledError:
+                    # close cancels the dispatchers. The request can't be
+                    # stopped in the pool, but whoever is waiting on it
+                    # mustn't be left hanging.
+                    if not future.done():
+                        future.set_exception(RuntimeError(
+                            "The service was closed before the request finished."))
+                    raise
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+            finally:
+                self._queue.task_done()
+
+    async def _submit(self, function, args, timeout):
+        """
+        Queue a call and wait for its result.
+
+        Exceptions:
+        RuntimeError -- Raised if the service hasn't been started.
+        asyncio.QueueFull -- Raised if max_pending requests are already waiting.
+        asyncio.TimeoutError -- Raised if the request takes longer than timeout.
+        """
+
+        if self._executor is None:
+            raise RuntimeError("The service has not been started.")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((future, function, args))
+        if timeout is None:
+            timeout = self._timeout
+        # wait_for cancels the future on a timeout or when the caller is
+        # cancelled, which keeps it from ever being started.
+        return await asyncio.wait_for(future, timeout)
+
+    async def encode(self, image, message, timeout=None, **options):
+        """
+        Encode a message into an image and return the encoded image as
+        bytes.
+
+        Mandatory Arguments:
+        image -- The image as bytes or a filename.
+        message -- The message as a string or bytes.
+
+        Optional Arguments:
+        timeout -- The number of seconds to allow, overriding the service
+            default.
+        Any other keyword arguments override the service encoding options
+        for this request.
+
+        Exceptions:
+        asyncio.QueueFull -- Raised if the service is too busy to take it.
+        asyncio.TimeoutError -- Raised if it took too long.
+        Anything steganographer.encode_message_to_bytes raises.
+        """
+
+        return await self._submit(_encode, (image, message, dict(self._options, **options),
+                                            self._crypto_args), timeout)
+
+    async def decode(self, image, timeout=None):
+        """
+        Decode the message in an image and return it as bytes.
+
+        Mandatory Arguments:
+        image -- The image as bytes or a filename.
+
+        Optional Arguments:
+        timeout -- The number of seconds to allow, overriding the service
+            default.
+
+        Exceptions:
+        asyncio.QueueFull -- Raised if the service is too busy to take it.
+        asyncio.TimeoutError -- Raised if it took too long.
+        Anything steganographer.decode_message_bytes raises.
+        """
+
+        return await self._submit(_decode, (image, self._options, self._crypto_args),
+                                  timeout)
+
+
+class StegHTTPServer:
+    """
+    A small HTTP/1.1 front end for a StegService, meant to sit on localhost
+    behind a real web server. Every connection handles one request.
+
+    POST /encode -- The body is JSON with the base64 encoded "image" and
+        "message" and optionally "options" for the encoder. Responds with the
+        encoded image.
+    POST /decode -- The body is the image. Responds with the message.
+    GET /health -- Responds with the number of waiting requests.
+
+    Bad requests get 400, request lines or headers longer than the stream
+    reader's limit get 431, a full queue gets 503 and requests that time out
+    get 504.
+    """
+
+    # The largest request body accepted.
+    MAX_BODY = 64 << 20
+
+    # The encoder options a request may set.
+    REQUEST_OPTIONS = ("depth", "layout", "outputFormat", "compressLevel",
+                       "optimize", "compression", "fec")
+
+    REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 411: "Length Required",
+               413: "Payload Too Large", 431: "Request Header Fields Too Large",
+               500: "Internal Server Error",
+               503: "Service Unavailable", 504: "Gateway Timeout"}
+
+    def __init__(self, service, max_body=MAX_BODY):
+        """
+        Initialize the server.
+
+        Mandatory Arguments:
+        service -- A started StegService.
+
+        Optional Arguments:
+        max_body -- The largest request body accepted in bytes.
+            (Int, default=StegHTTPServer.MAX_BODY)
+        """
+
+        self._service = service
+        self._max_body = max_body
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        """Listen for requests until cancelled."""
+
+        server = await asyncio.start_server(self._handle, host, port)
+        print("Listening on http://" + host + ":" + str(port))
+        async with server:
+            await server.serve_forever()
+
+    async def _respond(self, writer, status, body, content_type="text/plain"):
+        """Write a response and close the connection."""
+
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        writer.write(("HTTP/1.1 " + str(status) + " " + StegHTTPServer.REASONS[status] +
+                      "\r\nContent-Type: " + content_type +
+                      "\r\nContent-Length: " + str(len(body)) +
+                      "\r\nConnection: close\r\n\r\n").encode("latin-1") + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, reader, writer):
+        """Read one request, run it and respond."""
+
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1")
+                if line in ("\r\n", "\n", ""):
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        except (ConnectionError, UnicodeDecodeError):
+            writer.close()
+            return
+        except ValueError:
+            # readline raises this when a line runs past the reader's limit.
+            await self._respond(writer, 431, "A request line or header is too long.\n")
+            return
+        if len(request_line) != 3:
+            await self._respond(writer, 400, "Malformed request line.\n")
+            return
+
+        method, path = request_line[0], urlsplit(request_line[1]).path
+        if path == "/health" and method == "GET":
+            await self._respond(writer, 200, json.dumps(
+                {"pending": self._service.pending()}), "application/json")
+            return
+        if path not in ("/encode", "/decode"):
+            await self._respond(writer, 404, "Unknown path.\n")
+            return
+        if method != "POST":
+            await self._respond(writer, 405, "Use POST.\n")
+            return
+        if "content-length" not in headers:
+            await self._respond(writer, 411, "A Content-Length is required.\n")
+            return
+        length = headers["content-length"]
+        if not (length.isascii() and length.isdigit()):
+            await self._respond(writer, 400, "The Content-Length is not a length.\n")
+            return
+        length = int(length)
+        if length > self._max_body:
+            await self._respond(writer, 413, "The body is too large.\n")
+            return
+        try:
+            body = await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            await self._respond(writer, 400, "The body is shorter than its "
+                                + "Content-Length.\n")
+            return
+        except ConnectionError:
+            writer.close()
+            return
+
+        try:
+            if path == "/decode":
+                result = await self._service.decode(body)
+                await self._respond(writer, 200, result, "application/octet-stream")
+                return
+            request = json.loads(body.decode("utf-8"))
+            options = dict((key, value) for key, value in request.get("options", {}).items()
+                           if key in StegHTTPServer.REQUEST_OPTIONS)
+            result = await self._service.encode(base64.b64decode(request["image"]),
+                                                base64.b64decode(request["message"]),
+                                                **options)
+            output_format = options.get("outputFormat", "PNG").lower()
+            await self._respond(writer, 200, result, "image/" + output_format)
+        except asyncio.QueueFull:
+            await self._respond(writer, 503, "The service is busy.\n")
+        except asyncio.TimeoutError:
+            await self._respond(writer, 504, "The request timed out.\n")
+        except (KeyError, ValueError, TypeError, IOError) as e:
+            await self._respond(writer, 400, type(e).__name__ + ": " + str(e) + "\n")
+        except Exception as e:
+            await self._respond(writer, 500, type(e).__name__ + ": " + str(e) + "\n")
+
+
+async def _main(args):
+    crypto_args = {}
+    if args.encryptionkey or args.signingkey or args.passphrase:
+        crypto_args = {"recipientPublicKeyFileName": args.encryptionkey,
+                       "sendersKeyPairFileName": args.signingkey,
+                       "passphrase": args.passphrase}
+    async with StegService(workers=args.workers, processes=args.processes,
+                           max_pending=args.maxpending, timeout=args.timeout,
+                           depth=args.depth, layout=args.layout,
+                           outputFormat=args.format, **crypto_args) as service:
+        await StegHTTPServer(service).serve(args.host, args.port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve steganographer over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="The address to listen on.")
+    parser.add_argument("--port", type=int, default=8080, help="The port to listen on.")
+    parser.add_argument("--workers", "-w", type=int, default=4,
+                        help="The number of requests worked on at once.")
+    parser.add_argument("--processes", action="store_true",
+                        help="Work in a process pool instead of a thread pool.")
+    parser.add_argument("--maxpending", type=int, default=64,
+                        help="The number of requests that can wait before" +
+                             " new ones are turned away.")
+    parser.add_argument("--timeout", type=float, default=30.0,
+                        help="The number of seconds a request may take.")
+    parser.add_argument("--depth", type=int, default=1,
+                        help="The default encoding depth.")
+    parser.add_argument("--layout", default="rows",
+                        choices=sorted(steganographer.LAYOUTS),
+                        help="The default layout.")
+    parser.add_argument("--format", default="PNG",
+                        help="The default output format: " +
+                             ", ".join(steganographer.OUTPUT_FORMATS) + ".")
+    parser.add_argument("--encryptionkey", "-ec",
+                        help="Encrypt every message to this public key.")
+    parser.add_argument("--signingkey", "-sk",
+                        help="Sign and decrypt every message with this key pair.")
+    parser.add_argument("--passphrase", "-p",
+                        help="The passphrase to the signing key.")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(_main(args))
+    except KeyError as e:
+        print(e)
+        exit(1)
+    except KeyboardInterrupt:
+        pass
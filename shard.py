@@ -0,0 +1,440 @@
+__author__ = "Dell-Ray Sackett"
+__version__ = "0.1"
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from fec import ReedSolomon
+from header import Header
+from steganographer import steganographer
+
+# The encoding options shared by every shard. Each worker process gets its
+# own copy when it starts so they don't have to be sent with every shard.
+_worker_options = {}
+
+
+def _initialize_worker(options):
+    """Store the options for this worker process."""
+
+    global _worker_options
+    _worker_options = options
+
+
+def _encode_shard(job):
+    """
+    Embed one shard into its carrier. Shards of a message file are read
+    straight from the file by the worker so the message never passes
+    through the parent process.
+
+    Mandatory Arguments:
+    job -- A tuple of (input image, output image, shard header, message,
+        offset, length). The message is either the bytes of the shard or
+        the filename of the whole message.
+    """
+
+    input_image, output_image, header, message, offset, length = job
+    if isinstance(message, str):
+        with open(message, "rb") as fd:
+            fd.seek(offset)
+            message = fd.read(length)
+    steg = steganographer(inputFile=input_image, outputFile=output_image,
+                          **_worker_options)
+    steg.encode_message(header + message)
+
+
+def _decode_shard(job):
+    """
+    Extract one shard from its carrier and check it. Returns a tuple of the
+    unpacked shard header and the shard data, or None for the data if it
+    was written straight into the output file.
+
+    Mandatory Arguments:
+    job -- A tuple of (input image, output filename or None).
+
+    Exceptions:
+    ValueError -- Raised if the carrier doesn't hold an intact shard.
+    """
+
+    input_image, output = job
+    steg = steganographer(inputFile=input_image, **_worker_options)
+    data = steg.decode_message_bytes()
+    header = ShardedCarrier.unpack_header(data)
+    shard = memoryview(data)[ShardedCarrier.HEADER_SIZE:]
+    if len(shard) != header["length"] or zlib.crc32(shard) & 0xFFFFFFFF != header["crc"]:
+        raise ValueError("The shard in " + str(input_image) + " is corrupt.")
+    if output is None:
+        return header, bytes(shard)
+    # Every shard lands in its own part of the file so the workers can all
+    # write at once.
+    with open(output, "r+b") as fd:
+        fd.seek(header["offset"])
+        fd.write(shard)
+    return header, None
+
+
+class ShardedCarrier:
+    """
+    This class treats a set of carrier images as one big carrier. The
+    message is split into one shard per image, in proportion to how much
+    each image holds, and every shard is embedded with the normal
+    steganographer behind a small shard header that says which part of
+    which message it is. The shards are encoded and decoded at the same time
+    across a pool of worker processes.
+
+    Decoding takes the carriers in any order. Shards are written into the
+    output file by the workers as they are decoded, so the message is never
+    held in memory as a whole, and the set is checked for missing, repeated
+    or foreign shards once they are all in.
+    """
+
+    # The magic number, version, message id, shard index, shard count, total
+    # length, offset of the shard in the message, shard length and CRC32 of
+    # the shard.
+    MAGIC = b"SHRD"
+    VERSION = 1
+    HEADER_FORMAT = ">4sB8sIIQQQI"
+    HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+    def __init__(self, workers=None, **kwargs):
+        """
+        Initialize a ShardedCarrier.
+
+        Optional Arguments:
+        workers -- The number of worker processes. (Int, default=CPU count)
+
+        Keyword Arguments:
+        inputFiles -- The filenames of the carrier images.
+        outputFiles -- The filenames of the encoded images, one for every
+            carrier. Only needed to encode.
+        Any other keyword arguments, such as depth, compression or
+        scatterKey, are passed on to the steganographer of every shard.
+        Capacity is worked out for the message before compression.
+
+        Exceptions:
+        ValueError -- Raised if there are no carriers, or not one output file
+            for every carrier.
+        ValueError -- Raised from steganographer for bad options.
+        """
+
+        self._workers = workers
+        self._input_files = list(kwargs.pop("inputFiles", []))
+        self._output_files = list(kwargs.pop("outputFiles", []))
+        if not self._input_files:
+            raise ValueError("At least one carrier image is required.")
+        if self._output_files and len(self._output_files) != len(self._input_files):
+            raise ValueError("There has to be one output file for every "
+                             + "carrier image.")
+        # Check the options here rather than in every worker.
+        steganographer(**kwargs)
+        self._options = kwargs
+
+    @staticmethod
+    def pack_header(message_id, index, count, total, offset, shard):
+        """
+        Return the shard header for a shard.
+
+        Mandatory Arguments:
+        message_id -- The 8 random bytes shared by every shard of a message.
+        index -- The index of the shard.
+        count -- The number of shards.
+        total -- The length of the whole message.
+        offset -- Where the shard starts in the message.
+        shard -- The shard itself, or its (length, crc) if it hasn't been
+            read yet.
+        """
+
+        if isinstance(shard, tuple):
+            length, crc = shard
+        else:
+            length, crc = len(shard), zlib.crc32(shard) & 0xFFFFFFFF
+        return struct.pack(ShardedCarrier.HEADER_FORMAT, ShardedCarrier.MAGIC,
+                           ShardedCarrier.VERSION, message_id, index, count,
+                           total, offset, length, crc)
+
+    @staticmethod
+    def unpack_header(data):
+        """
+        Return the shard header at the start of data as a dictionary with the
+        keys id, index, count, total, offset, length and crc.
+
+        Mandatory Arguments:
+        data -- A decoded shard.
+
+        Exceptions:
+        ValueError -- Raised if data doesn't start with a shard header.
+        """
+
+        if len(data) < ShardedCarrier.HEADER_SIZE:
+            raise ValueError("The message is too short to be a shard.")
+        fields = struct.unpack(ShardedCarrier.HEADER_FORMAT,
+                               bytes(data[:ShardedCarrier.HEADER_SIZE]))
+        if fields[0] != ShardedCarrier.MAGIC:
+            raise ValueError("The message is not a shard.")
+        if fields[1] != ShardedCarrier.VERSION:
+            raise ValueError("The shard has version " + str(fields[1]) +
+                             ", which this version can't read.")
+        return dict(zip(("id", "index", "count", "total", "offset", "length",
+                         "crc"), fields[2:]))
+
+    def capacity(self, image):
+        """
+        Return the number of message bytes a carrier can hold as a shard
+        with the current options. Only the image header is read.
+
+        Mandatory Arguments:
+        image -- The carrier image.
+
+        Exceptions:
+        IOError -- Raised if the image can't be opened.
+        ValueError -- Raised if the image has an unsupported color model.
+        """
+
+        with steganographer.opened_image(image) as opened:
+            mode, size = opened.mode, opened.size
+        if mode not in steganographer.COLOR_SIZES:
+            raise ValueError("The carrier " + str(image) + " contains an "
+                             + "unsupported color model.")
+        color_size = steganographer.COLOR_SIZES[mode]
+        depth = int(self._options.get("depth", 1))
+
+        fec = int(self._options.get("fec") or 0)
+        if self._options.get("layout", "rows") == "columns":
+            header = Header(0, depth, Header.LEGACY_VERSION, color_size)
+        elif fec:
+            header = Header(0, depth, Header.FEC_VERSION, color_size, fec=fec)
+        elif self._options.get("scatter") or self._options.get("scatterKey"):
+            header = Header(0, depth, Header.SCATTER_VERSION, color_size, seed=0)
+        else:
+            header = Header(0, depth, Header.VERSION, color_size)
+        # Leave room for the padding up to a whole pixel, the same as
+        # steganographer._begin_encode.
+        slots = size[0] * size[1] * color_size - header.size_bits() - color_size - 1
+        space = slots * depth // 8
+        if fec:
+            space = ReedSolomon.capacity(space, fec)
+        return max(0, space - ShardedCarrier.HEADER_SIZE)
+
+    def plan(self, length):
+        """
+        Split a message of length bytes across the carriers and return a
+        list of (offset, length) pairs, one for every carrier. Each carrier
+        gets the same share of its capacity so they all take about as long.
+
+        Mandatory Arguments:
+        length -- The length of the message in bytes.
+
+        Exceptions:
+        ValueError -- Raised if the message doesn't fit.
+        """
+
+        capacities = [self.capacity(image) for image in self._input_files]
+        total = sum(capacities)
+        if length > total:
+            raise ValueError("The message is " + str(length) + " bytes long but "
+                             + "the carriers only hold " + str(total) + ".")
+        sizes = [capacity * length // total if total else 0
+                 for capacity in capacities]
+        # Hand whatever the rounding left over to carriers with room to spare.
+        left = length - sum(sizes)
+        for index, capacity in enumerate(capacities):
+            extra = min(left, capacity - sizes[index])
+            sizes[index] += extra
+            left -= extra
+
+        shards = []
+        offset = 0
+        for size in sizes:
+            shards.append((offset, size))
+            offset += size
+        return shards
+
+    def _run(self, function, jobs):
+        """Run jobs across the worker pool and return the results in order."""
+
+        with ProcessPoolExecutor(max_workers=self._workers,
+                                 initializer=_initialize_worker,
+                                 initargs=(self._options,)) as executor:
+            return list(executor.map(function, jobs))
+
+    def _check_output(self):
+        """
+        Raise ValueError if no output files were given.
+        """
+
+        if not self._output_files:
+            raise ValueError("No output filenames specified. Please specify"
+                             + " one for every carrier image.")
+
+    def encode_message(self, message):
+        """
+        Split a message across the carriers and encode every shard.
+
+        Mandatory Arguments:
+        message -- The message as a string or bytes.
+
+        Exceptions:
+        ValueError -- Raised if no output files were given, the message is
+            empty or it is too large for the carriers.
+        IOError and ValueError -- Raised from the steganographer of a shard.
+        """
+
+        self._check_output()
+        if isinstance(message, str):
+            message = message.encode("latin-1")
+        if not message:
+            raise ValueError("Message not set. Please set message and"
+                             + " call encode_message() again.")
+        message_id = os.urandom(8)
+        shards = self.plan(len(message))
+        jobs = []
+        for index, (offset, length) in enumerate(shards):
+            shard = message[offset:offset + length]
+            jobs.append((self._input_files[index], self._output_files[index],
+                         ShardedCarrier.pack_header(message_id, index, len(shards),
+                                                    len(message), offset, shard),
+                         shard, offset, length))
+        self._run(_encode_shard, jobs)
+
+    def encode_message_from_file(self, filename):
+        """
+        Split the contents of a file across the carriers and encode every
+        shard. Each worker reads only its own shard from the file.
+
+        Mandatory Arguments:
+        filename -- The name of the file containing the message.
+
+        Exceptions:
+        IOError -- Raised if the message file cannot be read.
+        ValueError -- Raised if no output files were given, the message file
+            is empty or it is too large for the carriers.
+        IOError and ValueError -- Raised from the steganographer of a shard.
+        """
+
+        self._check_output()
+        try:
+            fd = open(filename, "rb")
+        except IOError as e:
+            raise IOError("The following error was encountered opening the " +
+                          "message file: " + str(e))
+
+        # The CRC of every shard goes in its header, so take one pass over
+        # the file for them up front.
+        with fd:
+            total = fd.seek(0, 2)
+            if total == 0:
+                raise ValueError("The message file " + filename + " is empty.")
+            shards = self.plan(total)
+            crcs = []
+            fd.seek(0)
+            for offset, length in shards:
+                crc = 0
+                while length:
+                    chunk = fd.read(min(length, steganographer.CHUNK_SIZE))
+                    crc = zlib.crc32(chunk, crc)
+                    length -= len(chunk)
+                crcs.append(crc & 0xFFFFFFFF)
+
+        message_id = os.urandom(8)
+        jobs = []
+        for index, (offset, length) in enumerate(shards):
+            jobs.append((self._input_files[index], self._output_files[index],
+                         ShardedCarrier.pack_header(message_id, index, len(shards),
+                                                    total, offset,
+                                                    (length, crcs[index])),
+                         filename, offset, length))
+        self._run(_encode_shard, jobs)
+
+    @staticmethod
+    def _check_shards(headers, carriers):
+        """
+        Check that the shard headers decoded from a set of carriers make up
+        one whole message and return its length.
+
+        Exceptions:
+        ValueError -- Raised if shards are missing, repeated or from
+            different messages.
+        """
+
+        headers = sorted(headers, key=lambda header: header["index"])
+        first = headers[0]
+        if any(header["id"] != first["id"] for header in headers):
+            raise ValueError("The carriers hold shards of different messages.")
+        if first["count"] != carriers:
+            raise ValueError("The message was split into " + str(first["count"])
+                             + " shards but " + str(carriers) + " carriers "
+                             + "were given.")
+        offset = 0
+        for index, header in enumerate(headers):
+            if header["index"] != index:
+                raise ValueError("Shard " + str(index) + " of " +
+                                 str(first["count"]) + " is missing.")
+            if header["offset"] != offset or header["total"] != first["total"]:
+                raise ValueError("Shard " + str(index) + " doesn't line up with "
+                                 + "the shards before it.")
+            offset += header["length"]
+        if offset != first["total"]:
+            raise ValueError("The shards don't add up to the whole message.")
+        return first["total"]
+
+    def decode_message_bytes(self):
+        """
+        Decode and reassemble the message split across the carriers and
+        return it as bytes.
+
+        Exceptions:
+        ValueError -- Raised if a carrier doesn't hold an intact shard, or
+            the shards don't make up one whole message.
+        IOError and ValueError -- Raised from the steganographer of a shard.
+        """
+
+        results = self._run(_decode_shard,
+                            [(image, None) for image in self._input_files])
+        ShardedCarrier._check_shards([header for header, shard in results],
+                                     len(self._input_files))
+        return b"".join(shard for header, shard in
+                        sorted(results, key=lambda result: result[0]["index"]))
+
+    def decode_message(self):
+        """
+        Decode the message split across the carriers and return it as a
+        string with one character per byte.
+
+        Exceptions:
+        The same as decode_message_bytes.
+        """
+
+        return self.decode_message_bytes().decode("latin-1")
+
+    def decode_message_to_file(self, filename):
+        """
+        Decode the message split across the carriers into a file. The
+        workers write their shards straight into the file as they go. If
+        the shards turn out not to make up one message the file is removed.
+
+        Mandatory Arguments:
+        filename -- The name of the file to save the message to.
+
+        Exceptions:
+        IOError -- Raised if the message file could not be opened.
+        ValueError -- Raised if a carrier doesn't hold an intact shard, or
+            the shards don't make up one whole message.
+        IOError and ValueError -- Raised from the steganographer of a shard.
+        """
+
+        try:
+            open(filename, "wb").close()
+        except IOError as e:
+            raise IOError("The following error was encountered opening the " +
+                          "message file: " + str(e))
+        try:
+            results = self._run(_decode_shard,
+                                [(image, filename) for image in self._input_files])
+            total = ShardedCarrier._check_shards([header for header, shard in results],
+                                                 len(self._input_files))
+        except Exception:
+            os.remove(filename)
+            raise
+        with open(filename, "r+b") as fd:
+            fd.truncate(total)
+        print("Message saved to " + filename + ".")
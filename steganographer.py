@@ -2,12 +2,29 @@
 __author__ = "Dell-Ray Sackett"
 __version__ = "0.6"
 import argparse
+import contextlib
+import io
+import math
+import os
+import shutil
+import struct
+import tempfile
+import zlib
 
 from PIL import Image
 import numpy
 
 from message import Message
 from message import CryptoHelper
+from Crypto.Hash import SHA256
+from engine import LSBEngine
+from bitcodec import BitCodec
+from header import Header
+from rawcarrier import RawCarrier
+import carriercache
+from compression import Compressor
+from scatter import ScatterMap
+from fec import ReedSolomon
 
 
 class steganographer(object):
@@ -15,31 +32,179 @@ class steganographer(object):
     An object for performing Steganography on an image.
     """
 
+    # The number of channels per pixel that information is stored in for each
+    # supported color model. Don't encode to the alpha value.
+    COLOR_SIZES = {"RGB": 3, "RGBA": 3, "CMYK": 4, "YCbCr": 4}
+
+    # The number of bytes read from a message file at a time.
+    CHUNK_SIZE = 1 << 20
+
+    # The orders a message can be laid out across the image in. Rows is the
+    # cache friendly layout with a versioned header. Columns is what the
+    # original encoder wrote and is only needed to make images for old
+    # decoders.
+    LAYOUTS = {"rows": LSBEngine.LAYOUT_ROWS, "columns": LSBEngine.LAYOUT_COLUMNS}
+
+    # The formats the output image can be saved in. Anything lossy would
+    # destroy the message.
+    OUTPUT_FORMATS = ("PNG", "TIFF", "WEBP", "BMP", "PPM")
+
+    # The color modes each output format saves and reads back unchanged.
+    # Anything else is converted on the way out or can't be saved at all,
+    # and either way the message is lost.
+    OUTPUT_MODES = {"PNG": ("RGB", "RGBA"), "TIFF": ("RGB", "RGBA", "CMYK"),
+                    "WEBP": ("RGB", "RGBA"), "BMP": ("RGB",), "PPM": ("RGB",)}
+
+    # Every PNG starts with this signature, and the channels in each PNG color
+    # type are what read_leading_rows needs to work out the length of a row.
+    PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+    PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
     def __init__(self, **kwargs):
         """
         Initialize a Steganography object
 
         Keyword Arguments:
         inputFile -- The filename of the image you wish to embed information information.
+            This can also be the encoded image as bytes, a file-like object,
+            a PIL Image or a (height, width, channels) numpy array.
         outputFile -- The filename of the image that will have your information in it.
+            This can also be a writable file-like object.
+        depth -- The number of least significant bits of each channel to store
+            the message in, from 1 to 4. Decoding reads the depth out of the
+            image so it is only used when encoding. (Int, default=1)
+        layout -- "rows" to lay the message out along the rows behind a
+            versioned header, or "columns" for the original layout that
+            older versions can decode. Decoding handles either on its own.
+            (String, default="rows")
+        outputFormat -- The lossless format to save the output image in. One
+            of steganographer.OUTPUT_FORMATS that can hold the color mode of
+            the carrier, see OUTPUT_MODES. Left out or None, PNG is used
+            unless the carrier needs something else, like TIFF for CMYK.
+            (String, default="PNG")
+        compressLevel -- How hard to compress the output image from 0 (none)
+            to 9 (smallest). TIFF only distinguishes between 0 and the rest
+            and BMP ignores it. (Int, default=0)
+        optimize -- Let PIL spend extra time making PNG output smaller.
+            (Bool, default=False)
+        compression -- Compress the message before embedding it with "zlib",
+            "bz2" or "lzma", or "auto" to pick whichever does best and skip
+            messages that don't compress. Decoding undoes it on its own.
+            Needs the rows layout. (String, default="none")
+        carrierCache -- A CarrierCache to load the input image through, or
+            True for the one shared by the whole process. Only used when
+            inputFile is a filename. (default=None)
+        scatter -- Spread the message over the whole image in a
+            pseudo-random order seeded from the header instead of writing it
+            into the first channels. Needs the rows layout. Decoding notices
+            on its own. (Bool, default=False)
+        scatterKey -- A secret string or bytes mixed into the scatter order.
+            Implies scatter and has to be given again to decode.
+            (default=None)
+        fec -- Protect the message with this many Reed-Solomon parity bytes
+            for every codeword of up to 255 bytes, so decoding can repair
+            bits flipped after encoding. Each parity byte repairs half a
+            damaged byte per codeword. The header is stored several times
+            over so it can be repaired too. Needs the rows layout.
+            (Int, default=0)
+
+        Exceptions:
+        ValueError -- Raised if depth or layout is out of range.
+        ValueError -- Raised if compression, scatter or fec is used with the
+            columns layout, or compression or fec is out of range.
+        ValueError -- Raised if outputFormat or compressLevel is not supported.
+        ValueError -- Raised when encoding if outputFormat can't hold the
+            color mode of the carrier.
         """
 
         self._input_file = ""
+        self._input_position = None
         self._output_file = ""
+        self._depth = 1
+        self._layout = LSBEngine.LAYOUT_ROWS
+        self._output_format = "PNG"
+        self._output_format_given = False
+        self._compress_level = 0
+        self._optimize = False
+        self._carrier_cache = None
+        self._compression = "none"
+        self._scatter = False
+        self._scatter_key = None
+        self._fec = 0
         self.__image_data = numpy.empty((1, 1, 1))
         self.__color_mode = ""
         self.__color_size = 0
         self.__image_size = (0, 0)
         self.__max_bits_storable = 0
+        # The format of an input image that is mapped instead of loaded and
+        # the (slots, header) the last encode wrote.
+        self._input_format = None
+        self._dirty = None
 
         if kwargs:
             for arg in kwargs:
-                if arg is "inputFile":
+                if arg == "inputFile":
                     self._input_file = kwargs[arg]
-                elif arg is "outputFile":
+                elif arg == "outputFile":
                     self._output_file = kwargs[arg]
+                elif arg == "depth":
+                    self._depth = int(kwargs[arg])
+                elif arg == "layout":
+                    if kwargs[arg] not in steganographer.LAYOUTS:
+                        raise ValueError("The layout must be one of " +
+                                         ", ".join(sorted(steganographer.LAYOUTS)) + ".")
+                    self._layout = steganographer.LAYOUTS[kwargs[arg]]
+                elif arg == "outputFormat":
+                    if kwargs[arg] is not None:
+                        self._output_format = kwargs[arg].upper()
+                        self._output_format_given = True
+                elif arg == "compressLevel":
+                    self._compress_level = int(kwargs[arg])
+                elif arg == "optimize":
+                    self._optimize = bool(kwargs[arg])
+                elif arg == "compression":
+                    self._compression = kwargs[arg]
+                elif arg == "scatter":
+                    self._scatter = bool(kwargs[arg])
+                elif arg == "scatterKey":
+                    self._scatter_key = kwargs[arg] or None
+                elif arg == "fec":
+                    self._fec = int(kwargs[arg] or 0)
+                elif arg == "carrierCache":
+                    # An empty CarrierCache is falsy, so test for the
+                    # flags rather than the truth of the argument.
+                    if kwargs[arg] is True:
+                        self._carrier_cache = carriercache.shared_cache
+                    elif kwargs[arg] is not False:
+                        self._carrier_cache = kwargs[arg]
+
+        if not 1 <= self._depth <= LSBEngine.MAX_DEPTH:
+            raise ValueError("The depth must be between 1 and " +
+                             str(LSBEngine.MAX_DEPTH) + ".")
+        if self._output_format not in steganographer.OUTPUT_FORMATS:
+            raise ValueError("The output format must be one of " +
+                             ", ".join(steganographer.OUTPUT_FORMATS) + ".")
+        if not 0 <= self._compress_level <= 9:
+            raise ValueError("The compression level must be between 0 and 9.")
+        Compressor.code(self._compression)
+        if (self._compression != "none" and
+                self._layout == LSBEngine.LAYOUT_COLUMNS):
+            raise ValueError("The columns layout has no room to record "
+                             + "compression.")
+        if self._scatter_key is not None:
+            self._scatter = True
+        if self._scatter and self._layout == LSBEngine.LAYOUT_COLUMNS:
+            raise ValueError("The columns layout has no room to record "
+                             + "the scatter seed.")
+        if self._fec:
+            ReedSolomon.check_parity(self._fec)
+            if self._layout == LSBEngine.LAYOUT_COLUMNS:
+                raise ValueError("The columns layout has no room to record "
+                                 + "error correction.")
 
     # Static Methods
+    # The bit list helpers are kept for anybody still calling them. The real
+    # work happens on packed bytes in BitCodec.
     @staticmethod
     def int_to_bin_list(number):
         """
@@ -49,20 +214,7 @@ class steganographer(object):
         number -- The number you would like returned as a list.
         """
 
-        list_value = []
-        for i in reversed(range(32)):
-            """
-            Iterate through the last 32 bits of the number passed. I single out
-            each bit by bit shifting the number 1 (essentially a bit mask here)
-            left by the current index then bitwise anding that against the
-            original number. That gives me the value of that position then I
-            shift it back by the index to make sure that the bit only occupies
-            the 1 bit. If you don't do that last part then python with
-            interpret it as whatever value that bit place holds. ie if it was
-            the 8 bit and it was set then you will get 8 instead of 1.
-            """
-            list_value += [((1 << i) & number) >> i]
-        return list_value
+        return BitCodec.int_to_bits(number).tolist()
 
     @staticmethod
     def bin_list_to_int(bin_list):
@@ -73,16 +225,7 @@ class steganographer(object):
         binList -- A list of 1s and 0s to be assembled back into an integer.
         """
 
-        int_value = 0
-        for i in range(32):
-            """
-            This is pretty simple. You just get the value from the current
-            index. Which should only be a 1 or a 0. Then shift it left by the
-            index. Lastly you add the number created by the shift to the
-            current value.
-            """
-            int_value += bin_list[31 - i] << i
-        return int_value
+        return BitCodec.bits_to_int(bin_list[:32])
 
     @staticmethod
     def char_to_bin_list(char):
@@ -93,13 +236,7 @@ class steganographer(object):
         char -- A character to be broken down into a list.
         """
 
-        int_value = ord(char)
-        list_value = []
-
-        for i in reversed(range(8)):
-            list_value += [((1 << i) & int_value) >> i]
-
-        return list_value
+        return BitCodec.int_to_bits(ord(char), 8).tolist()
 
     @staticmethod
     def bin_list_to_char(bin_list):
@@ -109,11 +246,8 @@ class steganographer(object):
         Mandatory Arguments:
         binList -- A list of 1s and 0s to be back into a char.
         """
-        int_value = 0
 
-        for i in range(8):
-            int_value += bin_list[7 - i] << i
-        return chr(int_value)
+        return chr(BitCodec.bits_to_int(bin_list[:8]))
 
     @staticmethod
     def message_to_bin_list(message):
@@ -124,10 +258,7 @@ class steganographer(object):
         message -- A string to be broken down into a list of binary values.
         """
 
-        list_value = []
-        for character in message:
-            list_value += steganographer.char_to_bin_list(character)
-        return list_value
+        return BitCodec.to_bits(message).tolist()
 
     @staticmethod
     def bin_list_to_message(bin_list):
@@ -143,20 +274,7 @@ class steganographer(object):
             divisable by 8. 
         """
 
-        if (len(bin_list) % 8) is not 0:
-            raise ValueError("The input list is required to be evenly divisable by 8")
-
-        list_tmp = []
-        bit_counter = 0
-        message = ""
-        for value in range(0, len(bin_list)):
-            list_tmp.append(bin_list[value])
-            if bit_counter == 7:
-                message += steganographer.bin_list_to_char(list_tmp)
-                list_tmp = []
-                bit_counter = -1
-            bit_counter += 1
-        return message
+        return BitCodec.from_bits(bin_list).decode("latin-1")
 
     # I "Borrowed" this wholesale from stack exchange
     @staticmethod
@@ -178,48 +296,137 @@ class steganographer(object):
     @staticmethod
     def compare_pixels(image_a, image_b, pixels=512):
         """
-        Compare the specified amount of pixel data of the two pictures given.
+        Print the first pixels of the two pictures given side by side and
+        return the diff_images report for the whole of them.
         
         Manditory Arguments:
-        image_a -- The first image filename.
-        image_b -- The second image filename.
+        image_a -- The first image, anything open_image accepts.
+        image_b -- The second image.
         
         Optional Arguments:
-        pixels -- The number of pixels to compare.
+        pixels -- The number of pixels to print. (Int, default=512)
         
         Exceptions:
         IOError -- This is raised if there is a problem opening one of the 
             input image files.
+        ValueError -- Raised if the images aren't the same size and mode.
         """
-        print("Reading " + str(pixels) + " pixels from " + image_a + " and " + image_b + ".")
-        try:
-            __oim = Image.open(image_a)
-            __nim = Image.open(image_b)
-        except IOError as e:
-            raise e
 
-        __oimd = numpy.asarray(__oim)
-        __nimd = numpy.asarray(__nim)
+        with steganographer.opened_image(image_a) as __a, \
+                steganographer.opened_image(image_b) as __b:
+            __report = steganographer.diff_images(__a, __b)
+            __oimd = numpy.asarray(__a)
+            __nimd = numpy.asarray(__b)
+        __channels = __oimd.shape[2] if __oimd.ndim == 3 else 1
+        __old = __oimd.reshape(-1, __channels)[:pixels]
+        __new = __nimd.reshape(-1, __channels)[:pixels]
+        print("Reading " + str(len(__old)) + " pixels.")
+        for __pixelIndex in range(len(__old)):
+            print(str(__pixelIndex) + ": " + str(__old[__pixelIndex]) + " --> " +
+                  str(__new[__pixelIndex]))
+        return __report
 
-        if not (__nim.size[0] == __oim.size[0] and __nim.size[1] == __oim.size[1]):
-            print("The images need to be the same size!")
-            exit(1)
+    @staticmethod
+    def diff_images(image_a, image_b, heatmap=None, band_rows=256):
+        """
+        Compare two images of the same size and mode in full and return a
+        dictionary describing how they differ:
+
+        changed_pixels -- The number of pixels with any channel changed.
+        changed_channels -- The number of changed values per channel.
+        lsb_flips -- The number of flipped least significant bits per channel.
+        max_delta -- The largest change to any single value.
+        mse -- The mean squared error over every channel of every pixel.
+        psnr -- The peak signal to noise ratio in dB, inf for equal images.
+        bbox -- The (left, top, right, bottom) box around every changed pixel
+            with right and bottom exclusive, like PIL, or None.
+        size and mode -- Of the images.
+
+        The images are compared band_rows rows at a time so memory stays
+        bounded for large images.
 
-        __pixelIndex = 0
-        try:
-            for heightIndex in range(0, __oim.size[1]):
-                for widthIndex in range(0, __oim.size[0]):
-                    if __pixelIndex >= pixels:
-                        raise LoopComplete("Done!")
-                    else:
-                        print(str(__pixelIndex) + ": " +
-                              str(__oimd[widthIndex][heightIndex]) + " --> " +
-                              str(__nimd[widthIndex][heightIndex]))
-                        __pixelIndex += 1
-        except LoopComplete:
-            pass
-        __oim.close()
-        __nim.close()
+        Mandatory Arguments:
+        image_a -- The first image, anything open_image accepts.
+        image_b -- The second image.
+
+        Optional Arguments:
+        heatmap -- A filename or stream to save a greyscale PNG of the
+            largest change to each pixel, scaled so the biggest change is
+            white. (default=None)
+        band_rows -- The number of rows compared at a time. (Int, default=256)
+
+        Exceptions:
+        IOError -- Raised if one of the images can't be opened.
+        ValueError -- Raised if the images aren't the same size and mode.
+        """
+
+        with steganographer.opened_image(image_a) as __a, \
+                steganographer.opened_image(image_b) as __b:
+            if __a.size != __b.size or __a.mode != __b.mode:
+                raise ValueError("The images need to be the same size and mode. Got "
+                                 + str(__a.size) + " " + __a.mode + " and "
+                                 + str(__b.size) + " " + __b.mode + ".")
+            __size = __a.size
+            __mode = __a.mode
+            __ad = numpy.asarray(__a)
+            __bd = numpy.asarray(__b)
+        if __ad.ndim == 2:
+            __ad = __ad[:, :, None]
+            __bd = __bd[:, :, None]
+
+        __height, __width, __channels = __ad.shape
+        __changed_pixels = 0
+        __changed_channels = numpy.zeros(__channels, dtype=numpy.int64)
+        __lsb_flips = numpy.zeros(__channels, dtype=numpy.int64)
+        __squares = 0
+        __max_delta = 0
+        __rows = numpy.zeros(__height, dtype=bool)
+        __columns = numpy.zeros(__width, dtype=bool)
+        __map = numpy.zeros((__height, __width), dtype=numpy.uint8) if heatmap is not None else None
+
+        for __top in range(0, __height, band_rows):
+            __band_a = __ad[__top:__top + band_rows]
+            __band_b = __bd[__top:__top + band_rows]
+            __delta = numpy.abs(__band_a.astype(numpy.int16) - __band_b.astype(numpy.int16))
+            __changed = __delta != 0
+            __pixel_changed = __changed.any(axis=2)
+            __changed_pixels += int(__pixel_changed.sum())
+            __changed_channels += __changed.sum(axis=(0, 1))
+            __lsb_flips += ((__band_a ^ __band_b) & 1).sum(axis=(0, 1), dtype=numpy.int64)
+            __squares += int(numpy.square(__delta, dtype=numpy.int64).sum())
+            __band_max = __delta.max(axis=2)
+            __max_delta = max(__max_delta, int(__band_max.max()) if __band_max.size else 0)
+            __rows[__top:__top + band_rows] = __pixel_changed.any(axis=1)
+            __columns |= __pixel_changed.any(axis=0)
+            if __map is not None:
+                __map[__top:__top + band_rows] = __band_max
+
+        __bbox = None
+        if __changed_pixels:
+            __row_index = numpy.flatnonzero(__rows)
+            __column_index = numpy.flatnonzero(__columns)
+            __bbox = (int(__column_index[0]), int(__row_index[0]),
+                      int(__column_index[-1]) + 1, int(__row_index[-1]) + 1)
+
+        __mse = __squares / float(max(1, __ad.size))
+        __report = {"size": __size, "mode": __mode,
+                    "changed_pixels": __changed_pixels,
+                    "changed_channels": __changed_channels.tolist(),
+                    "lsb_flips": __lsb_flips.tolist(),
+                    "max_delta": __max_delta,
+                    "mse": __mse,
+                    "psnr": 10 * math.log10(255.0 ** 2 / __mse) if __mse else float("inf"),
+                    "bbox": __bbox}
+
+        if __map is not None:
+            if __max_delta:
+                __map = (__map.astype(numpy.uint16) * 255 // __max_delta).astype(numpy.uint8)
+            try:
+                Image.fromarray(__map, "L").save(heatmap, "PNG")
+            except IOError as e:
+                raise IOError("The following error was encountered while attempting"
+                              + " to save the heatmap: " + str(e))
+        return __report
 
     @staticmethod
     def read_message_from_file(filename):
@@ -265,62 +472,418 @@ class steganographer(object):
             raise IOError("The following error was encountered opening the " +
                           "message file: " + e.message)
 
+    @staticmethod
+    def read_leading_rows(image, rows):
+        """
+        Decode only the first rows of an opened image and return them as a
+        (rows, width, channels) numpy array. For non-interlaced PNGs only the
+        compressed data of the requested rows is ever decompressed. Other
+        formats fall back to a crop, which loads the whole image.
+
+        Mandatory Arguments:
+        image -- A PIL Image that has been opened but not loaded.
+        rows -- The number of rows to decode.
+        """
+
+        rows = min(rows, image.size[1])
+        if (image.format == "PNG" and not image.info.get("interlace") and
+                getattr(image, "fp", None) is not None):
+            __leading = steganographer._png_leading_rows(image.fp, rows)
+            if __leading is not None:
+                with Image.open(io.BytesIO(__leading)) as __image:
+                    return numpy.asarray(__image)
+        return numpy.asarray(image.crop((0, 0, image.size[0], rows)))
+
+    @staticmethod
+    def _png_leading_rows(fd, rows):
+        """
+        Return a PNG of just the first rows of the PNG in a file object, or
+        None if it can't be cut short. The rows are decompressed out of the
+        IDAT chunks until there are enough and stored again, filters and
+        all, behind a header with the new height. PIL then decodes it like
+        any other image.
+        """
+
+        def __chunk(kind, data):
+            return (struct.pack(">I", len(data)) + kind + data +
+                    struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+        fd.seek(0)
+        if fd.read(8) != steganographer.PNG_SIGNATURE:
+            return None
+        __kept = []
+        __needed = None
+        __decompressor = zlib.decompressobj()
+        __scanlines = b""
+        while __needed is None or len(__scanlines) < __needed:
+            __head = fd.read(8)
+            if len(__head) < 8:
+                return None
+            __length, __kind = struct.unpack(">I4s", __head)
+            __data = fd.read(__length)
+            fd.read(4)
+            if __kind == b"IHDR":
+                __width, __height, __bits, __color_type = struct.unpack(
+                    ">IIBB", __data[:10])
+                if __color_type not in steganographer.PNG_CHANNELS:
+                    return None
+                # Each row is a filter type byte and the packed pixels.
+                __needed = rows * (1 + (__width * __bits *
+                                        steganographer.PNG_CHANNELS[__color_type] + 7) // 8)
+                __kept.append(__chunk(__kind, struct.pack(">II", __width, rows)
+                                      + __data[8:]))
+            elif __kind == b"IDAT":
+                if __needed is None:
+                    return None
+                try:
+                    __scanlines += __decompressor.decompress(
+                        __data, __needed - len(__scanlines))
+                except zlib.error:
+                    return None
+            elif __kind == b"IEND":
+                return None
+            elif not __scanlines:
+                # The palette and anything else that comes before the pixels.
+                __kept.append(__chunk(__kind, __data))
+        return (steganographer.PNG_SIGNATURE + b"".join(__kept) +
+                __chunk(b"IDAT", zlib.compress(__scanlines[:__needed], 1)) +
+                __chunk(b"IEND", b""))
+
+    @staticmethod
+    def parse_header(image_data, color_size):
+        """
+        Return the Header stored at the start of the image data. Images
+        without a versioned header across the first row are read as having
+        the original 32 bit length down the first column.
+
+        Mandatory Arguments:
+        image_data -- A (height, width, channels) numpy array holding at
+            least the rows the header is stored in.
+        color_size -- The number of channels per pixel that carry data.
+
+        Exceptions:
+        ValueError -- Raised from Header.read if the versioned header is
+            corrupt or can't be decoded by this version.
+        ValueError -- Raised if the header says the message is stored in a
+            different number of channels than the image has.
+        """
+
+        def __read_bits(count):
+            return LSBEngine.extract(image_data, count, color_size,
+                                     layout=LSBEngine.LAYOUT_ROWS)
+
+        __header = Header.read(__read_bits, color_size,
+                               image_data.shape[0] * image_data.shape[1] * color_size)
+        if __header is None:
+            # There are 32 bits of length data at the beginning of the
+            # encoding. That is the number of characters in the message, not
+            # bits, along with the depth the message was stored at.
+            __header = Header.from_legacy_bits(LSBEngine.extract(
+                image_data, BitCodec.LENGTH_BITS, color_size), color_size)
+        if __header.color_size != color_size:
+            raise ValueError("The message is stored in " + str(__header.color_size)
+                             + " channels per pixel but the image has "
+                             + str(color_size) + ".")
+        return __header
+
+    @staticmethod
+    def open_image(source):
+        """
+        Open an image from any of the supported sources and return a PIL
+        Image.
+
+        Mandatory Arguments:
+        source -- A filename, the encoded image as bytes, a file-like object,
+            a PIL Image or a (height, width, channels) numpy array.
+
+        Exceptions:
+        IOError -- This is raised if there is a problem opening the image.
+        """
+
+        if isinstance(source, Image.Image):
+            return source
+        if isinstance(source, numpy.ndarray):
+            return Image.fromarray(source)
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        return Image.open(source)
+
+    @staticmethod
+    def release_image(source, image, position=None):
+        """
+        Let go of the image open_image returned for source. It is closed if
+        it was opened from a filename, bytes or an array. A PIL Image or
+        file-like object the caller passed in is theirs and is left open,
+        and file-like objects are rewound to position so they can be read
+        again.
+
+        Mandatory Arguments:
+        source -- The source given to open_image.
+        image -- The image open_image returned.
+
+        Optional Arguments:
+        position -- Where the file-like object was before it was opened.
+            (Int, default=don't rewind)
+        """
+
+        if isinstance(source, Image.Image):
+            return
+        if hasattr(source, "read"):
+            if position is not None:
+                source.seek(position)
+        else:
+            image.close()
+
+    @staticmethod
+    @contextlib.contextmanager
+    def opened_image(source):
+        """
+        Open an image with open_image for the length of a with block and
+        release it with release_image afterwards.
+
+        Mandatory Arguments:
+        source -- Anything open_image takes.
+
+        Exceptions:
+        IOError -- This is raised if there is a problem opening the image.
+        """
+
+        position = source.tell() if hasattr(source, "read") else None
+        image = steganographer.open_image(source)
+        try:
+            yield image
+        finally:
+            steganographer.release_image(source, image, position)
+
     # Instance Methods
-    def initialize_image_data(self):
+    def _input_name(self):
+        """Return a printable name for the input image."""
+
+        if isinstance(self._input_file, str):
+            return self._input_file
+        return "<" + type(self._input_file).__name__ + " input>"
+
+    def _open_input(self):
         """
-        This prepares the class for image manipulation.
-        
+        Open the input image and return it as a PIL Image.
+
         Exceptions:
         IOError -- This is raised if there is a problem opening the image.
-        ValueError -- This is raised if the input filename is empty.
-        ValueError -- This is raised if the image supplied has an unsupported
-            color model.
+        ValueError -- This is raised if no input image was given.
         """
-        if self._input_file == "":
+
+        if self._input_file is None or (isinstance(self._input_file, str) and
+                                        self._input_file == ""):
             raise ValueError("You must supply an input file name to encode "
                              + "decode, or compare pixels.")
+        self._input_position = None
+        if hasattr(self._input_file, "read"):
+            self._input_position = self._input_file.tell()
         try:
-            __imageIn = Image.open(self._input_file)
+            return steganographer.open_image(self._input_file)
         except IOError as e:
             raise e
 
+    def _close_input(self, image):
+        """
+        Release an image from _open_input. Streams the caller handed us are
+        rewound instead of closed.
+        """
+
+        steganographer.release_image(self._input_file, image, self._input_position)
+
+    def _load_image_data(self):
+        """
+        Return a tuple of the (height, width, channels) image data, the color
+        mode and the (width, height) size of the input image. The data can be
+        read only, in which case it is copied before the first embed.
+        Subclasses that keep their pixels somewhere other than memory
+        override this.
+
+        Exceptions:
+        IOError -- This is raised if there is a problem opening the image.
+        ValueError -- This is raised if the input filename is empty.
+        """
+
+        # Uncompressed images are mapped copy on write so only the pixels
+        # that are actually read or changed are ever loaded. Formats that
+        # can never be mapped, like PNG and JPEG, go straight to the cache
+        # without being opened.
+        self._input_format = None
+        if isinstance(self._input_file, str) and self._input_file != "":
+            if RawCarrier.can_map(self._input_file):
+                try:
+                    __pixels, __map, __mode, self._input_format = RawCarrier.map(
+                        self._input_file, "c")
+                    return __pixels, __mode, (__pixels.shape[1], __pixels.shape[0])
+                except (IOError, ValueError):
+                    pass
+
+            if self._carrier_cache is not None:
+                return self._carrier_cache.load(self._input_file)
+
+        __imageIn = self._open_input()
+
         # Without the numpy.copy() the data would be read only
-        self.__image_data = numpy.copy(numpy.asarray(__imageIn))
-        self.__color_mode = __imageIn.mode
-        self.__image_size = __imageIn.size
-        __imageIn.close()
+        __loaded = (numpy.copy(numpy.asarray(__imageIn)), __imageIn.mode,
+                    __imageIn.size)
+        self._close_input(__imageIn)
+        return __loaded
+
+    def initialize_image_data(self):
+        """
+        This prepares the class for image manipulation.
+        
+        Exceptions:
+        IOError -- This is raised if there is a problem opening the image.
+        ValueError -- This is raised if the input filename is empty.
+        ValueError -- This is raised if the image supplied has an unsupported
+            color model.
+        """
+        self.__image_data, self.__color_mode, self.__image_size = \
+            self._load_image_data()
 
         # Set color size
-        if self.__color_mode == "RGB":
-            self.__color_size = 3
-        elif self.__color_mode == "RGBA":
-            # Don't encode to the alpha value
-            self.__color_size = 3
-        elif self.__color_mode == "CMYK":
-            self.__color_size = 4
-        elif self.__color_mode == "YCbCr":
-            self.__color_size = 4
-        else:
-            raise ValueError("The input image " + self._input_file +
+        if self.__color_mode not in steganographer.COLOR_SIZES:
+            raise ValueError("The input image " + self._input_name() +
                              " contains an unsupported color model.")
+        self.__color_size = steganographer.COLOR_SIZES[self.__color_mode]
 
         # Calculate the maximum number of bits we'll be able to store.
         self.__max_bits_storable = self.__image_size[0] * self.__image_size[1]
         self.__max_bits_storable *= self.__color_size
 
+    def _choose_output_format(self):
+        """
+        Make sure the output format can hold the color mode of the carrier.
+        If outputFormat was left out the first format that can is picked.
+
+        Exceptions:
+        ValueError -- Raised if outputFormat was given and can't hold the
+            color mode, or if no output format can.
+        """
+
+        if self.__color_mode in steganographer.OUTPUT_MODES[self._output_format]:
+            return
+        __formats = [__format for __format in steganographer.OUTPUT_FORMATS
+                     if self.__color_mode in steganographer.OUTPUT_MODES[__format]]
+        if __formats and not self._output_format_given:
+            self._output_format = __formats[0]
+            return
+        if not __formats:
+            raise ValueError("The input image " + self._input_name() + " is "
+                             + self.__color_mode + ", which none of the output "
+                             + "formats can hold.")
+        raise ValueError("The input image " + self._input_name() + " is "
+                         + self.__color_mode + ", which " + self._output_format
+                         + " can't hold. Use " + " or ".join(__formats) + ".")
+
+    def _save_options(self):
+        """Return the keyword arguments for Image.save for the output format."""
+
+        if self._output_format == "PNG":
+            return {"compress_level": self._compress_level,
+                    "optimize": self._optimize}
+        if self._output_format == "TIFF":
+            if self._compress_level == 0:
+                return {"compression": "raw"}
+            return {"compression": "tiff_adobe_deflate"}
+        if self._output_format == "WEBP":
+            # For lossless WebP quality is how much effort goes into
+            # compressing and method trades speed for size.
+            return {"lossless": True, "exact": True,
+                    "quality": self._compress_level * 100 // 9,
+                    "method": self._compress_level * 6 // 9}
+        return {}
+
+    def _can_patch_output(self):
+        """
+        Return True if the output can be written by copying the input file
+        and rewriting only the pixels the message changed, which is the case
+        when the input was mapped and is saved to a file in the same
+        uncompressed format.
+        """
+
+        return (isinstance(self._output_file, str) and
+                self._input_format is not None and
+                self._input_format == self._output_format and
+                not (self._output_format == "TIFF" and self._compress_level))
+
+    def _patch_output(self):
+        """
+        Copy the input file to outputFile and write the lines of pixels the
+        last encode changed into the copy.
+
+        Exceptions:
+        IOError -- Raised if the output file could not be written.
+        ValueError -- Raised if the copy can't be mapped.
+        """
+
+        if os.path.abspath(self._output_file) != os.path.abspath(self._input_file):
+            shutil.copyfile(self._input_file, self._output_file)
+        __pixels, __map, __mode, __format = RawCarrier.map(self._output_file, "r+")
+
+        if self._dirty is None:
+            __pixels[...] = self.__image_data
+        else:
+            __slots, __header = self._dirty
+            __layout = __header.layout()
+            if __header.is_scattered():
+                # Only the rows of the header are in order. The rest of the
+                # message is wherever the scatter map put it.
+                for __positions in self._scatter_positions(
+                        __header, 0, __slots - __header.size_bits()):
+                    __index = LSBEngine.slot_index(self.__image_data,
+                                                   self.__color_size, __positions)
+                    __pixels[__index] = self.__image_data[__index]
+                __slots = __header.size_bits()
+            __view = LSBEngine.channel_view(self.__image_data, self.__color_size,
+                                            __layout)
+            __lines = -(-__slots // (__view.shape[1] * __view.shape[2]))
+            if __layout == LSBEngine.LAYOUT_ROWS:
+                __pixels[:__lines] = self.__image_data[:__lines]
+            else:
+                __pixels[:, :__lines] = self.__image_data[:, :__lines]
+        __map.flush()
+        del __pixels, __map
+
     def save_output_image(self):
-        """Save the stored image data to file.
+        """Save the stored image data to file, or write it to the output stream.
+        Uncompressed inputs saved in their own format only have the changed
+        pixels rewritten.
         
         Exceptions:
         IOError -- Raised if the output file could not be opened.
         """
 
-        __imageOut = Image.fromarray(self.__image_data)
+        if self._can_patch_output():
+            try:
+                self._patch_output()
+            except IOError as e:
+                raise IOError("The following error was encountered while "
+                              + "attempting to save the output image: " + str(e))
+            print("Image encoded and saved as " + self._output_file)
+            return
+
+        __image_data = self.__image_data
+        if (self._input_format is not None and isinstance(self._output_file, str)
+                and os.path.abspath(self._output_file) ==
+                os.path.abspath(self._input_file)):
+            # The pixels are still mapped from the file about to be replaced.
+            __image_data = numpy.array(__image_data)
+        __imageOut = Image.fromarray(__image_data)
+        if __imageOut.mode != self.__color_mode:
+            # fromarray guesses the mode from the number of channels, which
+            # turns CMYK into RGBA.
+            __imageOut = Image.frombuffer(self.__color_mode, __imageOut.size,
+                                          numpy.ascontiguousarray(__image_data),
+                                          "raw", self.__color_mode, 0, 1)
         try:
-            __imageOut.save(self._output_file, 'PNG', compress_level=0)
+            __imageOut.save(self._output_file, self._output_format,
+                            **self._save_options())
         except IOError as e:
             raise IOError("The following error was encountered while attempting"
-                          + " to save the output image: " + e.message)
+                          + " to save the output image: " + str(e))
         # It should be noted that I have left out the KeyError Exception that
         # can be raised by the Image.save() method. Per the documentation this
         # exception can be safely ignored if the format option is provided to the
@@ -331,7 +894,41 @@ class steganographer(object):
         __imageOut.close()
 
         # Sing songs of our success
-        print("Image encoded and saved as " + self._output_file)
+        if isinstance(self._output_file, str):
+            print("Image encoded and saved as " + self._output_file)
+
+    def _capture_output(self, function, *args):
+        """
+        Call one of the encoding methods with the output going to an in
+        memory stream instead of outputFile and return what was written.
+        The output is in outputFormat.
+
+        Mandatory Arguments:
+        function -- The bound method to call.
+        *args -- The arguments to pass to it.
+        """
+
+        __output = self._output_file
+        self._output_file = io.BytesIO()
+        try:
+            function(*args)
+            return self._output_file.getvalue()
+        finally:
+            self._output_file = __output
+
+    def encode_message_to_bytes(self, message):
+        """
+        Encode a message into a picture and return the encoded image as bytes
+        instead of saving it. outputFile does not need to be set.
+
+        Mandatory Arguments:
+        message -- The message to be encoded into the image.
+
+        Exceptions:
+        The same as encode_message.
+        """
+
+        return self._capture_output(self.encode_message, message)
 
     def encode_message(self, message):
         """
@@ -354,9 +951,57 @@ class steganographer(object):
             input picture is unsupported by steganographer.
         """
 
+        __flags, __message = Compressor.compress(BitCodec.to_bytes(message),
+                                                 self._compression)
+        self._encode_payload(__message, __flags)
+
+    def _encode_payload(self, message, flags=0):
+        """
+        Encode bytes into the picture with a header carrying flags. This is
+        where encode_message does its work.
+
+        Mandatory Arguments:
+        message -- The bytes to be encoded into the image.
+
+        Optional Arguments:
+        flags -- The Header flags describing the message. (Int, default=0)
+        """
+
         __message = message
+        __header, __slots = self._begin_encode(len(__message), flags)
+        if __header.fec:
+            __message = ReedSolomon.encode(__message, __header.fec)
+        __payload = BitCodec.to_bits(__message)
+        self._embed_bits(__header, __payload, __header.size_bits())
+
+        try:
+            self._finish_encode(__header, __header.size_bits() +
+                                -(-len(__payload) // self._depth), __slots)
+        except IOError as e:
+            raise e
+
+    def _begin_encode(self, length, flags=0):
+        """
+        Get everything ready to encode a message of length bytes and write
+        the header. Returns a tuple of the Header and the number of slots
+        the padded message will take.
+
+        Mandatory Arguments:
+        length -- The length of the message in bytes.
+
+        Optional Arguments:
+        flags -- The Header flags describing the message. (Int, default=0)
+
+        Exceptions:
+        ValueError -- Raised if the outputFile name is blank.
+        ValueError -- Raised if the message is empty.
+        ValueError -- Raised if the message is too large for the supplied image.
+        IOError and ValueError -- Raised from initialize_image_data.
+        """
+
         # Error Handling
-        if self._output_file == "":
+        if self._output_file is None or (isinstance(self._output_file, str) and
+                                         self._output_file == ""):
             raise ValueError("No output filename specified. Please specify"
                              + " a filename and call encode_image() again.")
         if self.__image_data.shape == (1, 1, 1):
@@ -367,69 +1012,190 @@ class steganographer(object):
                 raise e
             except IOError as e:
                 raise e
-        if __message == "":
+        if length == 0:
             raise ValueError("Message not set. Please set message and"
                              + " call encode_image() again.")
+        self._choose_output_format()
+
+        if self._layout == LSBEngine.LAYOUT_COLUMNS:
+            __header = Header(length, self._depth, Header.LEGACY_VERSION,
+                              self.__color_size)
+        else:
+            __seed = None
+            if self._scatter:
+                __seed = ScatterMap.new_seed()
+                if self._scatter_key is not None:
+                    flags |= Header.FLAG_SCATTER_KEY
+            if self._fec:
+                __version = Header.FEC_VERSION
+            elif self._scatter:
+                __version = Header.SCATTER_VERSION
+            else:
+                __version = Header.VERSION
+            __header = Header(length, self._depth, __version, self.__color_size,
+                              flags, __seed, self._fec)
 
-        __bit_sequence = steganographer.int_to_bin_list(len(__message))
-        __bit_sequence += steganographer.message_to_bin_list(__message)
+        # The header is always stored 1 bit per channel. After that every
+        # channel holds depth bits of the message.
+        __slots = __header.size_bits() + -(-__header.stored_length() * 8 // self._depth)
 
         # Pad the message
-        __padSize = self.__color_size - (len(__bit_sequence) % self.__color_size)
-        for i in range(0, __padSize):
-            __bit_sequence += [0]
+        __slots += self.__color_size - (__slots % self.__color_size)
 
-        if len(__bit_sequence) >= self.__max_bits_storable:
+        if __slots >= self.__max_bits_storable:
             raise ValueError("The message or message file provided was too "
                              + "large to be encoded onto image "
-                             + self._input_file + ".")
+                             + self._input_name() + ".")
 
-        """
-        I am pretty sure this formatting is more levels than I can count
-        against PEP8. I am going to leave it like this though because I think
-        it is easier to read. I feel like Clark, Johnny, and Joe would likely
-        agree.
-        """
-        __bitIndex = 0
-        __bitList = [0, 0, 0]
-        try:
-            for heightIndex in range(0, self.__image_size[0]):
+        # Cached carriers are shared read only. Take a copy to write into
+        # the first time the image is changed.
+        if not self.__image_data.flags.writeable:
+            self.__image_data = numpy.copy(self.__image_data)
+        LSBEngine.embed(self.__image_data, __header.to_bits(),
+                        self.__color_size, layout=__header.layout())
+        return __header, __slots
 
-                for widthIndex in range(0, self.__image_size[1]):
+    def _finish_encode(self, header, start, slots):
+        """
+        Write the padding from slot start up to slot slots and save the image.
 
-                    for colorIndex in range(0, self.__color_size):
+        Mandatory Arguments:
+        header -- The Header from _begin_encode.
+        start -- The first slot after the message.
+        slots -- The number of slots the padded message takes.
 
-                        if __bitIndex >= len(__bit_sequence):
-                            raise LoopComplete("Done!")
-                        else:
-                            __bitList[colorIndex] = steganographer.set_bit(
-                                self.__image_data[widthIndex][heightIndex][colorIndex],
-                                0,
-                                __bit_sequence[__bitIndex])
-                            __bitIndex += 1
+        Exceptions:
+        IOError -- Raised from save_output_image if there was a problem saving
+            the output image.
+        """
 
-                    self.__image_data[widthIndex][heightIndex] = __bitList
-                    __bitList = [0, 0, 0]
-        except LoopComplete:
-            pass
+        self._embed_bits(header,
+                         numpy.zeros((slots - start) * self._depth, dtype=numpy.uint8),
+                         start)
+        self._dirty = (slots, header)
         try:
             self.save_output_image()
         except IOError as e:
             raise e
 
-    def decode_message(self):
+    def _scatter_positions(self, header, start, count):
         """
-        This method will decode a message that is embedded in an image.
-        
+        Yield the slots of the image that count message slots starting at
+        message slot start are scattered to, a block at a time.
+
+        Mandatory Arguments:
+        header -- The Header of a scattered message.
+        start -- The first message slot, counted from the end of the header.
+        count -- The number of message slots.
+        """
+
+        __first = header.size_bits()
+        __key = self._scatter_key if header.needs_scatter_key() else b""
+        __map = ScatterMap(self.__max_bits_storable - __first, header.seed, __key)
+        for __positions in __map.blocks(start, count):
+            yield __positions + numpy.uint64(__first)
+
+    def _embed_bits(self, header, bits, start):
+        """
+        Write bits into the image starting at slot start, either in layout
+        order or wherever the scatter map puts them.
+
+        Mandatory Arguments:
+        header -- The Header from _begin_encode.
+        bits -- A numpy uint8 array of 1s and 0s.
+        start -- The slot to start writing at.
+        """
+
+        if not header.is_scattered():
+            LSBEngine.embed(self.__image_data, bits, self.__color_size, start,
+                            header.depth, header.layout())
+            return
+        __offset = 0
+        for __positions in self._scatter_positions(
+                header, start - header.size_bits(), -(-len(bits) // header.depth)):
+            __count = len(__positions) * header.depth
+            LSBEngine.embed_at(self.__image_data, bits[__offset:__offset + __count],
+                               self.__color_size, __positions, header.depth)
+            __offset += __count
+
+    def _extract_bytes(self, header, length, start):
+        """
+        Return length bytes read out of the image starting at slot start,
+        either in layout order or from wherever the scatter map put them.
+
+        Mandatory Arguments:
+        header -- The Header from _read_header.
+        length -- The number of bytes to read.
+        start -- The slot to start reading at.
+        """
+
+        if not header.is_scattered():
+            return LSBEngine.extract_bytes(self.__image_data, length,
+                                           self.__color_size, start,
+                                           header.depth, header.layout())
+        __remaining = length * 8
+        __parts = []
+        # Blocks are a whole number of bytes long, only the last one is short.
+        for __positions in self._scatter_positions(
+                header, start - header.size_bits(), -(-__remaining // header.depth)):
+            __count = min(__remaining, len(__positions) * header.depth)
+            __parts.append(numpy.packbits(LSBEngine.extract_at(
+                self.__image_data, __count, self.__color_size, __positions,
+                header.depth)).tobytes())
+            __remaining -= __count
+        return b"".join(__parts)
+
+    def decode_message_bytes(self):
+        """
+        This method will decode a message that is embedded in an image and
+        return it as bytes.
+
         Exceptions:
-        IOError -- Raised from initialize_image_data if the input image file 
+        IOError -- Raised from initialize_image_data if the input image file
             could not be opened.
+        ValueError -- Raised if the length stored in the image is larger than
+            the image could possibly hold.
         ValueError -- Raised from initialize_image_data if the input filename
             is blank.
-        ValueError -- Raised from initialize_image_data if the color model of 
+        ValueError -- Raised from initialize_image_data if the color model of
             input picture is unsupported by steganographer.
         """
 
+        __header = self._read_header()
+        __message = self._extract_payload(__header)
+
+        # Encrypted messages were compressed before they were encrypted.
+        if __header.is_encrypted():
+            return __message
+        return Compressor.decompress(__header.compression(), __message)
+
+    def _extract_payload(self, header):
+        """
+        Return the bytes stored in the image behind header, exactly as they
+        were embedded.
+
+        Mandatory Arguments:
+        header -- The Header from _read_header.
+        """
+
+        # Only pull the bits the message occupies. The padding at the end
+        # gets left in the picture where it belongs.
+        __stored = self._extract_bytes(header, header.stored_length(),
+                                       header.size_bits())
+        if header.fec:
+            return ReedSolomon.decode(__stored, header.length, header.fec)
+        return __stored
+
+    def _read_header(self):
+        """
+        Load the image if needed and return the Header stored in it.
+
+        Exceptions:
+        ValueError -- Raised if the length stored in the image is larger than
+            the image could possibly hold.
+        IOError and ValueError -- Raised from initialize_image_data.
+        """
+
         if self.__image_data.shape == (1, 1, 1):
             try:
                 self.initialize_image_data()
@@ -438,150 +1204,271 @@ class steganographer(object):
             except ValueError as e:
                 raise e
 
-        # Create a list to get the number of bits in the message
-        __len_list = []
-
-        # This shit...
-        # There are 32 bits (Integer presumably, Python is a little willy-nilly
-        # on primitive types) of length data at the beginning of the encoding
-        # 32/3 = 10 with 2 bits left over. So I need the first 10 pixels worth
-        # of LSBs and the Red and Green LSB out of the 11th pixel. So, I
-        # iterate through all 11 and on the 11th pixel I store normally until
-        # I hit the Blue value, then I just pass which ends both loops.
-        try:
-            __bit_index = 0
-            for heightIndex in range(0, self.__image_size[0]):
-                for widthIndex in range(0, self.__image_size[1]):
-                    for colorIndex in range(0, self.__color_size):
-                        if __bit_index >= 32:
-                            raise LoopComplete("Done!")
-                        else:
-                            __len_list.append(self.__image_data[widthIndex][heightIndex][colorIndex] & 1)
-                            __bit_index += 1
-        except LoopComplete:
-            pass
-        # Now we know how many bits to expect so we convert that back into an Int and store it for later
-        __message_length = steganographer.bin_list_to_int(__len_list)
-
-        # I found it was easier on me to just store the entire message with the length data at first.
-        # Also, to make the encoding loop easier I padded the end of it so it would be evenly
-        # divisible by the number of colors in the image. Here I will just grab everything
-        # out of the picture all at once and store it in total list. Then I will use the message
-        # length information to iterate through only the message bits so I don't have to do any
-        # silly shit in the inner for loop here to weed out the length/padding data.
-        __total_list = []
-
-        # I stored the message length in characters which are 8 bits a piece. However, I work mostly
-        # in number of bits instead of bytes so I
-        # have to convert it off of the bat.
-        __message_bit_length = __message_length * 8
-
-        # Iterate through all of the bits that I believe were encoded onto the image.
-        try:
-            __bits_processed = 0
-            for heightIndex in range(0, self.__image_size[0]):
+        __header = steganographer.parse_header(self.__image_data,
+                                               self.__color_size)
+        if __header.needs_scatter_key() and self._scatter_key is None:
+            raise ValueError("The message in " + self._input_name() + " was "
+                             + "scattered with a key. Pass scatterKey to "
+                             + "decode it.")
 
-                for widthIndex in range(0, self.__image_size[1]):
+        __slots = __header.size_bits() + -(-__header.stored_length() * 8 //
+                                           __header.depth)
+        if __slots > self.__max_bits_storable:
+            raise ValueError("The image " + self._input_name() + " does not "
+                             + "appear to contain a message.")
+        return __header
 
-                    for colorIndex in range(0, self.__color_size):
-
-                        if __bits_processed >= (__message_bit_length + 32):
-                            raise LoopComplete("Done!")
-                        else:
-                            __total_list.append(
-                                self.__image_data[widthIndex][heightIndex][colorIndex] & 1)
-                            __bits_processed += 1
+    def decode_message(self):
+        """
+        This method will decode a message that is embedded in an image.
+        
+        Exceptions:
+        IOError -- Raised from initialize_image_data if the input image file 
+            could not be opened.
+        ValueError -- Raised from decode_message_bytes if the image doesn't
+            contain a message.
+        ValueError -- Raised from initialize_image_data if the input filename
+            is blank.
+        ValueError -- Raised from initialize_image_data if the color model of 
+            input picture is unsupported by steganographer.
+        """
 
-        except LoopComplete as e:
-            pass
+        # Every character was stored as a single byte.
+        return self.decode_message_bytes().decode("latin-1")
 
-        __message_list = []
+    def peek_header(self):
+        """
+        Read just the header from the input image without loading the
+        rest of it. This is meant for quickly checking whether an image
+        carries a message and how big it is. Returns a dictionary with the
+        keys length (in bytes), depth, version, encrypted, compression,
+        scattered, fec, has_message, format, mode, size, color_size and
+        capacity (in bytes at the stored depth).
 
-        # Iterate from the end to the end of the message data. So the message will always start
-        # at the 33nd (decimal value 32) bit because the length data is 32 bits long. Then if the
-        # message is x long we want to count from 32 to x + 32 since the message data will essentially
-        # be offset in the picture by 32 bits. This also leaves out the padding data because we are
-        # only iterating to the end of the message data exactly so the padding will be left out of the
-        # message. That is good because the bitStringToMessage function will return and error string
-        # if the message data isn't cleanly divisible by 8. Which it wouldn't be with the padding.
-        for index in range(32, __message_bit_length + 32):
-            __message_list.append(__total_list[index])
+        Exceptions:
+        IOError -- This is raised if there is a problem opening the image.
+        ValueError -- This is raised if the input filename is empty.
+        ValueError -- This is raised if the image supplied has an unsupported
+            color model.
+        ValueError -- This is raised if the image has a versioned header that
+            can't be read.
+        """
 
-        # Convert the message from a list of binary values do a string
-        __message = steganographer.bin_list_to_message(__message_list)
+        __imageIn = self._open_input()
 
-        return __message
+        if __imageIn.mode not in steganographer.COLOR_SIZES:
+            self._close_input(__imageIn)
+            raise ValueError("The input image " + self._input_name() +
+                             " contains an unsupported color model.")
+        __color_size = steganographer.COLOR_SIZES[__imageIn.mode]
+        __header = {"format": __imageIn.format, "mode": __imageIn.mode,
+                    "size": __imageIn.size, "color_size": __color_size}
+
+        # A versioned header runs along the first row and a legacy one down
+        # the first column. Decode enough rows to cover either.
+        __rows = max(-(-BitCodec.LENGTH_BITS // __color_size),
+                     -(-Header.MAX_BITS // (__imageIn.size[0] * __color_size)))
+        if __imageIn is self._input_file:
+            # Don't go rewriting the tiles of an image somebody handed us.
+            __image_data = numpy.asarray(__imageIn)[:__rows]
+        else:
+            __image_data = steganographer.read_leading_rows(__imageIn, __rows)
+        self._close_input(__imageIn)
 
-    def encode_message_from_file(self, filename):
+        __max_bits = __header["size"][0] * __header["size"][1] * __color_size
+        try:
+            __stored = steganographer.parse_header(__image_data, __color_size)
+        except ValueError as e:
+            raise ValueError("The image " + self._input_name() + " has an "
+                             + "unreadable header: " + str(e))
+        __header["length"] = __stored.length
+        __header["depth"] = __stored.depth
+        __header["version"] = __stored.version
+        __header["encrypted"] = __stored.is_encrypted()
+        __header["compression"] = __stored.compression()
+        __header["scattered"] = __stored.is_scattered()
+        __header["fec"] = __stored.fec
+        __header["capacity"] = ((__max_bits - __stored.size_bits()) *
+                                __stored.depth) // 8
+        __header["has_message"] = (0 < __header["length"] and
+                                   __stored.stored_length() <= __header["capacity"])
+        return __header
+
+    def encode_message_from_file(self, filename, chunk_size=CHUNK_SIZE):
         """
-        This function will open a file, read the contents, then pass the
-        contents as a message to encode_image.
+        This function will encode the contents of a file onto the image. The
+        file is read and embedded chunk_size bytes at a time so the whole
+        message never has to sit in memory.
 
         Mandatory Arguments:
         filename - The name of the file containing the message.
 
+        Optional Arguments:
+        chunk_size - The number of bytes to read at a time.
+            (Int, default=steganographer.CHUNK_SIZE)
+
         Exceptions:
-        IOError -- Raised from read_message_from_file if the message file 
-            cannot be read.
-        IOError -- Raised from save_output_image through encode_message if there
-        was a problem saving the output image.
-        IOError -- Raised from initialize_image_data through encode_message if 
-            the input image file could not be opened.
-        ValueError -- Raised from encode_message if the outputFile name is 
-            blank.
-        ValueError -- Raised from encode_message if the message argument is a 
-            blank string.
-        ValueError -- Raised from encode_message if the message is too large for
-            the supplied image.
-        ValueError -- Raised from initialize_image_data through encode_message 
-            if the input filename is blank.
-        ValueError -- Raised from initialize_image_data through encode_message
-            if the color model of input picture is unsupported by 
-            steganographer.
+        IOError -- Raised if the message file cannot be read.
+        IOError -- Raised from save_output_image if there was a problem saving
+            the output image.
+        IOError -- Raised from initialize_image_data if the input image file
+            could not be opened.
+        ValueError -- Raised if the outputFile name is blank.
+        ValueError -- Raised if the message file is empty.
+        ValueError -- Raised if the message is too large for the supplied
+            image.
+        ValueError -- Raised from initialize_image_data if the input filename
+            is blank.
+        ValueError -- Raised from initialize_image_data if the color model of
+            input picture is unsupported by steganographer.
         """
 
         try:
-            __message = steganographer.read_message_from_file(filename)
+            fd = open(filename, "rb")
         except IOError as e:
-            raise e
+            raise IOError("The following error was encountered opening the " +
+                          "message file: " + str(e))
 
+        # Chunks that fill a whole number of slots are embedded as they are.
+        chunk_size = max(self._depth, chunk_size - chunk_size % self._depth)
+        __source = fd
         try:
-            self.encode_message(__message)
+            __flags, __source, __length = Compressor.compress_file(
+                fd, self._compression, chunk_size)
+            self._encode_chunks(__length, iter(lambda: __source.read(chunk_size), b""),
+                                __flags)
+        finally:
+            if __source is not fd:
+                __source.close()
+            fd.close()
+
+    def _encode_chunks(self, length, chunks, flags=0):
+        """
+        Encode a message of length bytes that arrives as an iterable of
+        chunks and save the image. Only one chunk is held at a time.
+
+        Mandatory Arguments:
+        length -- The total length of the chunks.
+        chunks -- An iterable of bytes-like chunks.
+
+        Optional Arguments:
+        flags -- The Header flags describing the message. (Int, default=0)
+
+        Exceptions:
+        The same as _begin_encode and _finish_encode.
+        """
+
+        __header, __slots = self._begin_encode(length, flags)
+        if __header.fec:
+            chunks = ReedSolomon.encode_chunks(chunks, __header.fec)
+        __start = __header.size_bits()
+        __carry = b""
+        for __chunk in chunks:
+            # Every embed has to fill a whole number of slots so the next one
+            # starts on a fresh channel. Whatever is left over waits for the
+            # next chunk.
+            if __carry:
+                __chunk = __carry + bytes(__chunk)
+            __usable = len(__chunk) - len(__chunk) % self._depth
+            __carry = bytes(__chunk[__usable:])
+            if __usable:
+                self._embed_bits(__header,
+                                 BitCodec.to_bits(memoryview(__chunk)[:__usable]),
+                                 __start)
+                __start += __usable * 8 // self._depth
+        if __carry:
+            self._embed_bits(__header, BitCodec.to_bits(__carry), __start)
+            __start += -(-len(__carry) * 8 // self._depth)
+
+        try:
+            self._finish_encode(__header, __start, __slots)
         except IOError as e:
             raise e
-        except ValueError as e:
-            raise e
 
-    def decode_message_to_file(self, filename):
+    def decode_message_to_file(self, filename, chunk_size=CHUNK_SIZE,
+                               digest=False):
         """
         This function will decode the message in an image and dump the
-        message into a file.
+        message into a file. The message is extracted and written chunk_size
+        bytes at a time so it never has to be held in memory all at once.
 
         Mandatory Arguments:
         filename - The name of the file to save the message to.
-        
+
+        Optional Arguments:
+        chunk_size - The number of bytes to extract at a time.
+            (Int, default=steganographer.CHUNK_SIZE)
+        digest - Compute the SHA256 of the message while it is written and
+            return its hex digest. (Bool, default=False)
+
         Exceptions:
-        IOError -- Raised from initialize_image_data through decode_message if 
-            the input image file could not be opened.
-        ValueError -- Raised from initialize_image_data through decode_message 
-            if the input filename is blank.
-        ValueError -- Raised from initialize_image_data through decode_message 
-            if the color model of input picture is unsupported by steganographer.
+        IOError -- Raised if the message file could not be opened.
+        IOError -- Raised from initialize_image_data if the input image file
+            could not be opened.
+        ValueError -- Raised if the image doesn't contain a message.
+        ValueError -- Raised from initialize_image_data if the input filename
+            is blank.
+        ValueError -- Raised from initialize_image_data if the color model of
+            input picture is unsupported by steganographer.
         """
 
+        __header = self._read_header()
+        __hash = SHA256.new() if digest else None
+
         try:
-            __message = self.decode_message()
+            fd = open(filename, "wb")
         except IOError as e:
-            raise e
-        except ValueError as e:
-            raise e
+            raise IOError("The following error was encountered opening the " +
+                          "message file: " + str(e))
 
+        __chunks = self._decode_chunks(__header, chunk_size)
+        if not __header.is_encrypted():
+            __chunks = Compressor.decompress_chunks(__header.compression(), __chunks)
         try:
-            steganographer.write_message_to_file(__message, filename)
-        except IOError as e:
-            raise e
+            for __chunk in __chunks:
+                fd.write(__chunk)
+                if __hash is not None:
+                    __hash.update(__chunk)
+        finally:
+            fd.close()
 
         print("Message saved to " + filename + ".")
+        if __hash is not None:
+            return __hash.hexdigest()
+
+    def _decode_chunks(self, header, chunk_size=CHUNK_SIZE):
+        """
+        Yield the message described by header chunk_size bytes at a time.
+
+        Mandatory Arguments:
+        header -- The Header from _read_header.
+
+        Optional Arguments:
+        chunk_size -- The number of bytes to extract at a time.
+            (Int, default=steganographer.CHUNK_SIZE)
+        """
+
+        # Chunks have to cover a whole number of slots, same as encoding.
+        chunk_size = max(header.depth, chunk_size - chunk_size % header.depth)
+        __chunks = self._extract_chunks(header, chunk_size)
+        if header.fec:
+            __chunks = ReedSolomon.decode_chunks(__chunks, header.length, header.fec)
+        for __chunk in __chunks:
+            yield __chunk
+
+    def _extract_chunks(self, header, chunk_size):
+        """
+        Yield the bytes the message takes in the image chunk_size bytes at a
+        time, before any error correction.
+        """
+
+        __start = header.size_bits()
+        __stored = header.stored_length()
+        for __offset in range(0, __stored, chunk_size):
+            __chunk = self._extract_bytes(
+                header, min(chunk_size, __stored - __offset), __start)
+            __start += len(__chunk) * 8 // header.depth
+            yield __chunk
 
 
 class Encryptedsteganographer(steganographer):
@@ -590,8 +1477,9 @@ class Encryptedsteganographer(steganographer):
     It requires that the intended recipient's public key and the sender's RSA
     key pair be provided. It will then generate a symmetric key to encrypt the
     actual message data with. The symmetric key, the sender's public key, a
-    signature of the message, and the encrypted message with CBC IV attached
-    will be encoded into the picture. It is likewise able to decode and
+    signature of the message, and the message encrypted and authenticated
+    with AES-GCM will be encoded into the picture. Messages
+    from files are encrypted and embedded a chunk at a time. It is likewise able to decode and
     decrypt messages embedded in a picture. To do so it requires the
     recipient's RSA key pair.
     """
@@ -610,8 +1498,17 @@ class Encryptedsteganographer(steganographer):
         sendersKeyPairFileName -- The file name of the sender's RSA key pair.
         passphrase -- The passphrase for the senders key pair. Unprotected
             key pairs will not be supported.
+        fingerprintOnly -- Embed only the fingerprint of the sender's public
+            key instead of the whole key. Decoding such a message needs
+            senderPublicKeyFileName. (Bool, default=False)
+        senderPublicKeyFileName -- The file name of the sender's public key,
+            to verify messages that only carry its fingerprint when decoding.
+            (default=None)
         """
 
+        self._fingerprint_only = bool(kwargs.pop("fingerprintOnly", False))
+        self._sender_public_key_filename = kwargs.pop("senderPublicKeyFileName", None)
+
         try:
             self._recipient_public_key_filename = kwargs.pop("recipientPublicKeyFileName")
         except KeyError:
@@ -630,23 +1527,47 @@ class Encryptedsteganographer(steganographer):
         This function will encrypt a message and encode it onto an image.
         """
 
-        __message = CryptoHelper.encrypt_message(message, self._recipient_public_key_filename,
-                                                 self._senders_key_pair_filename, self._passphrase).dump_message()
+        __flags, __message = Compressor.compress(BitCodec.to_bytes(message),
+                                                 self._compression)
+        __message = CryptoHelper.encrypt_message(__message, self._recipient_public_key_filename,
+                                                 self._senders_key_pair_filename, self._passphrase,
+                                                 self._fingerprint_only).dump_message()
+
+        self._encode_payload(__message, Header.FLAG_ENCRYPTED | __flags)
+
+    def encrypt_and_encode_message_to_bytes(self, message):
+        """
+        This function will encrypt a message, encode it onto an image and
+        return the encoded image as bytes instead of saving it.
+        """
 
-        self.encode_message(__message)
+        return self._capture_output(self.encrypt_and_encode_message, message)
 
-    def encrypt_and_encode_message_from_file(self, message_file):
+    def encrypt_and_encode_message_from_file(self, message_file,
+                                             chunk_size=steganographer.CHUNK_SIZE):
         """
         This function will encrypt a message and encode it onto an image.
+        The file is read, encrypted and embedded chunk_size bytes at a time.
         """
 
         try:
-            __message = steganographer.read_message_from_file(message_file)
+            fd = open(message_file, "rb")
         except IOError as e:
-            raise e
-        __message = CryptoHelper.encrypt_message(__message, self._recipient_public_key_filename,
-                                                 self._senders_key_pair_filename, self._passphrase).dump_message()
-        self.encode_message(__message)
+            raise IOError("The following error was encountered opening the " +
+                          "message file: " + str(e))
+        __source = fd
+        try:
+            __flags, __source, __length = Compressor.compress_file(
+                fd, self._compression, chunk_size)
+            __length, __envelope = CryptoHelper.encrypt_message_stream(
+                CryptoHelper.read_chunks(__source, chunk_size), __length,
+                self._recipient_public_key_filename, self._senders_key_pair_filename,
+                self._passphrase, self._fingerprint_only)
+            self._encode_chunks(__length, __envelope, Header.FLAG_ENCRYPTED | __flags)
+        finally:
+            if __source is not fd:
+                __source.close()
+            fd.close()
 
     def decrypt_and_decode_message(self):
         """
@@ -654,36 +1575,61 @@ class Encryptedsteganographer(steganographer):
         decrypt that message.
         """
 
-        __message = ""
-        try:
-            __message = self.decode_message()
-        except Exception as e:
-            print(e)
-        __message = CryptoHelper.decrypt_message(Message.load_message(__message), self._senders_key_pair_filename,
-                                                 self._passphrase)
+        __header = self._read_header()
+        __message = CryptoHelper.decrypt_message(Message.load_message(self._extract_payload(__header)),
+                                                 self._senders_key_pair_filename,
+                                                 self._passphrase,
+                                                 self._sender_public_key_filename)
 
-        return __message
+        # The message was compressed before it was encrypted.
+        return Compressor.decompress(__header.compression(), __message)
 
-    def decrypt_and_decode_message_to_file(self, message_file):
+    def decrypt_and_decode_message_to_file(self, message_file,
+                                           chunk_size=steganographer.CHUNK_SIZE):
         """
         This Method will decode an image with a message in it and then,
-        decrypt that message.
+        decrypt that message into a file chunk_size bytes at a time. The
+        message can only be authenticated and verified once all of it has
+        been decrypted, so it is decrypted into a temporary file next to
+        message_file first. Only once it checks out is it decompressed and
+        moved into place, so message_file never holds unverified data and is
+        left alone if the message doesn't check out.
         """
 
-        __message = ""
-        try:
-            __message = self.decode_message()
-        except Exception as e:
-            raise e
-        __message = CryptoHelper.decrypt_message(Message.load_message(__message), self._senders_key_pair_filename,
-                                                 self._passphrase)
+        __header = self._read_header()
+        __directory = os.path.dirname(os.path.abspath(message_file))
         try:
-            steganographer.write_message_to_file(__message, message_file)
+            __fd, __verified = tempfile.mkstemp(suffix=".part", dir=__directory)
         except IOError as e:
-            raise e
+            raise IOError("The following error was encountered opening the " +
+                          "message file: " + str(e))
+        __staged = [__verified]
+        try:
+            with os.fdopen(__fd, "wb") as fd:
+                for __chunk in CryptoHelper.decrypt_message_stream(
+                        self._decode_chunks(__header, chunk_size),
+                        self._senders_key_pair_filename, self._passphrase,
+                        self._sender_public_key_filename):
+                    fd.write(__chunk)
+            if __header.compression() != Compressor.NONE:
+                __fd, __decompressed = tempfile.mkstemp(suffix=".part",
+                                                        dir=__directory)
+                __staged.append(__decompressed)
+                with open(__verified, "rb") as source, os.fdopen(__fd, "wb") as fd:
+                    for __chunk in Compressor.decompress_chunks(
+                            __header.compression(),
+                            CryptoHelper.read_chunks(source, chunk_size)):
+                        fd.write(__chunk)
+            os.replace(__staged[-1], message_file)
+        finally:
+            for __name in __staged:
+                if os.path.exists(__name):
+                    os.remove(__name)
 
 
 if __name__ == "__main__":
+    from batch import BatchRunner
+    from shard import ShardedCarrier
 
     description_string = "This program will embed a message into an image."
     description_string += " It will also encrypt the message when called"
@@ -721,9 +1667,65 @@ if __name__ == "__main__":
     parser.add_argument("--passphrase", "-p",
                         help="The passphrase to the singing key.")
     parser.add_argument("--modulus", "-md", help="Key modulus size.")
-
-    parser.add_argument("--comparefiles", "-c",
-                        help="Read back the first 512 pixels of an image.")
+    parser.add_argument("--depth", type=int, default=1,
+                        help="The number of least significant bits per" +
+                             " channel to encode the message in (1-4).")
+
+    parser.add_argument("--layout", default="rows",
+                        choices=sorted(steganographer.LAYOUTS),
+                        help="How the message is laid out across the image." +
+                             " columns can be decoded by older versions.")
+    parser.add_argument("--format",
+                        help="The lossless format of the encoded image: " +
+                             ", ".join(steganographer.OUTPUT_FORMATS) + ". " +
+                             "Defaults to PNG, or TIFF for CMYK images.")
+    parser.add_argument("--compresslevel", type=int, default=0,
+                        help="How hard to compress the encoded image (0-9).")
+    parser.add_argument("--optimize", action="store_true",
+                        help="Spend extra time making PNG output smaller.")
+    parser.add_argument("--batch", "-b",
+                        help="A CSV manifest of input image, message file," +
+                             " output image lines to encode or decode with" +
+                             " --encode or --decode.")
+    parser.add_argument("--carriers", nargs="+", metavar="IMAGE",
+                        help="Split the message across these images with" +
+                             " --encode, or put it back together from them" +
+                             " with --decode.")
+    parser.add_argument("--outputcarriers", nargs="+", metavar="IMAGE",
+                        help="The encoded images for --carriers, one for" +
+                             " every carrier.")
+    parser.add_argument("--workers", "-w", type=int,
+                        help="The number of worker processes for --batch" +
+                             " and --carriers. Defaults to the number of CPUs.")
+    parser.add_argument("--chunksize", type=int, default=16,
+                        help="The number of jobs handed to a worker at a" +
+                             " time for --batch.")
+    parser.add_argument("--compression", default="none",
+                        choices=["auto"] + sorted(Compressor.METHODS),
+                        help="Compress the message before encoding it." +
+                             " auto picks the best method per message.")
+    parser.add_argument("--scatter", action="store_true",
+                        help="Spread the message over the whole image in a" +
+                             " pseudo-random order.")
+    parser.add_argument("--scatterkey",
+                        help="A secret that decides the scatter order. Implies" +
+                             " --scatter and is needed again to decode.")
+    parser.add_argument("--fec", type=int, default=0,
+                        help="Add this many Reed-Solomon parity bytes per 255" +
+                             " byte codeword so damaged bits can be repaired" +
+                             " when decoding.")
+    parser.add_argument("--cache", action="store_true",
+                        help="Decode each input image only once per worker" +
+                             " for --batch runs that reuse the same images.")
+    parser.add_argument("--peek", action="store_true",
+                        help="Print the message length stored in the input" +
+                             " image without decoding the whole image.")
+    parser.add_argument("--comparefiles", "-c", nargs=2,
+                        metavar=("ORIGINAL", "ENCODED"),
+                        help="Report how two images differ.")
+    parser.add_argument("--heatmap",
+                        help="Save a heatmap of the differences found by" +
+                             " --comparefiles to this PNG.")
     args = parser.parse_args()
 
     steg = None
@@ -737,6 +1739,76 @@ if __name__ == "__main__":
                                        args.modulus)
         else:
             CryptoHelper.generate_keys(args.generate, args.passphrase)
+    elif args.batch:
+        if args.encode == args.decode:
+            print("--batch requires exactly one of --encode or --decode.")
+            exit(1)
+        crypto_args = {}
+        if args.crypto:
+            if not args.encryptionkey or not args.signingkey or not args.passphrase:
+                parser.print_help()
+                exit(1)
+            crypto_args = {"recipientPublicKeyFileName": args.encryptionkey,
+                           "sendersKeyPairFileName": args.signingkey,
+                           "passphrase": args.passphrase}
+        try:
+            runner = BatchRunner(workers=args.workers, chunk_size=args.chunksize,
+                                 depth=args.depth, layout=args.layout,
+                                 outputFormat=args.format,
+                                 compressLevel=args.compresslevel,
+                                 optimize=args.optimize,
+                                 compression=args.compression,
+                                 scatter=args.scatter,
+                                 scatterKey=args.scatterkey,
+                                 fec=args.fec,
+                                 carrierCache=args.cache, **crypto_args)
+        except KeyError as e:
+            print(e)
+            exit(1)
+        try:
+            results = runner.run_manifest(args.batch, decode=args.decode)
+        except (IOError, ValueError) as e:
+            print("The following error was encountered reading the manifest: ")
+            print(e)
+            exit(1)
+        failed = [result for result in results if not result["ok"]]
+        for result in failed:
+            print("Job " + str(result["index"]) + " (" + result["input"] +
+                  ") failed: " + result["error"])
+        print(str(len(results) - len(failed)) + " of " + str(len(results)) +
+              " jobs completed successfully.")
+        if failed:
+            exit(1)
+    elif args.carriers:
+        if args.encode == args.decode or args.crypto:
+            print("--carriers requires exactly one of --encode or --decode" +
+                  " and doesn't support --crypto.")
+            exit(1)
+        try:
+            sharded = ShardedCarrier(workers=args.workers,
+                                     inputFiles=args.carriers,
+                                     outputFiles=args.outputcarriers or [],
+                                     depth=args.depth, layout=args.layout,
+                                     outputFormat=args.format,
+                                     compressLevel=args.compresslevel,
+                                     optimize=args.optimize,
+                                     compression=args.compression,
+                                     scatter=args.scatter,
+                                     scatterKey=args.scatterkey,
+                                     fec=args.fec)
+            if args.encode and args.inputfile:
+                sharded.encode_message_from_file(args.inputfile)
+            elif args.encode:
+                sharded.encode_message(args.message or "")
+            elif args.outputfile:
+                sharded.decode_message_to_file(args.outputfile)
+            else:
+                print("Message:\n")
+                print(sharded.decode_message())
+        except (IOError, ValueError) as e:
+            print("The following error was encountered: ")
+            print(e)
+            exit(1)
     elif args.encode:
         if args.crypto:
             if (not args.inputimage or not args.outputimage or not (args.message or args.inputfile) or not
@@ -744,10 +1816,19 @@ if __name__ == "__main__":
                 try:
                     steg = Encryptedsteganographer(inputFile=args.inputimage,
                                                    outputfile=args.outputimage,
+                                                   depth=args.depth,
+                                                   layout=args.layout,
+                                                   outputFormat=args.format,
+                                                   compressLevel=args.compresslevel,
+                                                   optimize=args.optimize,
+                                                   compression=args.compression,
+                                                   scatter=args.scatter,
+                                                   scatterKey=args.scatterkey,
+                                                   fec=args.fec,
                                                    recipientPublicKeyFileName=args.encryptionkey,
                                                    sendersKeyPairFileName=args.signingkey,
                                                    passphrase=args.passphrase)
-                except KeyError as e:
+                except (KeyError, ValueError) as e:
                     print("The following error has occured: ")
                     print(e)
                     exit(1)
@@ -768,8 +1849,17 @@ if __name__ == "__main__":
                 or not (args.message or args.inputfile)):
                 try:
                     steg = steganographer(inputFile=args.inputimage,
-                                          outputFile=args.outputimage)
-                except KeyError as e:
+                                          outputFile=args.outputimage,
+                                          depth=args.depth,
+                                          layout=args.layout,
+                                          outputFormat=args.format,
+                                          compressLevel=args.compresslevel,
+                                          optimize=args.optimize,
+                                          compression=args.compression,
+                                          scatter=args.scatter,
+                                          scatterKey=args.scatterkey,
+                                          fec=args.fec)
+                except (KeyError, ValueError) as e:
                     print("The following error occured: ")
                     print(e)
                     exit(1)
@@ -790,6 +1880,7 @@ if __name__ == "__main__":
             args.signingkey or not args.passphrase):
                 try:
                     steg = Encryptedsteganographer(inputFile=args.inputimage,
+                                                   scatterKey=args.scatterkey,
                                                    recipientPublicKeyFileName=args.encryptionkey,
                                                    sendersKeyPairFileName=args.signingkey,
                                                    passphrase=args.passphrase)
@@ -817,7 +1908,8 @@ if __name__ == "__main__":
         else:
             if not args.inputimage or not args.outputimage:
                 try:
-                    steg = steganographer(inputFile=args.inputimage)
+                    steg = steganographer(inputFile=args.inputimage,
+                                          scatterKey=args.scatterkey)
                 except KeyError as e:
                     print("The following error has occured: ")
                     print(e)
@@ -839,18 +1931,31 @@ if __name__ == "__main__":
             else:
                 args.print_help()
                 exit(1)
+    elif args.comparefiles:
+        try:
+            report = steganographer.diff_images(args.comparefiles[0],
+                                                args.comparefiles[1], args.heatmap)
+        except (IOError, ValueError) as e:
+            print("The following error was encountered: ")
+            print(e)
+            exit(1)
+        for key in sorted(report):
+            print(key + ": " + str(report[key]))
+    elif args.peek:
+        if not args.inputimage:
+            parser.print_help()
+            exit(1)
+        try:
+            header = steganographer(inputFile=args.inputimage).peek_header()
+        except (IOError, ValueError) as e:
+            print("The following error was encountered: ")
+            print(e)
+            exit(1)
+        for key in sorted(header):
+            print(key + ": " + str(header[key]))
     else:
         parser.print_help()
         exit(1)
 
     # Things went better than expected
     exit(0)
-
-"""
-This Exception is used in the code to break out of nested loops easily. I don't know if this is really considered
-good design but it sure simplifies the code in my opinion.
-"""
-
-
-class LoopComplete(Exception):
-    pass
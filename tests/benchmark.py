@@ -0,0 +1,83 @@
+import sys
+import time
+sys.path.append("..")
+import numpy
+from steganographer import *
+from engine import LSBEngine
+from bitcodec import BitCodec
+
+# Benchmark the vectorized LSB engine against the per bit loop that
+# encode_message used to run. Run it from the tests directory like test.py.
+pt_message = open("test_message.txt", "r").read()
+image_sizes = [(640, 480), (1920, 1080), (4000, 3000)]
+color_size = 3
+
+
+def legacy_embed(image_data, bit_sequence, color_size):
+    """The original nested loop encoder, kept here as a reference."""
+
+    height, width = image_data.shape[:2]
+    bit_index = 0
+    for column in range(0, width):
+        for row in range(0, height):
+            for color in range(0, color_size):
+                if bit_index >= len(bit_sequence):
+                    return
+                image_data[row][column][color] = steganographer.set_bit(
+                    int(image_data[row][column][color]), 0,
+                    bit_sequence[bit_index])
+                bit_index += 1
+
+
+def timed(function, *args):
+    start = time.time()
+    function(*args)
+    return time.time() - start
+
+
+bit_sequence = BitCodec.frame(pt_message)
+bit_sequence = numpy.concatenate(
+    (bit_sequence, numpy.zeros(color_size - len(bit_sequence) % color_size,
+                               dtype=numpy.uint8)))
+
+for size in image_sizes:
+    pristine = numpy.random.randint(0, 256, (size[1], size[0], 3)).astype(numpy.uint8)
+    legacy_data = numpy.copy(pristine)
+    engine_data = numpy.copy(pristine)
+
+    legacy_time = timed(legacy_embed, legacy_data, bit_sequence, color_size)
+    engine_time = timed(LSBEngine.embed, engine_data, bit_sequence, color_size)
+
+    if not numpy.array_equal(legacy_data, engine_data):
+        print("The engine produced different pixels than the legacy loop on a "
+              + str(size[0]) + "x" + str(size[1]) + " image.")
+        exit(1)
+
+    print(str(size[0]) + "x" + str(size[1]) + ": " + str(len(bit_sequence)) +
+          " bits legacy " + "%.4f" % legacy_time + "s engine " +
+          "%.4f" % engine_time + "s (" + "%.1f" % (legacy_time / engine_time) +
+          "x faster)")
+
+# Encode time against output size for each of the output settings so the
+# tradeoff can be picked per pipeline.
+output_settings = [("PNG", 0, False), ("PNG", 1, False), ("PNG", 6, False),
+                   ("PNG", 9, True), ("TIFF", 0, False), ("TIFF", 6, False),
+                   ("WEBP", 0, False), ("WEBP", 6, False), ("BMP", 0, False)]
+
+for output_format, compress_level, optimize in output_settings:
+    steg = steganographer(inputFile="test_input_picture.jpg",
+                          outputFormat=output_format,
+                          compressLevel=compress_level, optimize=optimize)
+    steg.initialize_image_data()
+    start = time.time()
+    encoded = steg.encode_message_to_bytes(pt_message)
+    encode_time = time.time() - start
+
+    if steganographer(inputFile=encoded).decode_message() != pt_message:
+        print(output_format + " level " + str(compress_level) +
+              " did not decode back to the original message.")
+        exit(1)
+
+    print(output_format + " level " + str(compress_level) +
+          (" optimized" if optimize else "") + ": " + "%.4f" % encode_time +
+          "s " + str(len(encoded) // 1024) + " KiB")
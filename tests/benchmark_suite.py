@@ -0,0 +1,320 @@
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+sys.path.append("..")
+import numpy
+from PIL import Image
+import steganographer as steganographer_module
+from steganographer import *
+from message import CryptoHelper
+from message import Message
+from fec import ReedSolomon
+
+# The benchmark suite for the hot paths. Every benchmark runs across a matrix
+# of image sizes, payload sizes and color modes and the timings are stored as
+# JSON so runs from different releases can be compared. Run it from the tests
+# directory like test.py:
+#
+#   python benchmark_suite.py --quick
+#   python benchmark_suite.py --compare benchmark_results/0.6.json
+#
+# benchmark.py is the quick sanity check of the engine against the original
+# loop. This is the one to run before a release.
+
+megapixels = [0.1, 1, 12, 50]
+quick_megapixels = [0.1, 1]
+payload_sizes = [64, 64 << 10, 1 << 20]
+fec_parities = [0, 8, 16, 32, 64]
+color_modes = ["RGB", "RGBA", "CMYK"]
+output_settings = [("PNG", 0), ("PNG", 6), ("TIFF", 0), ("BMP", 0)]
+
+key_file = "benchmark_key.pem"
+pubkey_file = "benchmark_key_publiconly.pem"
+key_passphrase = "benchmark"
+
+
+class UnsavedSteganographer(steganographer):
+    """A steganographer that skips saving so only the encoding is timed."""
+
+    def save_output_image(self):
+        pass
+
+
+def make_image(mode, pixels, seed=0):
+    """Return a random, roughly square PIL image with the given pixel count."""
+
+    width = int(pixels ** 0.5)
+    height = max(1, int(pixels // width))
+    channels = len(mode)
+    data = numpy.random.RandomState(seed).randint(
+        0, 256, (height, width, channels)).astype(numpy.uint8)
+    return Image.fromarray(data, mode)
+
+
+def make_payload(size):
+    """Return a repeatable payload of printable text."""
+
+    text = open("test_message.txt", "r").read()
+    return (text * (size // len(text) + 1))[:size]
+
+
+def measure(function, repeat, setup=None):
+    """
+    Time function repeat times and return a dictionary of the best, median
+    and mean seconds. setup runs before every call and is not timed; its
+    result is passed to function.
+    """
+
+    times = []
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        start = time.perf_counter()
+        if setup is not None:
+            function(argument)
+        else:
+            function()
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "median": statistics.median(times),
+            "mean": statistics.mean(times), "repeat": repeat}
+
+
+def record(results, name, params, timing):
+    """Store a result and print it as it comes in."""
+
+    results.append(dict({"name": name, "params": params}, **timing))
+    print(name + " " + " ".join(key + "=" + str(params[key]) for key in sorted(params))
+          + ": " + "%.6f" % timing["min"] + "s")
+
+
+def bench_image_paths(results, sizes, repeat):
+    """encode_message, decode_message and save_output_image."""
+
+    for size in sizes:
+        for mode in color_modes:
+            image = make_image(mode, int(size * 1000000))
+            capacity = image.size[0] * image.size[1] * steganographer.COLOR_SIZES[mode] // 8
+            for payload_size in payload_sizes:
+                if payload_size > capacity * 0.9:
+                    continue
+                payload = make_payload(payload_size)
+                params = {"megapixels": size, "mode": mode, "payload": payload_size}
+
+                def new_encoder():
+                    steg = UnsavedSteganographer(inputFile=image, outputFile=io.BytesIO())
+                    steg.initialize_image_data()
+                    return steg
+                record(results, "encode_message", params,
+                       measure(lambda steg: steg.encode_message(payload), repeat,
+                               new_encoder))
+
+                encoded = steganographer(inputFile=image, outputFile=io.BytesIO(),
+                                         outputFormat="TIFF").encode_message_to_bytes(payload)
+
+                def new_decoder():
+                    steg = steganographer(inputFile=encoded)
+                    steg.initialize_image_data()
+                    return steg
+                record(results, "decode_message", params,
+                       measure(lambda steg: steg.decode_message(), repeat, new_decoder))
+
+            # Saving doesn't depend on the payload so it only runs once per image.
+            for output_format, compress_level in output_settings:
+                if mode not in steganographer.OUTPUT_MODES[output_format]:
+                    continue
+                steg = steganographer(inputFile=image, outputFile=io.BytesIO(),
+                                      outputFormat=output_format,
+                                      compressLevel=compress_level)
+                steg.initialize_image_data()
+
+                def save():
+                    steg._output_file = io.BytesIO()
+                    steg.save_output_image()
+                record(results, "save_output_image",
+                       {"megapixels": size, "mode": mode, "format": output_format,
+                        "compress_level": compress_level},
+                       measure(save, repeat))
+
+
+def bench_bit_lists(results, repeat):
+    """The bin list helpers."""
+
+    for payload_size in payload_sizes:
+        payload = make_payload(payload_size)
+        bits = steganographer.message_to_bin_list(payload)
+        params = {"payload": payload_size}
+        record(results, "message_to_bin_list", params,
+               measure(lambda: steganographer.message_to_bin_list(payload), repeat))
+        record(results, "bin_list_to_message", params,
+               measure(lambda: steganographer.bin_list_to_message(bits), repeat))
+
+
+def bench_crypto(results, repeat):
+    """CryptoHelper.encrypt_message and decrypt_message."""
+
+    if not os.path.exists(key_file):
+        CryptoHelper.generate_keys(key_file, key_passphrase)
+
+    for payload_size in payload_sizes:
+        payload = make_payload(payload_size).encode("latin-1")
+        params = {"payload": payload_size}
+        record(results, "encrypt_message", params,
+               measure(lambda: CryptoHelper.encrypt_message(
+                   payload, pubkey_file, key_file, key_passphrase), repeat))
+        envelope = CryptoHelper.encrypt_message(payload, pubkey_file, key_file,
+                                                key_passphrase).dump_message()
+        record(results, "decrypt_message", params,
+               measure(lambda: CryptoHelper.decrypt_message(
+                   Message.load_message(envelope), key_file, key_passphrase), repeat))
+
+
+def damage_codewords(data, length, parity):
+    """
+    Return an encoded message with half the parity of every codeword
+    damaged, the most ReedSolomon can repair. Stripes are stored a byte of
+    each codeword at a time, so damaging the first bytes of every stripe
+    damages every codeword evenly.
+    """
+
+    damaged = numpy.frombuffer(data, dtype=numpy.uint8).copy()
+    stripe_data, stripe_encoded = ReedSolomon.stripe_size(parity)
+    full, tail = divmod(length, stripe_data)
+    for stripe in range(full):
+        offset = stripe * stripe_encoded
+        damaged[offset:offset + parity // 2 * ReedSolomon.STRIPE_CODEWORDS] ^= 0x5A
+    if tail:
+        codewords = -(-tail // (255 - parity))
+        offset = full * stripe_encoded
+        damaged[offset:offset + parity // 2 * codewords] ^= 0x5A
+    return damaged
+
+
+def bench_fec(results, repeat):
+    """
+    ReedSolomon.encode and decode at each redundancy level, the decode both
+    of an undamaged message and of one with as much damage as it can repair,
+    and encode_message and decode_message with the fec option. Parity 0 is
+    the image path without FEC to compare against.
+    """
+
+    image = make_image("RGB", 4000000)
+    capacity = image.size[0] * image.size[1] * 3 // 8
+    for payload_size in payload_sizes:
+        payload = make_payload(payload_size)
+        data = payload.encode("latin-1")
+        for parity in fec_parities:
+            if parity and ReedSolomon.encoded_length(payload_size, parity) > capacity * 0.9:
+                continue
+            params = {"payload": payload_size, "parity": parity}
+
+            def new_encoder():
+                steg = UnsavedSteganographer(inputFile=image, outputFile=io.BytesIO(),
+                                             fec=parity)
+                steg.initialize_image_data()
+                return steg
+            record(results, "encode_message fec", params,
+                   measure(lambda steg: steg.encode_message(payload), repeat,
+                           new_encoder))
+
+            encoded = steganographer(inputFile=image, outputFile=io.BytesIO(),
+                                     outputFormat="TIFF",
+                                     fec=parity).encode_message_to_bytes(payload)
+
+            def new_decoder():
+                steg = steganographer(inputFile=encoded)
+                steg.initialize_image_data()
+                return steg
+            record(results, "decode_message fec", params,
+                   measure(lambda steg: steg.decode_message(), repeat, new_decoder))
+
+            if not parity:
+                continue
+            record(results, "ReedSolomon.encode", params,
+                   measure(lambda: ReedSolomon.encode(data, parity), repeat))
+            protected = ReedSolomon.encode(data, parity)
+            record(results, "ReedSolomon.decode", params,
+                   measure(lambda: ReedSolomon.decode(protected, payload_size, parity),
+                           repeat))
+            damaged = damage_codewords(protected, payload_size, parity)
+            record(results, "ReedSolomon.decode damaged", params,
+                   measure(lambda: ReedSolomon.decode(damaged, payload_size, parity),
+                           repeat))
+
+
+def result_key(result):
+    """Return the key results are matched on between runs."""
+
+    return result["name"] + json.dumps(result["params"], sort_keys=True)
+
+
+def compare(results, baseline_file, threshold):
+    """
+    Print how every result changed against a stored run and return the
+    number that got slower by more than threshold.
+    """
+
+    with open(baseline_file, "r") as fd:
+        baseline = json.load(fd)
+    previous = dict((result_key(result), result) for result in baseline["results"])
+
+    regressions = 0
+    print("\nCompared with " + baseline_file + " (" + baseline["version"] + "):")
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        ratio = result["min"] / old["min"]
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(result["name"] + " " + json.dumps(result["params"], sort_keys=True) +
+              ": " + "%.2f" % ratio + "x" + flag)
+    return regressions
+
+
+parser = argparse.ArgumentParser(description="Benchmark the steganographer hot paths.")
+parser.add_argument("--quick", action="store_true",
+                    help="Only run the " + ", ".join(map(str, quick_megapixels)) +
+                         " megapixel images.")
+parser.add_argument("--megapixels", type=float, nargs="+",
+                    help="The image sizes to run, in megapixels.")
+parser.add_argument("--repeat", type=int, default=3,
+                    help="How many times to run each benchmark. The best time is kept.")
+parser.add_argument("--output",
+                    help="Where to store the results. Defaults to" +
+                         " benchmark_results/<version>.json.")
+parser.add_argument("--compare",
+                    help="A stored results file to compare this run against.")
+parser.add_argument("--threshold", type=float, default=1.2,
+                    help="How many times slower a result has to be to count" +
+                         " as a regression.")
+args = parser.parse_args()
+
+sizes = args.megapixels or (quick_megapixels if args.quick else megapixels)
+results = []
+bench_image_paths(results, sizes, args.repeat)
+bench_bit_lists(results, args.repeat)
+bench_crypto(results, args.repeat)
+bench_fec(results, args.repeat)
+
+output = args.output or os.path.join("benchmark_results",
+                                     steganographer_module.__version__ + ".json")
+if os.path.dirname(output) and not os.path.isdir(os.path.dirname(output)):
+    os.makedirs(os.path.dirname(output))
+with open(output, "w") as fd:
+    json.dump({"version": steganographer_module.__version__,
+               "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "python": platform.python_version(),
+               "numpy": numpy.__version__,
+               "machine": platform.machine(),
+               "processor": platform.processor(),
+               "results": results}, fd, indent=1)
+print("\nResults saved to " + output)
+
+if args.compare and compare(results, args.compare, args.threshold):
+    exit(1)
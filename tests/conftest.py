@@ -0,0 +1,44 @@
+import os
+import sys
+
+import numpy
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def random_pixels(height, width, channels=3, seed=0):
+    """Return repeatable random (height, width, channels) uint8 pixels."""
+
+    return numpy.random.RandomState(seed).randint(
+        0, 256, (height, width, channels)).astype(numpy.uint8)
+
+
+@pytest.fixture
+def carrier(tmp_path):
+    """Return the filename of a random 120x160 RGB PNG carrier."""
+
+    filename = str(tmp_path / "carrier.png")
+    Image.fromarray(random_pixels(120, 160)).save(filename)
+    return filename
+
+
+@pytest.fixture(scope="session")
+def keys(tmp_path_factory):
+    """
+    Return a dictionary of the filenames of two small key pairs, "alice" and
+    "bob", and their public keys, "alice_public" and "bob_public". The
+    passphrase is "passphrase".
+    """
+
+    from message import CryptoHelper
+
+    directory = tmp_path_factory.mktemp("keys")
+    filenames = {}
+    for name in ("alice", "bob"):
+        filename = str(directory / (name + ".pem"))
+        CryptoHelper.generate_keys(filename, "passphrase", 1024)
+        filenames[name] = filename
+        filenames[name + "_public"] = str(directory / (name + "_publiconly.pem"))
+    return filenames
@@ -0,0 +1,65 @@
+import pytest
+
+from batch import BatchRunner
+
+
+def write_jobs(tmp_path, carrier, count):
+    jobs = []
+    for index in range(count):
+        message = tmp_path / ("message" + str(index) + ".txt")
+        message.write_bytes(b"batch message " + str(index).encode())
+        jobs.append((carrier, str(message), str(tmp_path / ("encoded" + str(index) + ".png"))))
+    return jobs
+
+
+def test_one_failing_job_does_not_stop_the_batch(tmp_path, carrier):
+    jobs = write_jobs(tmp_path, carrier, 3)
+    jobs[1] = (str(tmp_path / "missing.png"),) + jobs[1][1:]
+    results = BatchRunner(workers=2, chunk_size=1, depth=2).run(jobs)
+
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert [result["ok"] for result in results] == [True, False, True]
+    assert results[1]["error"]
+    assert results[0]["error"] == "" and results[0]["seconds"] >= 0
+
+    decode_jobs = [(output, str(tmp_path / ("decoded" + str(index) + ".txt")), "")
+                   for index, (_, _, output) in enumerate(jobs)]
+    results = BatchRunner(workers=2).run(decode_jobs, decode=True)
+    assert [result["ok"] for result in results] == [True, False, True]
+    for index in (0, 2):
+        assert (tmp_path / ("decoded" + str(index) + ".txt")).read_bytes() == \
+            b"batch message " + str(index).encode()
+
+
+def test_manifest(tmp_path, carrier):
+    jobs = write_jobs(tmp_path, carrier, 2)
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text("# input, message, output\n\n" +
+                        "\n".join(", ".join(job) for job in jobs) + "\n")
+
+    assert BatchRunner.read_manifest(str(manifest)) == jobs
+    assert all(result["ok"] for result in BatchRunner(workers=1).run_manifest(str(manifest)))
+
+    manifest.write_text(carrier + "\n")
+    with pytest.raises(ValueError):
+        BatchRunner.read_manifest(str(manifest))
+
+
+def test_encrypted_batch(tmp_path, carrier, keys):
+    jobs = write_jobs(tmp_path, carrier, 2)
+    results = BatchRunner(workers=2, recipientPublicKeyFileName=keys["bob_public"],
+                          sendersKeyPairFileName=keys["alice"],
+                          passphrase="passphrase").run(jobs)
+    assert all(result["ok"] for result in results)
+
+    decoded = str(tmp_path / "decoded.txt")
+    results = BatchRunner(workers=1, recipientPublicKeyFileName=keys["alice_public"],
+                          sendersKeyPairFileName=keys["bob"],
+                          passphrase="passphrase").run([(jobs[0][2], decoded, "")], decode=True)
+    assert results[0]["ok"], results[0]["error"]
+    assert open(decoded, "rb").read() == b"batch message 0"
+
+
+def test_crypto_arguments_come_together():
+    with pytest.raises(KeyError):
+        BatchRunner(passphrase="passphrase")
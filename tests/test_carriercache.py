@@ -0,0 +1,91 @@
+import io
+
+import numpy
+import pytest
+from PIL import Image
+
+from carriercache import CarrierCache
+from conftest import random_pixels
+from steganographer import steganographer
+
+
+def test_load_hands_out_the_cached_pixels(carrier):
+    cache = CarrierCache()
+    first, mode, size = cache.load(carrier)
+    second = cache.load(carrier)[0]
+
+    assert (mode, size) == ("RGB", (160, 120))
+    assert numpy.array_equal(first, random_pixels(120, 160))
+    assert numpy.shares_memory(first, second)
+    assert cache.nbytes() == first.nbytes
+    assert (cache.hits, cache.misses) == (1, 1)
+    with pytest.raises(ValueError):
+        first[0, 0, 0] = 1
+    with pytest.raises(ValueError):
+        first.flags.writeable = True
+
+
+def test_encoding_leaves_the_cache_untouched(carrier):
+    cache = CarrierCache()
+    outputs = []
+    for message in (b"first message", b"second message"):
+        outputs.append(steganographer(inputFile=carrier, outputFile=io.BytesIO(),
+                                      carrierCache=cache).encode_message_to_bytes(message))
+
+    assert numpy.array_equal(cache.load(carrier)[0], random_pixels(120, 160))
+    assert len(cache) == 1 and cache.hits >= 1
+    assert steganographer(inputFile=outputs[0]).decode_message_bytes() == b"first message"
+    assert steganographer(inputFile=outputs[1]).decode_message_bytes() == b"second message"
+
+
+def test_decoding_through_the_cache(tmp_path, carrier):
+    encoded = str(tmp_path / "encoded.png")
+    with open(encoded, "wb") as fd:
+        fd.write(steganographer(inputFile=carrier, outputFile=io.BytesIO())
+                 .encode_message_to_bytes(b"cached"))
+    cache = CarrierCache()
+
+    for _ in range(2):
+        assert steganographer(inputFile=encoded,
+                              carrierCache=cache).decode_message_bytes() == b"cached"
+
+
+def test_changed_file_is_decoded_again(tmp_path):
+    filename = str(tmp_path / "carrier.png")
+    cache = CarrierCache()
+    Image.fromarray(random_pixels(20, 30)).save(filename)
+    cache.load(filename)
+    Image.fromarray(random_pixels(20, 30, seed=1)).save(filename)
+
+    assert numpy.array_equal(cache.load(filename)[0], random_pixels(20, 30, seed=1))
+    assert len(cache) == 1
+
+
+def test_cache_hits_never_open_the_image(carrier, monkeypatch):
+    cache = CarrierCache()
+    steganographer(inputFile=carrier, outputFile=io.BytesIO(),
+                   carrierCache=cache).encode_message_to_bytes(b"warm up")
+    opened = []
+    original = Image.open
+
+    def record(*args, **kwargs):
+        opened.append(args)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(Image, "open", record)
+    encoded = steganographer(inputFile=carrier, outputFile=io.BytesIO(),
+                             carrierCache=cache).encode_message_to_bytes(b"cached")
+
+    assert opened == []
+    assert cache.hits == 1
+    assert steganographer(inputFile=encoded).decode_message_bytes() == b"cached"
+
+
+def test_mappable_carriers_skip_the_cache(tmp_path):
+    filename = str(tmp_path / "carrier.bmp")
+    Image.fromarray(random_pixels(20, 30)).save(filename)
+    cache = CarrierCache()
+    steganographer(inputFile=filename, outputFile=io.BytesIO(),
+                   carrierCache=cache).encode_message_to_bytes(b"mapped")
+
+    assert len(cache) == 0
@@ -0,0 +1,85 @@
+import io
+import os
+
+import pytest
+
+from compression import Compressor
+from steganographer import steganographer
+
+
+TEXT = b"The quick brown fox jumps over the lazy dog. " * 200
+
+
+@pytest.mark.parametrize("method", ["zlib", "bz2", "lzma"])
+def test_round_trip(method):
+    code, compressed = Compressor.compress(TEXT, method)
+
+    assert code == Compressor.METHODS[method]
+    assert len(compressed) < len(TEXT)
+    assert Compressor.decompress(code, compressed) == TEXT
+    chunks = [compressed[i:i + 7] for i in range(0, len(compressed), 7)]
+    assert b"".join(Compressor.decompress_chunks(code, chunks)) == TEXT
+
+
+def test_auto_skips_incompressible_messages():
+    noise = os.urandom(4096)
+
+    assert Compressor.compress(noise, "auto") == (Compressor.NONE, noise)
+    assert Compressor.compress(b"short", "auto") == (Compressor.NONE, b"short")
+    code, fd, length = Compressor.compress_file(io.BytesIO(noise), "auto", 1000)
+    assert (code, length) == (Compressor.NONE, len(noise))
+    assert fd.read() == noise
+
+
+def test_auto_compresses_redundant_messages():
+    code, compressed = Compressor.compress(TEXT, "auto")
+
+    assert code != Compressor.NONE
+    assert Compressor.decompress(code, compressed) == TEXT
+
+
+def test_compress_file():
+    code, fd, length = Compressor.compress_file(io.BytesIO(TEXT), "zlib", 1000)
+
+    assert code == Compressor.ZLIB and length < len(TEXT)
+    assert Compressor.decompress(code, fd.read()) == TEXT
+
+
+def test_bad_input():
+    with pytest.raises(ValueError):
+        Compressor.code("gzip")
+    with pytest.raises(ValueError):
+        steganographer(compression="gzip")
+    with pytest.raises(ValueError):
+        Compressor.decompress(7, b"data")
+    with pytest.raises(ValueError):
+        Compressor.decompress(Compressor.ZLIB, b"not zlib data")
+    code, compressed = Compressor.compress(TEXT, "lzma")
+    with pytest.raises(ValueError):
+        Compressor.decompress(code, compressed[:len(compressed) // 2])
+
+
+@pytest.mark.parametrize("method, message, compressed", [
+    ("zlib", TEXT, True),
+    ("auto", TEXT, True),
+    ("auto", os.urandom(4096), False)])
+def test_steganographer_round_trip(carrier, tmp_path, method, message, compressed):
+    output = str(tmp_path / "encoded.png")
+    steganographer(inputFile=carrier, outputFile=output, depth=2,
+                   compression=method).encode_message(message.decode("latin-1"))
+
+    steg = steganographer(inputFile=output)
+    assert (steg._read_header().compression() != Compressor.NONE) == compressed
+    assert steganographer(inputFile=output).decode_message_bytes() == message
+
+
+def test_steganographer_file_round_trip(carrier, tmp_path):
+    message = tmp_path / "message.txt"
+    message.write_bytes(TEXT)
+    output = str(tmp_path / "encoded.png")
+    steganographer(inputFile=carrier, outputFile=output, depth=2,
+                   compression="bz2").encode_message_from_file(str(message))
+
+    decoded = tmp_path / "decoded.txt"
+    steganographer(inputFile=output).decode_message_to_file(str(decoded))
+    assert decoded.read_bytes() == TEXT
@@ -0,0 +1,195 @@
+import os
+
+import numpy
+import pytest
+from PIL import Image
+
+from message import CryptoHelper
+from message import Message
+from steganographer import Encryptedsteganographer
+
+
+def encrypt(keys, message, fingerprint_only=False):
+    return CryptoHelper.encrypt_message(message, keys["bob_public"], keys["alice"],
+                                        "passphrase", fingerprint_only)
+
+
+def test_envelope_round_trip(keys):
+    envelope = encrypt(keys, b"attack at dawn").dump_message()
+
+    assert CryptoHelper.decrypt_message(Message.load_message(envelope), keys["bob"],
+                                        "passphrase") == b"attack at dawn"
+
+
+def test_signature_and_wrapped_key_sizes(keys):
+    message = encrypt(keys, b"sizes")
+    public_key, symmetric_key, signature, ciphertext = message.get_message()
+    key = CryptoHelper.import_keys(keys["alice"], "passphrase")
+
+    assert len(signature) == CryptoHelper.signature_size(key) == key.size_in_bytes()
+    assert len(symmetric_key) == 128
+    assert len(ciphertext) == len(b"sizes") + CryptoHelper.STREAM_OVERHEAD
+
+
+def test_loaded_message_decrypts_from_its_own_buffer(keys):
+    envelope = bytearray(encrypt(keys, b"no copies").dump_message())
+    message = Message.load_message(envelope)
+
+    assert message.envelope().obj is envelope
+    assert CryptoHelper.decrypt_message(message, keys["bob"], "passphrase") == b"no copies"
+
+
+def test_wrong_recipient_fails(keys):
+    message = encrypt(keys, b"for bob only")
+
+    with pytest.raises(ValueError):
+        CryptoHelper.decrypt_message(message, keys["alice"], "passphrase")
+
+
+def test_stream_round_trip_in_chunks(keys):
+    plaintext = os.urandom(100001)
+    length, envelope = CryptoHelper.encrypt_message_stream(
+        (plaintext[i:i + 777] for i in range(0, len(plaintext), 777)), len(plaintext),
+        keys["bob_public"], keys["alice"], "passphrase")
+    envelope = b"".join(envelope)
+    assert len(envelope) == length
+
+    chunks = (envelope[i:i + 1000] for i in range(0, len(envelope), 1000))
+    assert b"".join(CryptoHelper.decrypt_message_stream(
+        chunks, keys["bob"], "passphrase")) == plaintext
+
+
+def test_fingerprint_only_needs_the_senders_key(keys):
+    message = encrypt(keys, b"short", fingerprint_only=True)
+
+    assert len(message.get_message()[0]) == 32
+    with pytest.raises(ValueError):
+        CryptoHelper.decrypt_message(message, keys["bob"], "passphrase")
+    with pytest.raises(ValueError):
+        CryptoHelper.decrypt_message(message, keys["bob"], "passphrase",
+                                     keys["bob_public"])
+    assert CryptoHelper.decrypt_message(message, keys["bob"], "passphrase",
+                                        keys["alice_public"]) == b"short"
+
+
+def test_encrypted_steganographer_round_trip(keys, carrier, tmp_path):
+    output = str(tmp_path / "encrypted.png")
+    Encryptedsteganographer(inputFile=carrier, outputFile=output,
+                            recipientPublicKeyFileName=keys["bob_public"],
+                            sendersKeyPairFileName=keys["alice"],
+                            passphrase="passphrase").encrypt_and_encode_message("hidden")
+
+    decoder = Encryptedsteganographer(inputFile=output,
+                                      recipientPublicKeyFileName=keys["alice_public"],
+                                      sendersKeyPairFileName=keys["bob"],
+                                      passphrase="passphrase")
+    assert decoder.decrypt_and_decode_message() == b"hidden"
+
+    decoder.decrypt_and_decode_message_to_file(str(tmp_path / "decoded.txt"))
+    assert (tmp_path / "decoded.txt").read_bytes() == b"hidden"
+
+
+def test_fingerprint_only_image_is_verified_with_the_senders_key(keys, carrier, tmp_path):
+    output = str(tmp_path / "fingerprint.png")
+    Encryptedsteganographer(inputFile=carrier, outputFile=output, fingerprintOnly=True,
+                            recipientPublicKeyFileName=keys["bob_public"],
+                            sendersKeyPairFileName=keys["alice"],
+                            passphrase="passphrase").encrypt_and_encode_message("signed")
+
+    def decoder(**kwargs):
+        return Encryptedsteganographer(inputFile=output,
+                                       recipientPublicKeyFileName=keys["alice_public"],
+                                       sendersKeyPairFileName=keys["bob"],
+                                       passphrase="passphrase", **kwargs)
+
+    with pytest.raises(ValueError):
+        decoder().decrypt_and_decode_message()
+    with pytest.raises(ValueError):
+        decoder(senderPublicKeyFileName=keys["bob_public"]).decrypt_and_decode_message()
+    assert decoder(senderPublicKeyFileName=keys["alice_public"]) \
+        .decrypt_and_decode_message() == b"signed"
+
+
+def test_stream_round_trip_and_overhead():
+    key = os.urandom(32)
+    plaintext = os.urandom(5000)
+    stream = b"".join(CryptoHelper.stream_encrypt(
+        (plaintext[i:i + 333] for i in range(0, len(plaintext), 333)), key))
+
+    assert len(stream) == len(plaintext) + CryptoHelper.STREAM_OVERHEAD
+    assert b"".join(CryptoHelper.stream_decrypt([stream], key)) == plaintext
+
+
+@pytest.mark.parametrize("position", [0, CryptoHelper.NONCE_SIZE + 100, -1])
+def test_stream_detects_a_flipped_byte(position):
+    key = os.urandom(32)
+    stream = bytearray(b"".join(CryptoHelper.stream_encrypt([b"x" * 1000], key)))
+    stream[position] ^= 0x01
+
+    with pytest.raises(ValueError, match="authentication"):
+        b"".join(CryptoHelper.stream_decrypt([stream], key))
+
+
+def test_stream_detects_truncation():
+    key = os.urandom(32)
+    stream = b"".join(CryptoHelper.stream_encrypt([b"x" * 1000], key))
+
+    with pytest.raises(ValueError):
+        b"".join(CryptoHelper.stream_decrypt([stream[:-1]], key))
+    with pytest.raises(ValueError):
+        b"".join(CryptoHelper.stream_decrypt([stream[:CryptoHelper.NONCE_SIZE + 4]], key))
+
+
+def test_tampered_envelope_ciphertext_fails(keys):
+    envelope = bytearray(encrypt(keys, b"x" * 1000).dump_message())
+    # The ciphertext field is followed by the signature field.
+    envelope[-(CryptoHelper.signature_size(
+        CryptoHelper.import_keys(keys["alice"], "passphrase")) + 4 + 500)] ^= 0x80
+
+    with pytest.raises(ValueError):
+        CryptoHelper.decrypt_message(Message.load_message(envelope), keys["bob"],
+                                     "passphrase")
+
+
+def encode_file(keys, carrier, tmp_path, message, **options):
+    (tmp_path / "message.bin").write_bytes(message)
+    output = str(tmp_path / "encrypted.png")
+    Encryptedsteganographer(inputFile=carrier, outputFile=output,
+                            recipientPublicKeyFileName=keys["bob_public"],
+                            sendersKeyPairFileName=keys["alice"], passphrase="passphrase",
+                            **options).encrypt_and_encode_message_from_file(
+        str(tmp_path / "message.bin"))
+    return output
+
+
+def decoder(keys, image):
+    return Encryptedsteganographer(inputFile=image,
+                                   recipientPublicKeyFileName=keys["alice_public"],
+                                   sendersKeyPairFileName=keys["bob"],
+                                   passphrase="passphrase")
+
+
+def test_compressed_file_round_trip(keys, carrier, tmp_path):
+    message = b"compressible " * 400
+    output = encode_file(keys, carrier, tmp_path, message, compression="zlib")
+
+    decoder(keys, output).decrypt_and_decode_message_to_file(
+        str(tmp_path / "decoded.bin"), 1000)
+    assert (tmp_path / "decoded.bin").read_bytes() == message
+    assert not list(tmp_path.glob("*.part"))
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+def test_tampered_file_is_never_published(keys, carrier, tmp_path, compression):
+    output = encode_file(keys, carrier, tmp_path, os.urandom(3000),
+                         compression=compression)
+    pixels = numpy.array(Image.open(output))
+    pixels.reshape(-1)[20000] ^= 1
+    Image.fromarray(pixels).save(output)
+    (tmp_path / "decoded.bin").write_bytes(b"left alone")
+
+    with pytest.raises(ValueError):
+        decoder(keys, output).decrypt_and_decode_message_to_file(
+            str(tmp_path / "decoded.bin"), 1000)
+    assert (tmp_path / "decoded.bin").read_bytes() == b"left alone"
+    assert not list(tmp_path.glob("*.part"))
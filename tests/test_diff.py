@@ -0,0 +1,82 @@
+import io
+
+import numpy
+import pytest
+from PIL import Image
+
+from conftest import random_pixels
+from steganographer import steganographer
+
+
+@pytest.fixture
+def pair(tmp_path):
+    """Two PNGs that differ in the low bit of two channels and return their paths."""
+
+    pixels = random_pixels(40, 50)
+    changed = pixels.copy()
+    changed[3, 7, 0] ^= 1
+    changed[20, 30, 2] ^= 1
+    paths = []
+    for name, data in (("a.png", pixels), ("b.png", changed)):
+        Image.fromarray(data).save(str(tmp_path / name))
+        paths.append(str(tmp_path / name))
+    return paths
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    """Record every image Image.open returns."""
+
+    images = []
+    original = Image.open
+
+    def record(*args, **kwargs):
+        images.append(original(*args, **kwargs))
+        return images[-1]
+
+    monkeypatch.setattr(Image, "open", record)
+    return images
+
+
+def test_report(pair):
+    report = steganographer.diff_images(*pair)
+
+    assert report["size"] == (50, 40) and report["mode"] == "RGB"
+    assert report["changed_pixels"] == 2
+    assert report["changed_channels"] == [1, 0, 1]
+    assert report["lsb_flips"] == [1, 0, 1]
+    assert report["max_delta"] == 1
+    assert report["bbox"] == (7, 3, 31, 21)
+
+
+def test_diff_closes_what_it_opens(pair, opened):
+    steganographer.diff_images(*pair)
+
+    assert len(opened) == 2
+    assert all(image.fp is None for image in opened)
+
+
+def test_compare_opens_each_image_once(pair, opened):
+    report = steganographer.compare_pixels(*pair, pixels=4)
+
+    assert report["changed_pixels"] == 2
+    assert len(opened) == 2
+    assert all(image.fp is None for image in opened)
+
+
+def test_mismatched_images_are_closed(pair, opened, tmp_path):
+    Image.fromarray(random_pixels(10, 10)).save(str(tmp_path / "small.png"))
+
+    with pytest.raises(ValueError):
+        steganographer.diff_images(pair[0], str(tmp_path / "small.png"))
+    assert all(image.fp is None for image in opened)
+
+
+def test_caller_streams_are_left_open(pair):
+    with open(pair[0], "rb") as fd:
+        stream = io.BytesIO(fd.read())
+    image = Image.open(pair[1])
+
+    assert steganographer.compare_pixels(stream, image, pixels=1)["changed_pixels"] == 2
+    assert not stream.closed and stream.tell() == 0
+    assert numpy.asarray(image).shape == (40, 50, 3)
@@ -0,0 +1,180 @@
+import io
+import os
+
+import numpy
+import pytest
+from PIL import Image
+
+from conftest import random_pixels
+from fec import ReedSolomon
+from header import Header
+from steganographer import steganographer
+
+
+def damage(encoded, length, parity, errors):
+    """
+    Damage errors bytes of every codeword of an encoded message. A stripe
+    stores one byte of each of its codewords in turn, so the first errors
+    rounds of a stripe hit every codeword of it the same number of times.
+    """
+
+    damaged = numpy.frombuffer(encoded, dtype=numpy.uint8).copy()
+    stripe_data, stripe_encoded = ReedSolomon.stripe_size(parity)
+    full, tail = divmod(length, stripe_data)
+    for stripe in range(full):
+        start = stripe * stripe_encoded
+        damaged[start:start + errors * ReedSolomon.STRIPE_CODEWORDS] ^= 0xA5
+    if tail:
+        start = full * stripe_encoded
+        damaged[start:start + errors * -(-tail // (255 - parity))] ^= 0xA5
+    return damaged.tobytes()
+
+
+@pytest.mark.parametrize("parity", [1, 2, 16, 32, 128])
+@pytest.mark.parametrize("length", [0, 1, 200, 64 * 223, 64 * 223 + 1, 50000])
+def test_round_trip(parity, length):
+    data = os.urandom(length)
+    encoded = ReedSolomon.encode(data, parity)
+
+    assert len(encoded) == ReedSolomon.encoded_length(length, parity)
+    assert ReedSolomon.decode(encoded, length, parity) == data
+
+
+def test_chunked_matches_whole():
+    data = os.urandom(40000)
+    chunks = [data[i:i + 1234] for i in range(0, len(data), 1234)]
+    encoded = b"".join(ReedSolomon.encode_chunks(chunks, 20))
+
+    assert encoded == ReedSolomon.encode(data, 20)
+    pieces = [encoded[i:i + 999] for i in range(0, len(encoded), 999)]
+    assert b"".join(ReedSolomon.decode_chunks(pieces, len(data), 20)) == data
+
+
+@pytest.mark.parametrize("parity", [2, 8, 33, 64])
+@pytest.mark.parametrize("length", [100, 30000])
+def test_repairs_up_to_half_the_parity(parity, length):
+    data = os.urandom(length)
+    damaged = damage(ReedSolomon.encode(data, parity), length, parity, parity // 2)
+    stats = {}
+
+    assert ReedSolomon.decode(damaged, length, parity, stats) == data
+    assert stats["repaired"] > 0
+
+
+def test_repairs_random_bit_flips():
+    data = os.urandom(20000)
+    encoded = numpy.frombuffer(ReedSolomon.encode(data, 32), dtype=numpy.uint8).copy()
+    positions = numpy.random.RandomState(1).choice(len(encoded) * 8, 300, replace=False)
+    encoded[positions // 8] ^= (1 << (positions % 8)).astype(numpy.uint8)
+
+    assert ReedSolomon.decode(encoded.tobytes(), len(data), 32) == data
+
+
+def test_too_much_damage_fails_cleanly():
+    data = os.urandom(30000)
+    damaged = damage(ReedSolomon.encode(data, 16), len(data), 16, 12)
+
+    with pytest.raises(ValueError):
+        ReedSolomon.decode(damaged, len(data), 16)
+
+
+def test_wrong_length_and_parity_are_rejected():
+    encoded = ReedSolomon.encode(b"x" * 100, 8)
+
+    with pytest.raises(ValueError):
+        ReedSolomon.decode(encoded[:-1], 100, 8)
+    with pytest.raises(ValueError):
+        ReedSolomon.decode(encoded + b"\0", 100, 8)
+    for parity in (0, 129):
+        with pytest.raises(ValueError):
+            ReedSolomon.encode(b"x", parity)
+
+
+@pytest.mark.parametrize("parity", [1, 16, 100])
+def test_capacity_is_the_inverse_of_encoded_length(parity):
+    for space in (0, 10, 255, 16320, 16321, 100000):
+        length = ReedSolomon.capacity(space, parity)
+        assert ReedSolomon.encoded_length(length, parity) <= space
+        assert ReedSolomon.encoded_length(length + 1, parity) > space
+
+
+def flip_bits(image_bytes, count, rows=None, seed=0):
+    """Flip count random low bits of an encoded PNG, only in the first rows if given."""
+
+    pixels = numpy.array(Image.open(io.BytesIO(image_bytes)))
+    flat = pixels.reshape(-1)
+    limit = flat.size if rows is None else rows * pixels.shape[1] * pixels.shape[2]
+    flat[numpy.random.RandomState(seed).choice(limit, count, replace=False)] ^= 1
+    output = io.BytesIO()
+    Image.fromarray(pixels).save(output, "PNG")
+    return output.getvalue()
+
+
+def encode(message, **options):
+    carrier = Image.fromarray(random_pixels(150, 200))
+    return steganographer(inputFile=carrier, outputFile=io.BytesIO(),
+                          **options).encode_message_to_bytes(message)
+
+
+def test_image_round_trip_with_fec():
+    message = os.urandom(3000)
+    encoded = encode(message, fec=16)
+    header = steganographer(inputFile=encoded).peek_header()
+
+    assert header["version"] == Header.FEC_VERSION
+    assert header["fec"] == 16
+    assert header["has_message"]
+    assert steganographer(inputFile=encoded).decode_message_bytes() == message
+
+
+def test_image_repairs_flipped_bits_in_header_and_payload():
+    message = os.urandom(3000)
+    # Every copy of the header starts in the first rows.
+    damaged = flip_bits(encode(message, fec=32), 40, rows=2, seed=1)
+    damaged = flip_bits(damaged, 80, seed=2)
+
+    assert steganographer(inputFile=damaged).decode_message_bytes() == message
+
+
+def test_image_without_fec_is_still_version_2():
+    assert steganographer(inputFile=encode(b"plain")).peek_header()["version"] == \
+        Header.VERSION
+
+
+def test_image_with_too_much_damage_fails_cleanly():
+    message = os.urandom(3000)
+    pixels = numpy.array(Image.open(io.BytesIO(encode(message, fec=8))))
+    # Flip every third low bit of the payload, far beyond what 8 parity
+    # bytes per codeword can repair, but leave the header alone.
+    start = Header.FEC_BITS
+    pixels.reshape(-1)[start:start + 20000:3] ^= 1
+    output = io.BytesIO()
+    Image.fromarray(pixels).save(output, "PNG")
+
+    with pytest.raises(ValueError):
+        steganographer(inputFile=output.getvalue()).decode_message_bytes()
+
+
+def test_file_paths_with_fec(tmp_path):
+    message = os.urandom(9000)
+    (tmp_path / "message.bin").write_bytes(message)
+    carrier = str(tmp_path / "carrier.png")
+    Image.fromarray(random_pixels(150, 200)).save(carrier)
+    output = str(tmp_path / "encoded.png")
+    steganographer(inputFile=carrier, outputFile=output,
+                   fec=24).encode_message_from_file(str(tmp_path / "message.bin"), 1000)
+    with open(output, "rb") as fd:
+        damaged = flip_bits(fd.read(), 60, seed=3)
+    with open(output, "wb") as fd:
+        fd.write(damaged)
+
+    steganographer(inputFile=output).decode_message_to_file(
+        str(tmp_path / "decoded.bin"), 700)
+    assert (tmp_path / "decoded.bin").read_bytes() == message
+
+
+def test_fec_option_is_checked():
+    with pytest.raises(ValueError):
+        steganographer(fec=200)
+    with pytest.raises(ValueError):
+        steganographer(fec=8, layout="columns")
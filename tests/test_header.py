@@ -0,0 +1,117 @@
+import io
+
+import numpy
+import pytest
+from PIL import Image
+
+from bitcodec import BitCodec
+from conftest import random_pixels
+from engine import LSBEngine
+from header import Header
+from steganographer import steganographer
+
+
+def reader(bits):
+    """Return a read_bits function for Header.read over an array of bits."""
+
+    return lambda count: bits[:count]
+
+
+@pytest.mark.parametrize("header", [
+    Header(1234, 2, 1),
+    Header(2 ** 40, 3, 2, 4, 0x81),
+    Header(99, 1, 3, 3, Header.FLAG_SCATTER_KEY, seed=2 ** 63 + 5),
+    Header(5000, 2, 4, 3, 0, fec=32),
+    Header(5000, 1, 4, 3, Header.FLAG_SCATTER_KEY, seed=7, fec=128),
+])
+def test_round_trip(header):
+    bits = header.to_bits()
+    read = Header.read(reader(bits), header.color_size)
+
+    assert len(bits) == header.size_bits()
+    for field in ("length", "depth", "version", "color_size", "seed", "fec"):
+        assert getattr(read, field) == getattr(header, field)
+    assert read.flags & ~Header.FLAG_SCATTERED == header.flags
+
+
+def test_unversioned_bits_are_not_a_header():
+    assert Header.read(reader(numpy.zeros(Header.MAX_BITS, dtype=numpy.uint8))) is None
+    assert Header.read(reader(Header(10).to_bits()), available=40) is None
+
+
+def test_unknown_version_is_rejected():
+    bits = BitCodec.to_bits(Header.MAGIC + b"\x09" + b"\0" * 32)
+
+    with pytest.raises(ValueError):
+        Header.read(reader(bits))
+
+
+def encode(message, **options):
+    carrier = Image.fromarray(random_pixels(150, 200))
+    return steganographer(inputFile=carrier, outputFile=io.BytesIO(),
+                          **options).encode_message_to_bytes(message)
+
+
+def pixels_of(image_bytes):
+    return numpy.array(Image.open(io.BytesIO(image_bytes)))
+
+
+def png(pixels):
+    output = io.BytesIO()
+    Image.fromarray(pixels).save(output, "PNG")
+    return output.getvalue()
+
+
+def test_column_layout_round_trip():
+    encoded = encode(b"the original layout", layout="columns")
+    header = steganographer(inputFile=encoded).peek_header()
+
+    assert header["version"] == Header.LEGACY_VERSION
+    assert steganographer(inputFile=encoded).decode_message_bytes() == \
+        b"the original layout"
+
+
+@pytest.mark.parametrize("depth", [1, 2])
+def test_baseline_image_decodes(depth):
+    # Build an image the way the original encoder did: a bare 32 bit length
+    # followed by the message, both down the columns.
+    message = b"written before headers had a version" * 20
+    pixels = random_pixels(150, 200)
+    LSBEngine.embed(pixels, BitCodec.header_bits(len(message), depth), 3)
+    LSBEngine.embed(pixels, BitCodec.to_bits(message), 3, BitCodec.LENGTH_BITS, depth)
+
+    assert steganographer(inputFile=pixels).decode_message_bytes() == message
+
+
+def test_corrupt_crc_is_rejected():
+    pixels = pixels_of(encode(b"checked"))
+    # Flip a bit of the length, after the magic number and version.
+    pixels.reshape(-1)[Header.PREFIX_BITS + 40] ^= 1
+
+    with pytest.raises(ValueError, match="corrupt"):
+        steganographer(inputFile=png(pixels)).decode_message_bytes()
+
+
+def test_vote_recovers_a_damaged_copy():
+    message = b"voted" * 100
+    pixels = pixels_of(encode(message, fec=8))
+    copy_bits = Header.FEC_BITS // Header.FEC_COPIES
+    # Wipe out the first copy, magic number and all, and a different bit in
+    # two of the others.
+    pixels.reshape(-1)[:copy_bits] ^= 1
+    pixels.reshape(-1)[copy_bits + 100] ^= 1
+    pixels.reshape(-1)[3 * copy_bits + 150] ^= 1
+    damaged = png(pixels)
+
+    assert steganographer(inputFile=damaged).peek_header()["fec"] == 8
+    assert steganographer(inputFile=damaged).decode_message_bytes() == message
+
+
+def test_vote_fails_with_most_copies_damaged():
+    pixels = pixels_of(encode(b"voted", fec=8))
+    copy_bits = Header.FEC_BITS // Header.FEC_COPIES
+    for copy in range(3):
+        pixels.reshape(-1)[copy * copy_bits + 60] ^= 1
+
+    with pytest.raises(ValueError, match="corrupt"):
+        steganographer(inputFile=png(pixels)).decode_message_bytes()
@@ -0,0 +1,82 @@
+import io
+
+import numpy
+import pytest
+from PIL import Image
+
+from steganographer import steganographer
+
+
+def encoded_bytes(carrier, message=b"in memory"):
+    return steganographer(inputFile=carrier, outputFile=io.BytesIO()) \
+        .encode_message_to_bytes(message)
+
+
+def test_caller_stream_is_left_open_and_rewound(carrier):
+    stream = io.BytesIO(encoded_bytes(carrier))
+
+    assert steganographer(inputFile=stream).peek_header()["length"] == 9
+    assert not stream.closed and stream.tell() == 0
+    assert steganographer(inputFile=stream).decode_message_bytes() == b"in memory"
+    assert not stream.closed and stream.tell() == 0
+    assert steganographer(inputFile=stream).decode_message_bytes() == b"in memory"
+
+
+def test_bytes_image_and_array_inputs(carrier):
+    data = encoded_bytes(carrier)
+    image = Image.open(io.BytesIO(data))
+
+    assert steganographer(inputFile=data).decode_message_bytes() == b"in memory"
+    assert steganographer(inputFile=image).decode_message_bytes() == b"in memory"
+    assert steganographer(inputFile=numpy.asarray(image)).decode_message_bytes() \
+        == b"in memory"
+    # The caller's image is still usable.
+    assert image.size == (160, 120)
+
+
+def leading_rows(data, rows):
+    with Image.open(io.BytesIO(data)) as image:
+        return steganographer.read_leading_rows(image, rows)
+
+
+def saved(image, image_format, **options):
+    output = io.BytesIO()
+    image.save(output, image_format, **options)
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L", "P", "I;16", "1"])
+@pytest.mark.parametrize("compress_level", [0, 9])
+@pytest.mark.parametrize("rows", [1, 11, 250, 300])
+def test_png_leading_rows_match_a_full_decode(mode, compress_level, rows, monkeypatch):
+    # 300 rows of random pixels take several IDAT chunks.
+    pixels = numpy.random.RandomState(0).randint(0, 256, (300, 200, 3), numpy.uint8)
+    data = saved(Image.fromarray(pixels).convert(mode), "PNG",
+                 compress_level=compress_level)
+    full = numpy.asarray(Image.open(io.BytesIO(data)))
+
+    def crop(*args):
+        raise AssertionError("PNGs shouldn't fall back to a crop.")
+
+    monkeypatch.setattr(Image.Image, "crop", crop)
+    assert numpy.array_equal(leading_rows(data, rows), full[:rows])
+
+
+@pytest.mark.parametrize("image_format", ["BMP", "TIFF", "WEBP"])
+def test_other_formats_fall_back_to_a_crop(carrier, image_format):
+    data = saved(Image.open(carrier), image_format, lossless=True)
+    full = numpy.asarray(Image.open(io.BytesIO(data)))
+
+    assert numpy.array_equal(leading_rows(data, 11), full[:11])
+
+
+def test_peek_header_only_decodes_the_leading_rows():
+    pixels = numpy.random.RandomState(0).randint(0, 256, (600, 400, 3), numpy.uint8)
+    data = encoded_bytes(Image.fromarray(pixels))
+    # Random pixels barely compress so the first rows are in the first part
+    # of the file and the cut goes through the middle of the image.
+    truncated = data[:len(data) // 4]
+
+    assert steganographer(inputFile=truncated).peek_header()["length"] == 9
+    with pytest.raises(IOError):
+        Image.open(io.BytesIO(truncated)).load()
@@ -0,0 +1,81 @@
+import os
+import shutil
+
+import pytest
+
+from message import CryptoHelper
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """Forget every cached key and count the reads that reach the key files."""
+
+    CryptoHelper.forget_keys()
+    counted = []
+    original = CryptoHelper._read_key
+
+    def read_key(filename, passphrase):
+        counted.append(filename)
+        return original(filename, passphrase)
+
+    monkeypatch.setattr(CryptoHelper, "_read_key", staticmethod(read_key))
+    yield counted
+    CryptoHelper.forget_keys()
+
+
+def test_keys_are_read_once(keys, reads):
+    first = CryptoHelper.import_keys(keys["alice"], "passphrase")
+
+    assert CryptoHelper.import_keys(keys["alice"], "passphrase") is first
+    assert CryptoHelper.import_keys(keys["alice"], b"passphrase") is first
+    assert len(reads) == 1
+    assert CryptoHelper.import_keys(keys["alice"], "passphrase", cache=False) is not first
+    assert len(reads) == 2
+
+
+def test_rewritten_key_file_is_read_again(keys, reads, tmp_path):
+    filename = str(tmp_path / "key.pem")
+    shutil.copyfile(keys["alice"], filename)
+    alice = CryptoHelper.import_keys(filename, "passphrase")
+    shutil.copyfile(keys["bob"], filename)
+    # Make sure the modification time moves even on coarse clocks.
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    bob = CryptoHelper.import_keys(filename, "passphrase")
+
+    assert bob.n != alice.n
+    assert bob.n == CryptoHelper.import_keys(keys["bob"], "passphrase").n
+    assert len([key for key in CryptoHelper._key_cache
+                if key[0] == os.path.abspath(filename)]) == 1
+
+
+def test_passphrase_is_part_of_the_key(keys, reads):
+    with pytest.raises(ValueError):
+        CryptoHelper.import_keys(keys["alice"], "wrong")
+    CryptoHelper.import_keys(keys["alice"], "passphrase")
+    with pytest.raises(ValueError):
+        CryptoHelper.import_keys(keys["alice"], "wrong")
+    assert len(reads) == 3
+
+
+def test_forget_keys(keys, reads):
+    CryptoHelper.import_keys(keys["alice"], "passphrase")
+    CryptoHelper.import_keys(keys["bob"], "passphrase")
+    CryptoHelper.forget_keys(keys["alice"])
+    CryptoHelper.import_keys(keys["alice"], "passphrase")
+    CryptoHelper.import_keys(keys["bob"], "passphrase")
+    assert reads == [keys["alice"], keys["bob"], keys["alice"]]
+
+    CryptoHelper.forget_keys()
+    CryptoHelper.import_keys(keys["bob"], "passphrase")
+    assert reads[-1] == keys["bob"] and len(reads) == 4
+
+
+def test_cache_is_bounded(keys, reads, monkeypatch):
+    monkeypatch.setattr(CryptoHelper, "MAX_CACHED_KEYS", 2)
+    for name in ("alice", "bob", "alice_public"):
+        CryptoHelper.import_keys(keys[name], "passphrase" if "public" not in name else "")
+
+    assert len(CryptoHelper._key_cache) == 2
+    CryptoHelper.import_keys(keys["alice"], "passphrase")
+    assert len(reads) == 4
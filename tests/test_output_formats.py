@@ -0,0 +1,59 @@
+import io
+
+import numpy
+import pytest
+from PIL import Image
+
+from conftest import random_pixels
+from steganographer import steganographer
+
+
+def make_carrier(mode):
+    channels = len(Image.new(mode, (1, 1)).getbands())
+    return Image.frombytes(mode, (64, 48), random_pixels(48, 64, channels).tobytes())
+
+
+@pytest.mark.parametrize("mode,output_format,options", [
+    ("RGB", "PNG", {}), ("RGB", "PNG", {"compressLevel": 0}),
+    ("RGB", "BMP", {}), ("RGB", "TIFF", {}), ("RGB", "TIFF", {"compressLevel": 0}),
+    ("RGB", "WEBP", {}), ("RGB", "PPM", {}),
+    ("RGBA", "PNG", {}), ("RGBA", "TIFF", {}), ("RGBA", "WEBP", {}),
+    ("CMYK", "TIFF", {}), ("CMYK", "TIFF", {"compressLevel": 0})])
+def test_round_trip_keeps_the_carrier_mode(mode, output_format, options):
+    carrier = make_carrier(mode)
+    encoded = steganographer(inputFile=carrier, outputFile=io.BytesIO(),
+                             outputFormat=output_format, **options) \
+        .encode_message_to_bytes(b"format check")
+
+    image = Image.open(io.BytesIO(encoded))
+    assert image.format == output_format
+    assert image.mode == mode
+    assert steganographer(inputFile=encoded).decode_message_bytes() == b"format check"
+
+
+def test_unsupported_output_format_is_rejected():
+    with pytest.raises(ValueError):
+        steganographer(outputFormat="JPEG")
+
+
+@pytest.mark.parametrize("mode,output_format", [
+    ("RGBA", "BMP"), ("RGBA", "PPM"),
+    ("CMYK", "PNG"), ("CMYK", "WEBP"), ("CMYK", "BMP"), ("CMYK", "PPM"),
+    ("YCbCr", "PNG"), ("YCbCr", "TIFF"), ("YCbCr", "WEBP"), ("YCbCr", "BMP"),
+    ("YCbCr", "PPM")])
+def test_format_that_cant_hold_the_mode_is_rejected(mode, output_format):
+    encoder = steganographer(inputFile=make_carrier(mode), outputFile=io.BytesIO(),
+                             outputFormat=output_format)
+
+    with pytest.raises(ValueError, match="can't hold|none of the output formats"):
+        encoder.encode_message_to_bytes(b"format check")
+
+
+def test_cmyk_defaults_to_tiff(tmp_path):
+    output = str(tmp_path / "encoded.tif")
+    steganographer(inputFile=make_carrier("CMYK"), outputFile=output) \
+        .encode_message(b"format check")
+
+    image = Image.open(output)
+    assert (image.format, image.mode) == ("TIFF", "CMYK")
+    assert steganographer(inputFile=output).decode_message_bytes() == b"format check"
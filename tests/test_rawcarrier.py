@@ -0,0 +1,69 @@
+import os
+
+import numpy
+import pytest
+from PIL import Image
+
+from conftest import random_pixels
+from steganographer import steganographer
+from tiled import TiledCarrier
+
+
+@pytest.mark.parametrize("extension,options", [
+    (".bmp", {}), (".ppm", {}), (".tif", {"compression": "raw"})])
+def test_tiled_round_trip(tmp_path, extension, options):
+    carrier = str(tmp_path / ("carrier" + extension))
+    Image.fromarray(random_pixels(300, 200)).save(carrier, **options)
+    output = str(tmp_path / ("encoded" + extension))
+    message = os.urandom(20000)
+    message_file = tmp_path / "message.bin"
+    message_file.write_bytes(message)
+
+    TiledCarrier(inputFile=carrier, outputFile=output,
+                 tileRows=16).encode_message_from_file(str(message_file))
+    TiledCarrier(inputFile=output, tileRows=16).decode_message_to_file(
+        str(tmp_path / "decoded.bin"))
+
+    assert (tmp_path / "decoded.bin").read_bytes() == message
+    assert numpy.array_equal(numpy.asarray(Image.open(carrier)) >> 1,
+                             numpy.asarray(Image.open(output)) >> 1)
+
+
+def test_tiled_npy_and_raw_dump(tmp_path):
+    pixels = random_pixels(64, 64)
+    numpy.save(str(tmp_path / "carrier.npy"), pixels)
+    pixels.tofile(str(tmp_path / "carrier.raw"))
+
+    TiledCarrier(inputFile=str(tmp_path / "carrier.npy"),
+                 outputFile=str(tmp_path / "encoded.npy")).encode_message(b"npy carrier")
+    assert TiledCarrier(inputFile=str(tmp_path / "encoded.npy")).decode_message_bytes() \
+        == b"npy carrier"
+
+    TiledCarrier(inputFile=str(tmp_path / "carrier.raw"), shape=(64, 64, 3),
+                 outputFile=str(tmp_path / "encoded.raw")).encode_message(b"raw dump")
+    assert TiledCarrier(inputFile=str(tmp_path / "encoded.raw"),
+                        shape=(64, 64, 3)).decode_message_bytes() == b"raw dump"
+
+
+def test_tiled_rejects_compressed_carrier(carrier):
+    with pytest.raises(ValueError):
+        TiledCarrier(inputFile=carrier).decode_message_bytes()
+
+
+def test_patched_output_only_rewrites_message_rows(tmp_path):
+    carrier = str(tmp_path / "carrier.bmp")
+    Image.fromarray(random_pixels(200, 100)).save(carrier)
+    output = str(tmp_path / "encoded.bmp")
+
+    steganographer(inputFile=carrier, outputFile=output,
+                   outputFormat="BMP").encode_message(b"x" * 100)
+
+    assert steganographer(inputFile=output).decode_message_bytes() == b"x" * 100
+    before = numpy.asarray(Image.open(carrier))
+    after = numpy.asarray(Image.open(output))
+    changed = numpy.flatnonzero((before != after).any(axis=(1, 2)))
+    assert len(changed) and changed.max() < 5
+    with open(carrier, "rb") as fd:
+        original = fd.read()
+    with open(output, "rb") as fd:
+        assert len(fd.read()) == len(original)
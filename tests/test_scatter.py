@@ -0,0 +1,114 @@
+import io
+import os
+
+import numpy
+import pytest
+from PIL import Image
+
+from conftest import random_pixels
+from scatter import ScatterMap
+from steganographer import steganographer
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 1000, 12345, 2 ** 16 + 1, 300007])
+def test_permutation_is_a_bijection(size):
+    scatter = ScatterMap(size, ScatterMap.new_seed(), b"key")
+    positions = scatter.permute(numpy.arange(size))
+
+    assert positions.dtype == numpy.uint64
+    assert numpy.array_equal(numpy.sort(positions), numpy.arange(size))
+
+
+def test_blocks_match_permute():
+    scatter = ScatterMap(200000, 42)
+    blocked = numpy.concatenate(list(scatter.blocks(1000, 150000)))
+
+    assert numpy.array_equal(blocked, scatter.permute(numpy.arange(1000, 151000)))
+
+
+def test_seed_and_key_change_the_order():
+    indices = numpy.arange(5000)
+    plain = ScatterMap(5000, 1).permute(indices)
+
+    assert numpy.array_equal(plain, ScatterMap(5000, 1).permute(indices))
+    assert not numpy.array_equal(plain, ScatterMap(5000, 2).permute(indices))
+    assert not numpy.array_equal(plain, ScatterMap(5000, 1, "key").permute(indices))
+    assert numpy.array_equal(ScatterMap(5000, 1, "key").permute(indices),
+                             ScatterMap(5000, 1, b"key").permute(indices))
+
+
+def test_empty_map_is_rejected():
+    with pytest.raises(ValueError):
+        ScatterMap(0, 1)
+
+
+def encode(message, **options):
+    carrier = Image.fromarray(random_pixels(150, 200))
+    return steganographer(inputFile=carrier, outputFile=io.BytesIO(),
+                          **options).encode_message_to_bytes(message)
+
+
+def test_scattered_round_trip():
+    message = os.urandom(2000)
+    encoded = encode(message, scatter=True)
+    header = steganographer(inputFile=encoded).peek_header()
+
+    assert header["scattered"]
+    assert steganographer(inputFile=encoded).decode_message_bytes() == message
+
+
+def test_scatter_spreads_the_message():
+    message = os.urandom(2000)
+    carrier = random_pixels(150, 200)
+    encoded = encode(message, scatter=True)
+    changed = numpy.flatnonzero(numpy.array(Image.open(io.BytesIO(encoded))) != carrier)
+
+    # Packed, 2000 bytes would fill the first 16000 slots. Scattered they
+    # land all over the 90000 in the image.
+    assert changed.max() > 80000
+
+
+def test_key_is_needed_to_decode():
+    message = os.urandom(2000)
+    encoded = encode(message, scatterKey="correct horse")
+
+    assert steganographer(inputFile=encoded,
+                          scatterKey="correct horse").decode_message_bytes() == message
+    with pytest.raises(ValueError):
+        steganographer(inputFile=encoded).decode_message_bytes()
+
+
+def test_wrong_key_does_not_decode():
+    message = os.urandom(2000)
+    encoded = encode(message, scatterKey="correct horse")
+
+    try:
+        decoded = steganographer(inputFile=encoded,
+                                 scatterKey="battery staple").decode_message_bytes()
+    except ValueError:
+        return
+    assert decoded != message
+
+
+@pytest.mark.parametrize("depth", [2, 3])
+def test_scatter_with_depth(depth):
+    message = os.urandom(4000)
+    encoded = encode(message, scatterKey="key", depth=depth)
+
+    assert steganographer(inputFile=encoded, scatterKey="key").decode_message_bytes() == \
+        message
+
+
+def test_scatter_with_fec():
+    message = os.urandom(3000)
+    encoded = encode(message, scatterKey="key", fec=16)
+    header = steganographer(inputFile=encoded, scatterKey="key").peek_header()
+
+    assert header["scattered"] and header["fec"] == 16
+    assert steganographer(inputFile=encoded, scatterKey="key").decode_message_bytes() == \
+        message
+
+
+def test_scatter_with_columns_is_rejected():
+    with pytest.raises(ValueError):
+        steganographer(scatter=True, layout="columns")
@@ -0,0 +1,112 @@
+import asyncio
+import base64
+import io
+import json
+import time
+
+import pytest
+from PIL import Image
+
+from conftest import random_pixels
+from service import StegHTTPServer
+from service import StegService
+
+
+def carrier_bytes():
+    buffer = io.BytesIO()
+    Image.fromarray(random_pixels(60, 80)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+async def send(port, raw, half_close=False):
+    """Send a raw request and return the status code, or None if there was no response."""
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(raw)
+    await writer.drain()
+    if half_close:
+        writer.write_eof()
+    data = await reader.read()
+    writer.close()
+    if not data:
+        return None
+    return int(data.split()[1])
+
+
+def request(method, path, body=b"", length=None):
+    if length is None:
+        length = str(len(body))
+    return (method + " " + path + " HTTP/1.1\r\nHost: test\r\nContent-Length: "
+            + length + "\r\n\r\n").encode("latin-1") + body
+
+
+def run_with_server(test, max_body=StegHTTPServer.MAX_BODY):
+    async def main():
+        async with StegService(workers=1, timeout=10) as service:
+            server = await asyncio.start_server(
+                StegHTTPServer(service, max_body)._handle, "127.0.0.1", 0)
+            try:
+                await test(service, server.sockets[0].getsockname()[1])
+            finally:
+                server.close()
+                await server.wait_closed()
+    asyncio.run(main())
+
+
+def test_service_round_trip():
+    async def test(service, port):
+        encoded = await service.encode(carrier_bytes(), b"queued", depth=2)
+        assert await service.decode(encoded) == b"queued"
+    run_with_server(test)
+
+
+def test_http_round_trip():
+    async def test(service, port):
+        body = json.dumps({"image": base64.b64encode(carrier_bytes()).decode(),
+                           "message": base64.b64encode(b"over http").decode()}).encode()
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(request("POST", "/encode", body))
+        data = await reader.read()
+        writer.close()
+        head, _, image = data.partition(b"\r\n\r\n")
+        assert int(head.split()[1]) == 200
+        assert await service.decode(image) == b"over http"
+    run_with_server(test)
+
+
+@pytest.mark.parametrize("length,status", [
+    ("abc", 400), ("-5", 400), ("1e3", 400), ("", 400), ("99999", 413)])
+def test_bad_content_length_gets_a_response(length, status):
+    async def test(service, port):
+        assert await send(port, request("POST", "/decode", b"data", length)) == status
+    run_with_server(test, max_body=1000)
+
+
+def test_truncated_body_gets_a_400():
+    async def test(service, port):
+        assert await send(port, request("POST", "/decode", b"short", "100"),
+                          half_close=True) == 400
+        # The server is still answering afterwards.
+        assert await send(port, request("GET", "/health")) == 200
+    run_with_server(test)
+
+
+def test_overlong_header_gets_a_response():
+    async def test(service, port):
+        raw = (b"POST /decode HTTP/1.1\r\nX-Padding: " + b"a" * 70000
+               + b"\r\nContent-Length: 0\r\n\r\n")
+        assert await send(port, raw) == 431
+        assert await send(port, b"GET /health HTTP/1.1\r\n\r\n") == 200
+    run_with_server(test)
+
+
+def test_close_fails_requests_that_are_running():
+    async def main():
+        service = StegService(workers=1, timeout=None)
+        await service.start()
+        running = asyncio.ensure_future(service._submit(time.sleep, (0.3,), None))
+        await asyncio.sleep(0.1)
+        await service.close()
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(running, 5)
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+from PIL import Image
+
+from conftest import random_pixels
+from shard import ShardedCarrier
+
+
+@pytest.fixture
+def carriers(tmp_path, carrier):
+    """Three carriers of different sizes."""
+
+    files = [carrier]
+    for index, (h, w) in enumerate([(64, 96), (40, 50)]):
+        filename = str(tmp_path / ("carrier" + str(index) + ".png"))
+        Image.fromarray(random_pixels(h, w, seed=index + 1), "RGB").save(filename)
+        files.append(filename)
+    return files
+
+
+def outputs(tmp_path, name, count):
+    return [str(tmp_path / (name + str(index) + ".png")) for index in range(count)]
+
+
+def fill(sharded, share):
+    return os.urandom(int(sum(sharded.capacity(image) for image in
+                              sharded._input_files) * share))
+
+
+def test_round_trip(tmp_path, carriers):
+    encoded = outputs(tmp_path, "encoded", 3)
+    sharded = ShardedCarrier(workers=2, inputFiles=carriers, outputFiles=encoded,
+                             depth=2)
+    message = fill(sharded, 0.9)
+    shards = sharded.plan(len(message))
+    assert all(length for offset, length in shards)
+    sharded.encode_message(message)
+
+    # The carriers can be given in any order.
+    encoded.reverse()
+    assert ShardedCarrier(workers=2, inputFiles=encoded,
+                          depth=2).decode_message_bytes() == message
+
+
+def test_file_round_trip(tmp_path, carriers):
+    encoded = outputs(tmp_path, "encoded", 3)
+    sharded = ShardedCarrier(workers=2, inputFiles=carriers, outputFiles=encoded,
+                             depth=1, compression="zlib")
+    message = tmp_path / "message.bin"
+    message.write_bytes(fill(sharded, 0.5))
+    sharded.encode_message_from_file(str(message))
+
+    decoded = tmp_path / "decoded.bin"
+    ShardedCarrier(workers=2, inputFiles=encoded[::-1]).decode_message_to_file(str(decoded))
+    assert decoded.read_bytes() == message.read_bytes()
+
+
+def test_missing_and_foreign_shards(tmp_path, carriers):
+    first = outputs(tmp_path, "first", 3)
+    second = outputs(tmp_path, "second", 3)
+    for encoded in (first, second):
+        ShardedCarrier(workers=2, inputFiles=carriers, outputFiles=encoded,
+                       depth=2).encode_message(b"a message split three ways" * 20)
+
+    decoded = tmp_path / "decoded.bin"
+    with pytest.raises(ValueError, match="split into 3 shards"):
+        ShardedCarrier(workers=2, inputFiles=first[:2],
+                       depth=2).decode_message_to_file(str(decoded))
+    assert not decoded.exists()
+    with pytest.raises(ValueError, match="different messages"):
+        ShardedCarrier(workers=2, inputFiles=first[:2] + second[2:],
+                       depth=2).decode_message_bytes()
+    with pytest.raises(ValueError, match="is missing"):
+        ShardedCarrier(workers=2, inputFiles=[first[0], first[1], first[1]],
+                       depth=2).decode_message_bytes()
+
+
+def test_bad_arguments(tmp_path, carriers):
+    with pytest.raises(ValueError):
+        ShardedCarrier(inputFiles=[])
+    with pytest.raises(ValueError):
+        ShardedCarrier(inputFiles=carriers, outputFiles=outputs(tmp_path, "encoded", 2))
+    with pytest.raises(ValueError):
+        ShardedCarrier(inputFiles=carriers).encode_message(b"no outputs")
+    sharded = ShardedCarrier(inputFiles=carriers, outputFiles=outputs(tmp_path, "encoded", 3))
+    with pytest.raises(ValueError, match="only hold"):
+        sharded.encode_message(fill(sharded, 1) + b"!")
@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+from steganographer import steganographer
+
+
+@pytest.mark.parametrize("depth", [1, 2, 3, 4])
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1000])
+def test_file_round_trip_in_small_chunks(carrier, tmp_path, depth, chunk_size):
+    message = os.urandom(1500)
+    (tmp_path / "message.bin").write_bytes(message)
+    output = str(tmp_path / "encoded.png")
+    steganographer(inputFile=carrier, outputFile=output, depth=depth) \
+        .encode_message_from_file(str(tmp_path / "message.bin"), chunk_size)
+
+    assert steganographer(inputFile=output).peek_header()["length"] == len(message)
+    steganographer(inputFile=output).decode_message_to_file(
+        str(tmp_path / "decoded.bin"), chunk_size)
+    assert (tmp_path / "decoded.bin").read_bytes() == message
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5])
+def test_compressed_file_round_trip_in_small_chunks(carrier, tmp_path, chunk_size):
+    message = b"squeeze me " * 300
+    (tmp_path / "message.bin").write_bytes(message)
+    output = str(tmp_path / "encoded.png")
+    steganographer(inputFile=carrier, outputFile=output, depth=3, compression="zlib") \
+        .encode_message_from_file(str(tmp_path / "message.bin"), chunk_size)
+
+    assert steganographer(inputFile=output).decode_message_bytes() == message
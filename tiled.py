@@ -0,0 +1,130 @@
+__author__ = "Dell-Ray Sackett"
+__version__ = "0.2"
+import os
+import shutil
+
+from rawcarrier import RawCarrier
+from steganographer import steganographer
+
+
+class TiledCarrier(steganographer):
+    """
+    This subclass of steganographer works on carriers that are too big to
+    load into memory. Instead of decoding the image it maps the pixels
+    straight out of the file with RawCarrier and embeds or extracts the
+    message one band of rows (a tile) at a time. Only the tiles the message
+    actually occupies are ever read or written, so memory use doesn't grow
+    with the size of the image.
+
+    The carrier has to be one RawCarrier can map. Encoding copies the
+    carrier to the output file byte for byte and then embeds into the copy in
+    place, so the output has the same format as the input.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Initialize a TiledCarrier object
+
+        Keyword Arguments:
+        inputFile -- The filename of the carrier.
+        outputFile -- The filename to copy the carrier to before encoding. If
+            it is the same as inputFile the carrier is encoded in place.
+            Leave it out when decoding.
+        shape -- The (height, width, channels) of a raw pixel dump. Only
+            needed for carriers that aren't .npy files or images PIL can read.
+        offset -- The number of bytes before the pixels of a raw pixel dump.
+            (Int, default=0)
+        tileRows -- The number of rows processed at a time. (Int, default=256)
+        Everything else is passed on to steganographer.
+
+        Exceptions:
+        ValueError -- Raised from steganographer for bad arguments.
+        """
+
+        self._shape = kwargs.pop("shape", None)
+        self._offset = kwargs.pop("offset", 0)
+        self._tile_rows = kwargs.pop("tileRows", 256)
+        self._map = None
+        self._row_slots = 0
+        super(TiledCarrier, self).__init__(**kwargs)
+
+    def _load_image_data(self):
+        """
+        Map the carrier instead of loading it. When encoding the carrier is
+        copied to the output file first and the copy is mapped for writing.
+
+        Exceptions:
+        IOError -- Raised if the carrier can't be opened or copied.
+        ValueError -- Raised if the carrier can't be mapped.
+        """
+
+        if self._input_file == "":
+            raise ValueError("You must supply an input file name to encode "
+                             + "decode, or compare pixels.")
+        __filename = self._input_file
+        __mode = "r"
+        if self._output_file != "":
+            if os.path.abspath(self._output_file) != os.path.abspath(__filename):
+                shutil.copyfile(__filename, self._output_file)
+            __filename = self._output_file
+            __mode = "r+"
+
+        __pixels, self._map, __color_mode, __format = RawCarrier.map(
+            __filename, __mode, self._shape, self._offset)
+        self._row_slots = __pixels.shape[1] * steganographer.COLOR_SIZES.get(
+            __color_mode, __pixels.shape[2])
+        return __pixels, __color_mode, (__pixels.shape[1], __pixels.shape[0])
+
+    def _tile_bytes(self, depth):
+        """Return the number of message bytes that fill tileRows rows."""
+
+        if self._map is None:
+            self.initialize_image_data()
+        return max(depth, self._tile_rows * self._row_slots * depth // 8)
+
+    def save_output_image(self):
+        """Flush the embedded message out to the mapped output file."""
+
+        self._map.flush()
+        print("Image encoded and saved as " + self._output_file)
+
+    def encode_message_from_file(self, filename, chunk_size=None):
+        """
+        Encode the contents of a file onto the carrier a tile at a time.
+
+        Mandatory Arguments:
+        filename - The name of the file containing the message.
+
+        Optional Arguments:
+        chunk_size - The number of bytes to embed at a time. Defaults to
+            however many bytes fill tileRows rows.
+
+        Exceptions:
+        The same as steganographer.encode_message_from_file.
+        """
+
+        if chunk_size is None:
+            chunk_size = self._tile_bytes(self._depth)
+        super(TiledCarrier, self).encode_message_from_file(filename, chunk_size)
+
+    def decode_message_to_file(self, filename, chunk_size=None, digest=False):
+        """
+        Decode the message in the carrier into a file a tile at a time.
+
+        Mandatory Arguments:
+        filename - The name of the file to save the message to.
+
+        Optional Arguments:
+        chunk_size - The number of bytes to extract at a time. Defaults to
+            however many bytes fill tileRows rows at depth 1.
+        digest - Compute and return the SHA256 of the message.
+            (Bool, default=False)
+
+        Exceptions:
+        The same as steganographer.decode_message_to_file.
+        """
+
+        if chunk_size is None:
+            chunk_size = self._tile_bytes(1)
+        return super(TiledCarrier, self).decode_message_to_file(
+            filename, chunk_size, digest)